@@ -0,0 +1,102 @@
+import os
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from telegram.ext import CallbackContext, JobQueue
+
+import estudios
+import disponibilidad
+import notificaciones
+from catalogo import INTERVALO_MINUTOS, ZONA_HORARIA
+from formato import fecha_txt, hora_txt
+
+# ================= CONFIGURACIÓN =================
+# Hora local del estudio a la que sale el resumen del día para los admins
+AGENDA_HORA = os.getenv('AGENDA_HORA', '08:00')
+
+NOMBRES_DIAS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+logger = logging.getLogger(__name__)
+
+# ================= AGENDA DEL DÍA =================
+# Sale del índice por día de `disponibilidad` (una consulta por rango sobre
+# citas_estudio_estado_inicio_idx cuando el día no está en memoria, ninguna si ya lo
+# está) y se mantiene al día con las reservas y cancelaciones del bot.
+def _duracion_txt(minutos: int) -> str:
+    horas, minutos = divmod(minutos, 60)
+    if horas and minutos:
+        return f"{horas}h {minutos:02d}m"
+    return f"{horas}h" if horas else f"{minutos}m"
+
+def _huecos(estudio: estudios.Estudio, fecha: date, citas: list[tuple]) -> list[tuple[datetime, datetime]]:
+    """Tramos libres del horario de atención del estudio de al menos INTERVALO_MINUTOS"""
+    horario = estudio.horario_de(fecha)
+    if horario is None:
+        return []
+    apertura, cierre = horario
+    minimo = timedelta(minutes=INTERVALO_MINUTOS)
+
+    huecos = []
+    libre_desde = datetime.combine(fecha, apertura)
+    for inicio, fin, *_ in citas + [(datetime.combine(fecha, cierre),) * 2]:
+        if inicio - libre_desde >= minimo:
+            huecos.append((libre_desde, inicio))
+        libre_desde = max(libre_desde, fin)
+    return huecos
+
+def texto(estudio: estudios.Estudio, fecha: date, citas: list[tuple]) -> str:
+    """Agenda de un día: citas por hora con los huecos libres y resumen por servicio"""
+    titulo = f"📅 *AGENDA — {NOMBRES_DIAS[fecha.weekday()]} {fecha_txt(fecha)}*\n\n"
+    if not citas:
+        return titulo + "📭 No hay citas activas este día."
+
+    ocupados = sum(int((fin - inicio).total_seconds() // 60) for inicio, fin, *_ in citas)
+    lineas = [f"🗓️ {len(citas)} citas · {_duracion_txt(ocupados)} ocupadas\n"]
+
+    huecos = {inicio: fin for inicio, fin in _huecos(estudio, fecha, citas)}
+    eventos = sorted([(c[0], c) for c in citas] + [(inicio, None) for inicio in huecos], key=lambda e: e[0])
+    for inicio, cita in eventos:
+        if cita is None:
+            fin = huecos[inicio]
+            minutos = int((fin - inicio).total_seconds() // 60)
+            lineas.append(f"🟢 _Libre {hora_txt(inicio.time())}–{hora_txt(fin.time())} ({_duracion_txt(minutos)})_")
+        else:
+            _, fin, cita_id, servicio, nombre, telefono = cita
+            lineas.append(
+                f"⏰ *{hora_txt(inicio.time())}–{hora_txt(fin.time())}* {servicio}\n"
+                f"    👤 {nombre} · 📞 {telefono} · 🆔 {cita_id}"
+            )
+
+    por_servicio = defaultdict(list)
+    for inicio, _, _, servicio, *_ in citas:
+        por_servicio[servicio].append(hora_txt(inicio.time()))
+    lineas.append("\n💅 *Por servicio:*")
+    for servicio, horas in sorted(por_servicio.items(), key=lambda s: (-len(s[1]), s[0])):
+        lineas.append(f"• {servicio} ({len(horas)}): {', '.join(horas)}")
+    return titulo + "\n".join(lineas)
+
+async def agenda(estudio: estudios.Estudio, fecha: date) -> str:
+    """Texto de la agenda del estudio en `fecha` leído del índice por día"""
+    return texto(estudio, fecha, await disponibilidad.citas_dia(estudio, fecha))
+
+# ================= RESUMEN DE LA MAÑANA =================
+async def enviar_resumen(context: CallbackContext):
+    """Mandar a los admins de cada estudio del bot su agenda de hoy (si el estudio abre)"""
+    hoy = disponibilidad.ahora().date()
+    for estudio in estudios.atendidos(context.bot.id):
+        if not disponibilidad.abierto(estudio, hoy):
+            continue
+        try:
+            notificaciones.notificar_admins(await agenda(estudio, hoy), estudio.admins)
+        except Exception as e:
+            logger.error(f"❌ Error armando el resumen del día de {estudio.id}: {e}")
+
+def programar(job_queue: JobQueue):
+    """Registrar el resumen diario de la agenda"""
+    if job_queue is None:
+        logger.warning("⚠️ Sin JobQueue (instala python-telegram-bot[job-queue]): no habrá resumen diario")
+        return
+    hora = datetime.strptime(AGENDA_HORA, '%H:%M').time()
+    job_queue.run_daily(enviar_resumen, time=time(hora.hour, hora.minute, tzinfo=ZONA_HORARIA), name='agenda')
+    logger.info(f"📅 Resumen de la agenda cada día a las {AGENDA_HORA}")
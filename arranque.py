@@ -0,0 +1,28 @@
+import logging
+from time import perf_counter
+
+# ================= TIEMPOS DE ARRANQUE =================
+# bot.py importa este módulo antes que cualquier otro: desde aquí se mide cuánto
+# tarda cada fase hasta que el bot atiende su primer update. El reporte sale en
+# el log y en /metrics (bot_arranque_segundos).
+_inicio = perf_counter()
+_ultima = _inicio
+_fases: dict[str, float] = {}
+
+logger = logging.getLogger(__name__)
+
+def marcar(fase: str):
+    """Cerrar una fase: el tiempo desde la marca anterior queda a su nombre"""
+    global _ultima
+    ahora = perf_counter()
+    _fases[fase] = _fases.get(fase, 0) + ahora - _ultima
+    _ultima = ahora
+
+def total() -> float:
+    """Segundos entre la primera importación y la última marca"""
+    return _ultima - _inicio
+
+def reportar():
+    """Escribir en el log el desglose por fase"""
+    detalle = ', '.join(f"{fase} {segundos:.2f}s" for fase, segundos in _fases.items())
+    logger.info(f"🚀 Bot listo en {total():.2f}s ({detalle})")
@@ -0,0 +1,252 @@
+"""Benchmark de carga: N clientes agendan y cancelan a la vez
+
+Usa los handlers reales de bot.py con updates sintéticos. Telegram se
+reemplaza por una API falsa que responde al instante (o con --latencia-telegram)
+y Postgres por una tabla en memoria (o una base real con --database-url; usa
+una base desechable, las citas de prueba quedan guardadas).
+
+    python -m bench.carga --usuarios 200
+    python -m bench.carga --usuarios 50 --database-url postgres://localhost/bench
+    python -m bench.carga --max-p95 50     # sale con error si el p95 pasa de 50 ms
+"""
+import re
+import sys
+import random
+import asyncio
+import logging
+import argparse
+from collections import Counter, defaultdict
+from time import perf_counter, time
+
+from telegram import Update
+from telegram.ext import Application
+
+import db
+import bot
+import metricas
+import limitador
+import concurrencia
+import notificaciones
+from bench import falsos
+from catalogo import SERVICIOS
+
+ADMIN_ID = '999999'
+USUARIO_BASE = 10_000_000
+MAX_INTENTOS = 10
+
+# ================= APLICACIÓN MEDIDA =================
+class AplicacionMedida(concurrencia.AplicacionOrdenada):
+    """La aplicación del bot, con aviso de cuándo termina cada update
+
+    Los clientes dejan sus updates en `update_queue` como Telegram, así la
+    medición incluye el limitador, las colas por usuario y los lugares de
+    concurrencia.AplicacionOrdenada.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # update_id -> (terminado, llamadas contadas)
+        self.pendientes: dict[int, tuple[asyncio.Future, Counter]] = {}
+
+    async def process_update(self, update: object):
+        terminado, cuenta = self.pendientes.pop(update.update_id)
+        falsos.contador.set(cuenta)
+        try:
+            await super().process_update(update)
+        finally:
+            terminado.set_result(None)
+
+# ================= CLIENTE SIMULADO =================
+class Resultados:
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.por_flujo = defaultdict(list)
+        self.reintentos = 0
+        self.fallidos = 0
+
+class Cliente:
+    """Un cliente que toca los botones que el bot le acaba de mostrar"""
+
+    def __init__(self, app: AplicacionMedida, telegram: falsos.TelegramFalso, n: int, resultados: Resultados):
+        self.app = app
+        self.telegram = telegram
+        self.user_id = USUARIO_BASE + n
+        self.n = n
+        self.resultados = resultados
+        self.aleatorio = random.Random(n)
+        self.update_id = 0
+
+    def _base(self) -> dict:
+        self.update_id += 1
+        return {
+            'update_id': self.user_id * 100 + self.update_id,
+            'chat': {'id': self.user_id, 'type': 'private'},
+            'from': {'id': self.user_id, 'is_bot': False, 'first_name': f'Cliente{self.n}'},
+        }
+
+    async def _enviar(self, paso: str, datos: dict, flujo: Counter):
+        # Sin limitador ni tope de cola ningún update se descarta, así que todos terminan
+        cuenta = Counter()
+        update = Update.de_json(datos, self.app.bot)
+        terminado = asyncio.get_running_loop().create_future()
+        self.app.pendientes[update.update_id] = (terminado, cuenta)
+        inicio = perf_counter()
+        await self.app.update_queue.put(update)
+        await terminado
+        self.resultados.latencias[paso].append(perf_counter() - inicio)
+        flujo.update(cuenta)
+
+    async def texto(self, paso: str, texto: str, flujo: Counter):
+        base = self._base()
+        mensaje = {
+            'message_id': base['update_id'], 'date': int(time()),
+            'chat': base['chat'], 'from': base['from'], 'text': texto,
+        }
+        if texto.startswith('/'):
+            mensaje['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(texto.split()[0])}]
+        await self._enviar(paso, {'update_id': base['update_id'], 'message': mensaje}, flujo)
+
+    async def boton(self, paso: str, data: str, flujo: Counter):
+        base = self._base()
+        await self._enviar(paso, {'update_id': base['update_id'], 'callback_query': {
+            'id': str(base['update_id']), 'from': base['from'], 'chat_instance': 'bench', 'data': data,
+            'message': {'message_id': 1, 'date': int(time()), 'chat': base['chat']},
+        }}, flujo)
+
+    def _botones(self, prefijo: str) -> list[str]:
+        return [d for d in self.telegram.teclados.get(self.user_id, []) if d.startswith(prefijo)]
+
+    async def agendar(self) -> bool:
+        flujo = Counter()
+        await self.texto('start', '/start', flujo)
+        await self.boton('agendar', 'agendar', flujo)
+        await self.texto('nombre', f'Cliente Bench {self.n}', flujo)
+        await self.texto('telefono', f'09{self.n:08d}', flujo)
+        await self.boton('servicio', f'ag:s:{self.aleatorio.choice(list(SERVICIOS))}', flujo)
+
+        for intento in range(MAX_INTENTOS):
+            # Si al confirmar el horario ya estaba ocupado, el bot vuelve a mostrar horarios
+            horas = self._botones('ag:h:')
+            if horas:
+                await self.boton('hora', self.aleatorio.choice(horas), flujo)
+                if 'CITA CONFIRMADA' in self.telegram.textos.get(self.user_id, ''):
+                    self.resultados.por_flujo['agendar'].append(flujo)
+                    return True
+                self.resultados.reintentos += 1
+                continue
+            dias = self._botones('ag:d:')
+            if not dias:
+                break
+            await self.boton('fecha', self.aleatorio.choice(dias), flujo)
+
+        self.resultados.fallidos += 1
+        return False
+
+    async def cancelar(self):
+        flujo = Counter()
+        await self.boton('ver_citas', 'ver_citas', flujo)
+        await self.boton('cancelar', 'cancelar', flujo)
+        ids = re.findall(r'ID:\* (\d+)', self.telegram.textos.get(self.user_id, ''))
+        if not ids:
+            self.resultados.fallidos += 1
+            return
+        await self.texto('cancelar_id', ids[0], flujo)
+        self.resultados.por_flujo['cancelar'].append(flujo)
+
+    async def ejecutar(self):
+        if await self.agendar():
+            await self.cancelar()
+
+# ================= REPORTE =================
+def percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def reportar(resultados: Resultados, usuarios: int, segundos: float, telegram: falsos.TelegramFalso) -> float:
+    """Imprimir el resumen y devolver el p95 global en milisegundos"""
+    todas = [lat for lats in resultados.latencias.values() for lat in lats]
+    flujos = sum(len(f) for f in resultados.por_flujo.values())
+    print(f"\n👥 {usuarios} clientes en {segundos:.2f}s")
+    print(f"⚡ {flujos / segundos:.1f} flujos/s, {len(todas) / segundos:.1f} updates/s")
+    print(f"🔁 {resultados.reintentos} horarios ocupados al confirmar, {resultados.fallidos} flujos sin terminar\n")
+
+    print(f"{'paso':<12}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for paso, lats in list(resultados.latencias.items()) + [('TOTAL', todas)]:
+        print(f"{paso:<12}{len(lats):>7}"
+              f"{percentil(lats, 50) * 1000:>10.2f}{percentil(lats, 95) * 1000:>10.2f}{percentil(lats, 99) * 1000:>10.2f}")
+
+    print(f"\n{'flujo':<12}{'n':>7}{'db/flujo':>10}{'tg/flujo':>10}")
+    for nombre, cuentas in resultados.por_flujo.items():
+        db_media = sum(c['db'] for c in cuentas) / len(cuentas)
+        tg_media = sum(c['telegram'] for c in cuentas) / len(cuentas)
+        print(f"{nombre:<12}{len(cuentas):>7}{db_media:>10.2f}{tg_media:>10.2f}")
+
+    print(f"\n📨 Llamadas a Telegram: {dict(telegram.llamadas)}")
+    return percentil(todas, 95) * 1000
+
+# ================= EJECUCIÓN =================
+async def ejecutar(args) -> float:
+    # Contar cada sentencia, contra la base real o la de memoria
+    metricas.CONSULTAS = falsos.HistogramaContado(
+        metricas.CONSULTAS.nombre, metricas.CONSULTAS.ayuda, metricas.CONSULTAS.etiquetas
+    )
+    if args.database_url:
+        db.DATABASE_URL = args.database_url
+        await db.iniciar_pool()
+    else:
+        db._pool = falsos.PoolMemoria(falsos.BaseMemoria(args.latencia_db / 1000))
+
+    # Los clientes simulados tocan botones sin pausa: el limitador los cortaría
+    limitador.LIMITE_TASA_USUARIO = limitador.LIMITE_REBOTE = limitador.LIMITE_GLOBAL = 0
+
+    telegram = falsos.TelegramFalso(args.latencia_telegram / 1000)
+    app = concurrencia.configurar(
+        Application.builder()
+        .token('1:bench')
+        .request(telegram)
+        .get_updates_request(falsos.TelegramFalso())
+        .updater(None)
+    ).application_class(AplicacionMedida).build()
+    bot.registrar_handlers(app)
+
+    resultados = Resultados()
+    limite = asyncio.Semaphore(args.concurrencia or args.usuarios)
+
+    async def correr(cliente: Cliente):
+        async with limite:
+            await cliente.ejecutar()
+
+    async with app:
+        await notificaciones.iniciar(app.bot, [ADMIN_ID])
+        await app.start()
+        inicio = perf_counter()
+        await asyncio.gather(*(
+            correr(Cliente(app, telegram, n, resultados)) for n in range(args.usuarios)
+        ))
+        segundos = perf_counter() - inicio
+        await app.stop()
+        await notificaciones.detener()
+
+    if args.database_url:
+        await db.cerrar_pool()
+    return reportar(resultados, args.usuarios, segundos, telegram)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=100, help='clientes simulados')
+    parser.add_argument('--concurrencia', type=int, default=0, help='clientes a la vez (0 = todos)')
+    parser.add_argument('--latencia-db', type=float, default=2, help='ms por ida a la base en memoria')
+    parser.add_argument('--latencia-telegram', type=float, default=0, help='ms por llamada a la API falsa')
+    parser.add_argument('--database-url', help='Postgres real en lugar de la base en memoria')
+    parser.add_argument('--max-p95', type=float, help='fallar si el p95 global supera estos ms')
+    args = parser.parse_args()
+
+    # Los logs de cada handler taparían el reporte
+    logging.getLogger().setLevel(logging.WARNING)
+    p95 = asyncio.run(ejecutar(args))
+    if args.max_p95 is not None and p95 > args.max_p95:
+        print(f"\n❌ p95 {p95:.2f} ms supera el máximo de {args.max_p95} ms")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import json
+import asyncio
+import contextvars
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from time import time
+from typing import Optional
+
+import asyncpg
+from telegram.request import BaseRequest, RequestData
+
+import metricas
+
+# ================= CONTEO POR FLUJO =================
+# Cada usuario simulado corre en su propia tarea; lo que hace cuenta en el
+# contador que esa tarea puso aquí (idas a la base y llamadas a Telegram).
+contador: contextvars.ContextVar[Optional[Counter]] = contextvars.ContextVar('contador', default=None)
+
+def _contar(clave: str):
+    actual = contador.get()
+    if actual is not None:
+        actual[clave] += 1
+
+class HistogramaContado(metricas.Histograma):
+    """Reemplaza metricas.CONSULTAS para contar cada ida a la base (real o en memoria)"""
+    __slots__ = ()
+
+    def observar(self, segundos: float, *valores):
+        _contar('db')
+        super().observar(segundos, *valores)
+
+# ================= API DE TELEGRAM FALSA =================
+class TelegramFalso(BaseRequest):
+    """Responde como la Bot API sin salir a la red y recuerda lo enviado a cada chat"""
+
+    def __init__(self, latencia: float = 0):
+        self.latencia = latencia
+        self.llamadas = Counter()
+        self.teclados: dict[int, list[str]] = {}
+        self.textos: dict[int, str] = {}
+        self._mensajes = defaultdict(int)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _mensaje(self, parametros: dict) -> dict:
+        chat_id = int(parametros['chat_id'])
+        message_id = parametros.get('message_id')
+        if message_id is None:
+            self._mensajes[chat_id] += 1
+            message_id = self._mensajes[chat_id]
+
+        self.textos[chat_id] = parametros.get('text', '')
+        teclado = parametros.get('reply_markup')
+        if isinstance(teclado, str):
+            teclado = json.loads(teclado)
+        self.teclados[chat_id] = [
+            boton['callback_data']
+            for fila in (teclado or {}).get('inline_keyboard', [])
+            for boton in fila if 'callback_data' in boton
+        ]
+        return {
+            'message_id': int(message_id), 'date': int(time()),
+            'chat': {'id': chat_id, 'type': 'private'}, 'text': self.textos[chat_id],
+        }
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         *args, **kwargs):
+        metodo = url.rsplit('/', 1)[-1]
+        self.llamadas[metodo] += 1
+        _contar('telegram')
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+
+        parametros = request_data.parameters if request_data else {}
+        if metodo == 'getMe':
+            resultado = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif metodo in ('sendMessage', 'editMessageText'):
+            resultado = self._mensaje(parametros)
+        else:
+            resultado = True
+        return 200, json.dumps({'ok': True, 'result': resultado}).encode()
+
+# ================= POSTGRES EN MEMORIA =================
+# Implementa solo las sentencias que usan los flujos de agendar/cancelar, con
+# la misma forma de filas que devuelve asyncpg.
+class _Sentencia:
+    __slots__ = ('base', 'nombre')
+
+    def __init__(self, base: 'BaseMemoria', nombre: str):
+        self.base = base
+        self.nombre = nombre
+
+    async def _ejecutar(self, args):
+        if self.base.latencia:
+            await asyncio.sleep(self.base.latencia)
+        metodo = getattr(self.base, self.nombre, None)
+        if metodo is None:
+            raise NotImplementedError(f"La base en memoria no implementa '{self.nombre}'")
+        return metodo(*args)
+
+    async def fetch(self, *args):
+        return await self._ejecutar(args)
+
+    async def fetchrow(self, *args):
+        return await self._ejecutar(args)
+
+    async def fetchval(self, *args):
+        return await self._ejecutar(args)
+
+class BaseMemoria:
+    """Tabla `citas` en memoria con la restricción de no solaparse"""
+
+    def __init__(self, latencia: float = 0):
+        self.latencia = latencia
+        self.citas: list[dict] = []
+
+    def insertar_cita(self, estudio_id, user_id, nombre, telefono, servicio, fecha, hora, duracion_min, clave):
+        inicia_en = datetime.combine(fecha, hora)
+        termina_en = inicia_en + timedelta(minutes=duracion_min)
+        for cita in self.citas:
+            if (cita['estudio_id'] == estudio_id and cita['estado'] == 'activa'
+                    and cita['inicia_en'] < termina_en and inicia_en < cita['termina_en']):
+                raise asyncpg.ExclusionViolationError('citas_sin_solapes')
+        self.citas.append({
+            'id': len(self.citas) + 1, 'estudio_id': estudio_id, 'user_id': user_id, 'cliente_nombre': nombre,
+            'telefono': telefono, 'servicio': servicio, 'fecha': fecha, 'hora': hora,
+            'estado': 'activa', 'inicia_en': inicia_en, 'termina_en': termina_en,
+        })
+        return len(self.citas)
+
+    def ocupacion_dia(self, estudio_id, fecha):
+        return sorted(
+            (c for c in self.citas
+             if c['estudio_id'] == estudio_id and c['estado'] == 'activa' and c['fecha'] == fecha),
+            key=lambda c: c['inicia_en'],
+        )
+
+    def citas_activas(self, estudio_id, user_id):
+        return sorted(
+            (c for c in self.citas
+             if c['estudio_id'] == estudio_id and c['user_id'] == user_id and c['estado'] == 'activa'),
+            key=lambda c: (c['inicia_en'], c['id']),
+        )
+
+    def cancelar_cita(self, estudio_id, cita_id, user_id):
+        for cita in self.citas:
+            if (cita['id'] == cita_id and cita['estudio_id'] == estudio_id and cita['user_id'] == user_id
+                    and cita['estado'] == 'activa'):
+                cita['estado'] = 'cancelada'
+                return cita
+        return None
+
+class _Conexion:
+    def __init__(self, base: BaseMemoria):
+        self.sentencias = {
+            nombre: metricas.SentenciaMedida(nombre, _Sentencia(base, nombre))
+            for nombre in ('insertar_cita', 'ocupacion_dia', 'citas_activas', 'cancelar_cita')
+        }
+
+class _Adquisicion:
+    def __init__(self, conexion: _Conexion):
+        self.conexion = conexion
+
+    async def __aenter__(self):
+        return self.conexion
+
+    async def __aexit__(self, *exc):
+        return False
+
+class PoolMemoria:
+    """Lo mínimo de asyncpg.Pool que usan db.conexion() y las métricas"""
+
+    def __init__(self, base: BaseMemoria):
+        self._conexion = _Conexion(base)
+
+    def acquire(self, timeout: Optional[float] = None):
+        return _Adquisicion(self._conexion)
+
+    def get_size(self):
+        return 1
+
+    def get_idle_size(self):
+        return 1
+
+    def get_max_size(self):
+        return 1
+
+    async def close(self):
+        pass
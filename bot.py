@@ -1,16 +1,58 @@
+import arranque  # primero: mide cuánto tarda importar todo lo demás
 import os
+import asyncio
 import logging
+from datetime import datetime, timedelta
+from functools import partial
+from time import perf_counter
+from uuid import uuid4
 import asyncpg
-from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler
 
+import db
+import calendario
+import listado
+import notificaciones
+import persistencia
+import servidor
+import intenciones
+import pantallas
+import metricas
+import concurrencia
+import exportacion
+import diario
+import recordatorios
+import agenda
+import consultas
+import despachador
+import cancelaciones
+import citas_cliente
+import disponibilidad
+import estudios
+import esquema
+from catalogo import HORIZONTE_DIAS
+from formato import FORMATO_FECHA, fecha_txt, hora_txt
+
+# Las migraciones se aplican antes de preparar las sentencias en el pool
+db.al_iniciar(esquema.aplicar_migraciones)
+
+arranque.marcar('importar')
+
 # ================= CONFIGURACIÓN =================
 TOKEN = os.getenv('TELEGRAM_TOKEN')
-DATABASE_URL = os.getenv('DATABASE_URL')
-WHATSAPP_NUMERO = os.getenv('WHATSAPP_NUMERO', '+59387757446')
-ADMIN_IDS = os.getenv('ADMIN_IDS', '').split(',')
-UBICACION = "📍 Martínez-Sucre, Ecuador"
+MAX_DIAS_ESTADISTICAS = 31
+
+# Pasos de cada conversación, en orden; las transiciones se declaran en
+# MANEJAR BOTONES Y MENSAJES
+FLUJOS = {
+    'agendar': ('nombre', 'telefono', 'servicio', 'fecha', 'hora'),
+    'cancelar': ('id',),
+    'importar': ('archivo',),
+}
+# El estudio elegido por enlace sobrevive a los flujos (ver estudios.de)
+despacho = despachador.Despachador(FLUJOS, conservar=(estudios.CLAVE_ESTUDIO,))
+despacho.al_medir(metricas.medir_despacho)
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -18,30 +60,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# ================= FUNCIÓN DE NOTIFICACIONES =================
-async def notificar_admins(context, mensaje):
-    """Enviar notificación a TODOS los administradores"""
-    for admin_id in ADMIN_IDS:
-        if admin_id.strip():
-            try:
-                await context.bot.send_message(
-                    chat_id=int(admin_id.strip()),
-                    text=mensaje,
-                    parse_mode='Markdown'
-                )
-                logger.info(f"✅ Notificación enviada a admin {admin_id}")
-            except Exception as e:
-                logger.error(f"❌ Error notificando a {admin_id}: {e}")
-
-# ================= BASE DE DATOS =================
-async def get_db_connection():
-    """Conectar a Supabase"""
-    return await asyncpg.connect(DATABASE_URL)
-
 # ================= COMANDOS PRINCIPALES =================
-async def start(update: Update, context: CallbackContext):
-    user = update.effective_user
-    
+@pantallas.estatica
+def pantalla_start(estudio):
     keyboard = [
         [InlineKeyboardButton("💅 Agendar cita", callback_data='agendar')],
         [InlineKeyboardButton("❌ Cancelar cita", callback_data='cancelar')],
@@ -51,67 +72,68 @@ async def start(update: Update, context: CallbackContext):
         [InlineKeyboardButton("📋 Mis citas agendadas", callback_data='ver_citas')]
     ]
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # El saludo con el nombre se antepone en cada /start
+    texto = (
+        f"Bienvenida al *{estudio.nombre}* 💅\n\n"
+        f"{estudio.ubicacion}\n"
+        f"📞 *WhatsApp:* {estudio.whatsapp}\n\n"
+        f"*¿Qué te gustaría hacer hoy?*"
+    )
+    return texto, InlineKeyboardMarkup(keyboard)
+
+async def start(update: Update, context: CallbackContext):
+    user = update.effective_user
+    # Enlace t.me/<bot>?start=<estudio>: el cliente queda con ese estudio
+    if context.args:
+        estudios.elegir(context, context.args[0])
+    texto, reply_markup = pantalla_start(estudios.de(context))
     
     await update.message.reply_text(
-        f"✨ *Hola {user.first_name}!* ✨\n\n"
-        f"Bienvenida al *Veronica Guerra Studio* 💅\n\n"
-        f"{UBICACION}\n"
-        f"📞 *WhatsApp:* {WHATSAPP_NUMERO}\n\n"
-        f"*¿Qué te gustaría hacer hoy?*",
+        f"✨ *Hola {user.first_name}!* ✨\n\n{texto}",
         reply_markup=reply_markup,
         parse_mode='Markdown'
     )
 
 # ================= SERVICIOS =================
+@pantallas.estatica
+def pantalla_servicios(estudio):
+    texto = "💎 *NUESTROS SERVICIOS:*\n\n"
+    for servicio in estudio.servicios:
+        precio = f" — ${servicio.precio:g}" if servicio.precio is not None else ""
+        texto += f"• *{servicio.nombre}*{precio}\n"
+    if estudio.extras:
+        texto += f"\n💅 *También realizamos:*\n{estudio.extras}\n"
+    return texto + "\n📅 *Agenda tu cita ahora mismo!*"
+
 async def servicios(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
     
-    servicios_text = (
-        "💎 *NUESTROS SERVICIOS:*\n\n"
-        "• *Manicure Tradicional*\n"
-        "• *Uñas Esculpidas*\n"
-        "• *Kapping Gel*\n"
-        "• *Esmaltado Semipermanente*\n"
-        "• *Pedicure Spa*\n"
-        "• *Diseños Especiales*\n"
-        "• *Retiro de Acrílico*\n\n"
-        "💅 *También realizamos:*\n"
-        "• Decoraciones personalizadas\n"
-        "• Cristales y strass\n"
-        "• French y reverso\n"
-        "• Diseños a pedido\n\n"
-        "📅 *Agenda tu cita ahora mismo!*"
-    )
-    
     await query.edit_message_text(
-        servicios_text,
+        pantalla_servicios(estudios.de(context)),
         parse_mode='Markdown'
     )
 
 # ================= UBICACIÓN =================
+@pantallas.estatica
+def pantalla_ubicacion(estudio):
+    return (
+        f"{estudio.ubicacion}\n\n"
+        f"📍 *Dirección:*\n"
+        f"{estudio.direccion}\n\n"
+        f"🚗 *Cómo llegar:*\n"
+        f"{estudio.indicaciones}\n\n"
+        f"⏰ *Horarios:*\n"
+        f"{estudio.horario}\n\n"
+        f"¡Te esperamos! 💕"
+    )
+
 async def ubicacion(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
     
-    ubicacion_text = (
-        f"{UBICACION}\n\n"
-        "📍 *Dirección:*\n"
-        "Martínez-Sucre, Ecuador\n\n"
-        "🚗 *Cómo llegar:*\n"
-        "• Zona residencial\n"
-        "• Estacionamiento disponible\n"
-        "• Fácil acceso\n\n"
-        "⏰ *Horarios:*\n"
-        "Lunes a Viernes: 9:00 - 19:00\n"
-        "Sábados: 9:00 - 17:00\n"
-        "Domingos: Con cita previa\n\n"
-        "¡Te esperamos! 💕"
-    )
-    
     await query.edit_message_text(
-        ubicacion_text,
+        pantalla_ubicacion(estudios.de(context)),
         parse_mode='Markdown'
     )
 
@@ -121,13 +143,12 @@ async def agendar_cita_start(update: Update, context: CallbackContext):
     await query.answer()
     
     await query.edit_message_text(
-        "💅 *AGENDAR CITA - PASO 1/4*\n\n"
+        "💅 *AGENDAR CITA - PASO 1/5*\n\n"
         "Por favor, escribe tu *nombre completo*:\n"
         "(Ej: María González)",
         parse_mode='Markdown'
     )
-    context.user_data['agendando'] = True
-    context.user_data['paso'] = 'nombre'
+    despacho.iniciar(context, 'agendar')
 
 async def procesar_nombre(update: Update, context: CallbackContext):
     nombre = update.message.text
@@ -139,106 +160,106 @@ async def procesar_nombre(update: Update, context: CallbackContext):
     
     await update.message.reply_text(
         f"✅ *Nombre registrado:* {nombre}\n\n"
-        f"💅 *PASO 2/4*\n"
+        f"💅 *PASO 2/5*\n"
         f"Escribe tu *número de teléfono*:\n"
         f"(Ej: 0987654321)",
         parse_mode='Markdown'
     )
-    context.user_data['paso'] = 'telefono'
+    despacho.avanzar(context)
 
 async def procesar_telefono(update: Update, context: CallbackContext):
     telefono = update.message.text
     context.user_data['telefono'] = telefono
     
+    # Desde aquí el agendamiento sigue con botones que editan este mismo mensaje
     await update.message.reply_text(
         f"✅ *Teléfono:* {telefono}\n\n"
-        f"💅 *PASO 3/4*\n"
-        f"Selecciona el *servicio* que deseas:\n\n"
-        f"1. 💅 Manicure Tradicional\n"
-        f"2. ✨ Uñas Esculpidas\n"
-        f"3. 🌟 Kapping Gel\n"
-        f"4. 💎 Semipermante\n"
-        f"5. 🦶 Pedicure Spa\n"
-        f"6. 🎨 Diseño Especial\n"
-        f"7. 🔄 Retiro de Acrílico\n\n"
-        f"*Escribe solo el número:*",
+        f"💅 *PASO 3/5*\n"
+        f"Selecciona el *servicio* que deseas:",
+        reply_markup=calendario.teclado_servicios(estudios.de(context).servicios),
         parse_mode='Markdown'
     )
-    context.user_data['paso'] = 'servicio'
-
-async def procesar_servicio(update: Update, context: CallbackContext):
-    opcion = update.message.text
-    servicios = {
-        '1': 'Manicure Tradicional',
-        '2': 'Uñas Esculpidas',
-        '3': 'Kapping Gel',
-        '4': 'Semipermante',
-        '5': 'Pedicure Spa',
-        '6': 'Diseño Especial',
-        '7': 'Retiro de Acrílico'
-    }
-    
-    if opcion not in servicios:
-        await update.message.reply_text("❌ Opción inválida. Escribe solo el número (1-7):")
-        return
-    
-    servicio = servicios[opcion]
-    context.user_data['servicio'] = servicio
-    
-    await update.message.reply_text(
-        f"✅ *Servicio:* {servicio}\n\n"
-        f"💅 *PASO 4/4*\n"
-        f"Escribe la *fecha* de tu cita:\n"
-        f"*Formato:* DD/MM/AAAA\n"
-        f"*Ejemplo:* 25/12/2023",
+    despacho.avanzar(context)
+
+def rango_agendable():
+    """Primer y último día que se pueden elegir en el calendario"""
+    hoy = disponibilidad.ahora().date()
+    return hoy, hoy + timedelta(days=HORIZONTE_DIAS)
+
+async def mostrar_calendario(query, context: CallbackContext, mes, aviso=""):
+    desde, hasta = rango_agendable()
+    mes = min(max(mes, desde.replace(day=1)), hasta.replace(day=1))
+    await query.edit_message_text(
+        f"{aviso}"
+        f"✅ *Servicio:* {context.user_data['servicio']}\n\n"
+        f"💅 *PASO 4/5*\n"
+        f"Selecciona la *fecha* de tu cita:\n"
+        f"_Los días sin atención por el bot se agendan por WhatsApp._",
+        reply_markup=calendario.teclado_mes(mes, desde, hasta, partial(disponibilidad.abierto, estudios.de(context))),
         parse_mode='Markdown'
     )
-    context.user_data['paso'] = 'fecha'
+    despacho.ir_a(context, 'fecha')
 
-async def procesar_fecha(update: Update, context: CallbackContext):
-    fecha = update.message.text
-    try:
-        datetime.strptime(fecha, '%d/%m/%Y')
-    except ValueError:
-        await update.message.reply_text("❌ Formato incorrecto. Usa DD/MM/AAAA:")
+async def mostrar_horarios(query, context: CallbackContext, fecha_cita, aviso=""):
+    estudio = estudios.de(context)
+    duracion_min = estudio.duracion(context.user_data['servicio'])
+    libres = await disponibilidad.horarios_libres(estudio, duracion_min, fecha_cita)
+    if not libres:
+        await mostrar_calendario(
+            query, context, fecha_cita,
+            aviso=f"😔 *No quedan horarios libres el {fecha_txt(fecha_cita)}.*\n\n"
+        )
         return
     
-    context.user_data['fecha'] = fecha
-    
-    await update.message.reply_text(
-        f"✅ *Fecha:* {fecha}\n\n"
+    await query.edit_message_text(
+        f"{aviso}"
+        f"✅ *Fecha:* {fecha_txt(fecha_cita)}\n\n"
         f"💅 *PASO 5/5*\n"
-        f"Escribe la *hora* de tu cita:\n"
-        f"*Formato:* HH:MM (24 horas)\n"
-        f"*Ejemplo:* 14:30",
+        f"Selecciona la *hora* de tu cita:",
+        reply_markup=calendario.teclado_horarios(fecha_cita, libres),
         parse_mode='Markdown'
     )
-    context.user_data['paso'] = 'hora'
+    despacho.ir_a(context, 'hora')
 
-async def procesar_hora(update: Update, context: CallbackContext):
-    hora = update.message.text
-    try:
-        datetime.strptime(hora, '%H:%M')
-    except ValueError:
-        await update.message.reply_text("❌ Formato incorrecto. Usa HH:MM (ej: 14:30):")
-        return
-    
-    user_id = update.effective_user.id
+def aviso_nueva_cita(estudio, user_id, nombre, telefono, servicio, fecha, hora):
+    """Notificación para los administradores de una cita recién registrada"""
+    return (
+        f"📥 *NUEVA CITA AGENDADA*\n\n"
+        f"👤 *Cliente:* {nombre}\n"
+        f"📞 *Teléfono:* {telefono}\n"
+        f"💅 *Servicio:* {servicio}\n"
+        f"📅 *Fecha:* {fecha}\n"
+        f"⏰ *Hora:* {hora}\n"
+        f"🆔 *User ID:* {user_id}\n"
+        f"🕐 *Hora registro:* {datetime.now().strftime('%H:%M')}\n\n"
+        f"📍 *Ubicación:* {estudio.ubicacion}"
+    )
+
+async def confirmar_cita(query, context: CallbackContext, inicio):
+    estudio = estudios.de(context)
+    user_id = query.from_user.id
     nombre = context.user_data.get('nombre', '')
     telefono = context.user_data.get('telefono', '')
     servicio = context.user_data.get('servicio', '')
-    fecha = context.user_data.get('fecha', '')
+    fecha_cita, hora_cita = inicio.date(), inicio.time()
+    fecha, hora = fecha_txt(fecha_cita), hora_txt(hora_cita)
+    duracion_min = estudio.duracion(servicio)
+    # Si esta reserva se reintenta (diario), Postgres la reconoce por la clave
+    clave = uuid4().hex
     
     try:
-        conn = await get_db_connection()
-        await conn.execute('''
-            INSERT INTO citas (user_id, cliente_nombre, telefono, servicio, fecha, hora, estado)
-            VALUES ($1, $2, $3, $4, $5, $6, 'activa')
-        ''', user_id, nombre, telefono, servicio, fecha, hora)
-        await conn.close()
+        if not await disponibilidad.esta_libre(estudio, duracion_min, fecha_cita, hora_cita):
+            await mostrar_horarios(query, context, fecha_cita, aviso="⏰ *Ese horario ya no está disponible.*\n\n")
+            return
+        
+        cita_id = await consultas.insertar_cita(
+            estudio.id, user_id, nombre, telefono, servicio, fecha_cita, hora_cita, duracion_min, clave
+        )
+        disponibilidad.registrar(estudio.id, cita_id, fecha_cita, hora_cita, duracion_min, servicio, nombre, telefono)
+        citas_cliente.invalidar(user_id)
         
         # Confirmación al cliente
-        await update.message.reply_text(
+        await query.edit_message_text(
             f"🎉 *¡CITA CONFIRMADA!* 🎉\n\n"
             f"✨ *Resumen de tu cita:*\n\n"
             f"👤 *Nombre:* {nombre}\n"
@@ -246,9 +267,9 @@ async def procesar_hora(update: Update, context: CallbackContext):
             f"💅 *Servicio:* {servicio}\n"
             f"📅 *Fecha:* {fecha}\n"
             f"⏰ *Hora:* {hora}\n"
-            f"📍 *Ubicación:* {UBICACION}\n\n"
+            f"📍 *Ubicación:* {estudio.ubicacion}\n\n"
             f"✅ *Tu cita ha sido registrada exitosamente.*\n"
-            f"📱 *WhatsApp:* {WHATSAPP_NUMERO}\n\n"
+            f"📱 *WhatsApp:* {estudio.whatsapp}\n\n"
             f"*Importante:*\n"
             f"• Llega 5 minutos antes\n"
             f"• Trae tu mascarilla\n"
@@ -258,45 +279,100 @@ async def procesar_hora(update: Update, context: CallbackContext):
         )
         
         # 🔔 NOTIFICAR A AMBOS ADMINISTRADORES
-        notificacion = (
-            f"📥 *NUEVA CITA AGENDADA*\n\n"
-            f"👤 *Cliente:* {nombre}\n"
-            f"📞 *Teléfono:* {telefono}\n"
-            f"💅 *Servicio:* {servicio}\n"
-            f"📅 *Fecha:* {fecha}\n"
-            f"⏰ *Hora:* {hora}\n"
-            f"🆔 *User ID:* {user_id}\n"
-            f"🕐 *Hora registro:* {datetime.now().strftime('%H:%M')}\n\n"
-            f"📍 *Ubicación:* {UBICACION}"
+        notificaciones.notificar_admins(
+            aviso_nueva_cita(estudio, user_id, nombre, telefono, servicio, fecha, hora), estudio.admins
         )
-        await notificar_admins(context, notificacion)
         
+    except asyncpg.ExclusionViolationError:
+        # Otra persona confirmó un horario que se solapa justo antes
+        disponibilidad.invalidar(estudio.id, fecha_cita)
+        await mostrar_horarios(query, context, fecha_cita, aviso="⏰ *Ese horario ya no está disponible.*\n\n")
+        return
+    except db.ERRORES_CONEXION as e:
+        # Supabase no responde: la reserva queda en el diario y se registra al volver
+        logger.warning(f"Supabase no disponible al guardar cita, se anota en el diario: {e}")
+        try:
+            await diario.anotar_cita(
+                estudio.id, user_id, nombre, telefono, servicio, fecha_cita, hora_cita, duracion_min, clave
+            )
+        except Exception as e:
+            logger.error(f"Error al anotar cita en el diario: {e}")
+            await query.edit_message_text(
+                "❌ *Ocurrió un error al guardar tu cita.*\n"
+                "Por favor, intenta nuevamente o contáctanos por WhatsApp."
+            )
+        else:
+            await query.edit_message_text(
+                f"🕐 *CITA RECIBIDA (PENDIENTE)*\n\n"
+                f"💅 *Servicio:* {servicio}\n"
+                f"📅 *Fecha:* {fecha}\n"
+                f"⏰ *Hora:* {hora}\n\n"
+                f"Nuestro sistema está un poco lento. Tu reserva está guardada y "
+                f"te escribiremos aquí mismo en cuanto quede confirmada.\n\n"
+                f"📱 *WhatsApp:* {estudio.whatsapp}",
+                parse_mode='Markdown'
+            )
     except Exception as e:
         logger.error(f"Error al guardar cita: {e}")
-        await update.message.reply_text(
+        await query.edit_message_text(
             "❌ *Ocurrió un error al guardar tu cita.*\n"
             "Por favor, intenta nuevamente o contáctanos por WhatsApp."
         )
     
     # Limpiar datos temporales
-    context.user_data.clear()
+    despacho.terminar(context)
+
+async def agenda_callback(update: Update, context: CallbackContext):
+    """Botones de servicio, calendario y horarios del agendamiento"""
+    query = update.callback_query
+    accion, valor = calendario.decodificar(query.data)
+    
+    if accion == 'x':
+        await query.answer()
+        return
+    flujo, paso = despacho.estado(context)
+    if flujo != 'agendar' or paso in ('nombre', 'telefono'):
+        await query.answer("⌛ Este agendamiento ya terminó. Usa /start para empezar de nuevo.", show_alert=True)
+        return
+    await query.answer()
+    
+    estudio = estudios.de(context)
+    try:
+        if accion == 's':
+            servicio = estudio.servicio(valor)
+            if servicio is None:
+                return
+            context.user_data['servicio'] = servicio.nombre
+            await mostrar_calendario(query, context, disponibilidad.ahora().date())
+        elif 'servicio' not in context.user_data:
+            return
+        elif accion == 'm':
+            await mostrar_calendario(query, context, valor)
+        elif accion == 'd':
+            desde, hasta = rango_agendable()
+            if desde <= valor <= hasta and disponibilidad.abierto(estudio, valor):
+                await mostrar_horarios(query, context, valor)
+        elif accion == 'h':
+            # confirmar_cita limpia user_data cuando termina el agendamiento
+            await confirmar_cita(query, context, valor)
+    except Exception as e:
+        logger.error(f"Error en el agendamiento: {e}")
+        await query.edit_message_text(
+            "❌ *No pudimos consultar la agenda.*\n"
+            "Intenta nuevamente o contáctanos por WhatsApp.",
+            parse_mode='Markdown'
+        )
 
 # ================= VER CITAS =================
 async def ver_citas(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
     
+    estudio = estudios.de(context)
     user_id = update.effective_user.id
     
     try:
-        conn = await get_db_connection()
-        citas = await conn.fetch('''
-            SELECT id, cliente_nombre, servicio, fecha, hora, estado
-            FROM citas 
-            WHERE user_id = $1 AND estado = 'activa'
-            ORDER BY fecha, hora
-        ''', user_id)
-        await conn.close()
+        citas = await citas_cliente.activas(estudio.id, user_id)
         
         if citas:
             texto = "📋 *TUS CITAS ACTIVAS:*\n\n"
@@ -304,20 +380,20 @@ async def ver_citas(update: Update, context: CallbackContext):
                 texto += f"🆔 *ID:* {cita['id']}\n"
                 texto += f"👤 *Cliente:* {cita['cliente_nombre']}\n"
                 texto += f"💅 *Servicio:* {cita['servicio']}\n"
-                texto += f"📅 *Fecha:* {cita['fecha']}\n"
-                texto += f"⏰ *Hora:* {cita['hora']}\n"
+                texto += f"📅 *Fecha:* {fecha_txt(cita['fecha'])}\n"
+                texto += f"⏰ *Hora:* {hora_txt(cita['hora'])}\n"
                 texto += "────────────\n"
             
             texto += "\n*Para cancelar una cita:*\n"
             texto += "1. Selecciona '❌ Cancelar cita'\n"
             texto += "2. Escribe el *ID* de la cita\n\n"
-            texto += f"📞 *Dudas:* {WHATSAPP_NUMERO}"
+            texto += f"📞 *Dudas:* {estudio.whatsapp}"
         else:
             texto = (
                 "📭 *No tienes citas agendadas.*\n\n"
                 "¿Te gustaría agendar una cita ahora? 💅\n\n"
-                f"📍 *Ubicación:* {UBICACION}\n"
-                f"📞 *WhatsApp:* {WHATSAPP_NUMERO}"
+                f"📍 *Ubicación:* {estudio.ubicacion}\n"
+                f"📞 *WhatsApp:* {estudio.whatsapp}"
             )
         
         await query.edit_message_text(texto, parse_mode='Markdown')
@@ -334,17 +410,11 @@ async def cancelar_cita_start(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
     
+    estudio = estudios.de(context)
     user_id = update.effective_user.id
     
     try:
-        conn = await get_db_connection()
-        citas = await conn.fetch('''
-            SELECT id, cliente_nombre, servicio, fecha, hora
-            FROM citas 
-            WHERE user_id = $1 AND estado = 'activa'
-            ORDER BY fecha, hora
-        ''', user_id)
-        await conn.close()
+        citas = await citas_cliente.activas(estudio.id, user_id)
         
         if citas:
             texto = "❌ *CANCELAR CITA*\n\n"
@@ -354,270 +424,301 @@ async def cancelar_cita_start(update: Update, context: CallbackContext):
                 texto += f"🆔 *ID:* {cita['id']}\n"
                 texto += f"👤 {cita['cliente_nombre']}\n"
                 texto += f"💅 {cita['servicio']}\n"
-                texto += f"📅 {cita['fecha']} - ⏰ {cita['hora']}\n"
+                texto += f"📅 {fecha_txt(cita['fecha'])} - ⏰ {hora_txt(cita['hora'])}\n"
                 texto += "──────\n"
             
             texto += "\n✍️ *Escribe el ID de la cita que deseas cancelar:*\n\n"
-            texto += f"📍 *Ubicación:* {UBICACION}"
+            texto += f"📍 *Ubicación:* {estudio.ubicacion}"
             
             await query.edit_message_text(texto, parse_mode='Markdown')
-            context.user_data['cancelando'] = True
+            despacho.iniciar(context, 'cancelar')
         else:
             await query.edit_message_text(
                 "📭 *No tienes citas activas para cancelar.*\n\n"
-                f"📍 *Ubicación:* {UBICACION}"
+                f"📍 *Ubicación:* {estudio.ubicacion}"
             )
             
     except Exception as e:
         logger.error(f"Error al obtener citas para cancelar: {e}")
         await query.edit_message_text("❌ *Error.* Intenta más tarde.")
 
+def aviso_cita_cancelada(estudio, cita, user_id):
+    """Notificación para los administradores de una cita cancelada por el cliente"""
+    return (
+        f"❌ *CITA CANCELADA*\n\n"
+        f"🆔 *ID Cita:* {cita['id']}\n"
+        f"👤 *Cliente:* {cita['cliente_nombre']}\n"
+        f"💅 *Servicio:* {cita['servicio']}\n"
+        f"📅 *Fecha:* {fecha_txt(cita['fecha'])}\n"
+        f"⏰ *Hora:* {hora_txt(cita['hora'])}\n"
+        f"🆔 *User ID:* {user_id}\n"
+        f"🕐 *Hora cancelación:* {datetime.now().strftime('%H:%M')}\n\n"
+        f"{estudio.ubicacion}"
+    )
+
 async def procesar_cancelacion(update: Update, context: CallbackContext):
+    estudio = estudios.de(context)
     user_id = update.effective_user.id
     cita_id = update.message.text.strip()
     
     try:
         cita_id_int = int(cita_id)
         
-        conn = await get_db_connection()
-        cita = await conn.fetchrow('''
-            SELECT id, cliente_nombre, servicio, fecha, hora 
-            FROM citas 
-            WHERE id = $1 AND user_id = $2 AND estado = 'activa'
-        ''', cita_id_int, user_id)
+        cita = await cancelaciones.cancelar_cita_cliente(estudio.id, cita_id_int, user_id)
         
         if cita:
-            await conn.execute('''
-                UPDATE citas SET estado = 'cancelada' 
-                WHERE id = $1 AND user_id = $2
-            ''', cita_id_int, user_id)
-            
-            await conn.close()
-            
             await update.message.reply_text(
                 f"✅ *CITA CANCELADA EXITOSAMENTE*\n\n"
                 f"*Detalles cancelados:*\n"
                 f"🆔 *ID:* {cita_id}\n"
                 f"👤 *Cliente:* {cita['cliente_nombre']}\n"
                 f"💅 *Servicio:* {cita['servicio']}\n"
-                f"📅 *Fecha:* {cita['fecha']}\n"
-                f"⏰ *Hora:* {cita['hora']}\n\n"
+                f"📅 *Fecha:* {fecha_txt(cita['fecha'])}\n"
+                f"⏰ *Hora:* {hora_txt(cita['hora'])}\n\n"
                 f"*Si deseas reagendar:*\n"
                 f"Usa '💅 Agendar cita'\n\n"
-                f"📞 *WhatsApp:* {WHATSAPP_NUMERO}\n"
-                f"{UBICACION}",
+                f"📞 *WhatsApp:* {estudio.whatsapp}\n"
+                f"{estudio.ubicacion}",
                 parse_mode='Markdown'
             )
             
             # 🔔 NOTIFICAR A AMBOS ADMINISTRADORES
-            notificacion = (
-                f"❌ *CITA CANCELADA*\n\n"
-                f"🆔 *ID Cita:* {cita_id}\n"
-                f"👤 *Cliente:* {cita['cliente_nombre']}\n"
-                f"💅 *Servicio:* {cita['servicio']}\n"
-                f"📅 *Fecha:* {cita['fecha']}\n"
-                f"⏰ *Hora:* {cita['hora']}\n"
-                f"🆔 *User ID:* {user_id}\n"
-                f"🕐 *Hora cancelación:* {datetime.now().strftime('%H:%M')}\n\n"
-                f"{UBICACION}"
-            )
-            await notificar_admins(context, notificacion)
+            notificaciones.notificar_admins(aviso_cita_cancelada(estudio, cita, user_id), estudio.admins)
         else:
             await update.message.reply_text(
                 "❌ *No se encontró una cita activa con ese ID.*\n"
                 "Verifica el ID y vuelve a intentar.\n\n"
-                f"📍 *Ubicación:* {UBICACION}"
+                f"📍 *Ubicación:* {estudio.ubicacion}"
             )
             
     except ValueError:
         await update.message.reply_text(
             "❌ *ID inválido.* Escribe solo el número (ej: 1, 2, 3).\n\n"
-            f"📍 *Ubicación:* {UBICACION}"
+            f"📍 *Ubicación:* {estudio.ubicacion}"
         )
+    except db.ERRORES_CONEXION as e:
+        logger.warning(f"Supabase no disponible al cancelar, se anota en el diario: {e}")
+        try:
+            await diario.anotar_cancelacion(estudio.id, cita_id_int, user_id)
+        except Exception as e:
+            logger.error(f"Error al anotar cancelación en el diario: {e}")
+            await update.message.reply_text(
+                "❌ *Error al cancelar la cita.*\n"
+                "Intenta más tarde o contáctanos por WhatsApp.\n\n"
+                f"📍 *Ubicación:* {estudio.ubicacion}"
+            )
+        else:
+            await update.message.reply_text(
+                f"🕐 *Cancelación recibida (pendiente)*\n\n"
+                f"Te avisaremos aquí en cuanto la cita {cita_id_int} quede cancelada.\n\n"
+                f"📞 *WhatsApp:* {estudio.whatsapp}",
+                parse_mode='Markdown'
+            )
     except Exception as e:
         logger.error(f"Error al cancelar cita: {e}")
         await update.message.reply_text(
             "❌ *Error al cancelar la cita.*\n"
             "Intenta más tarde o contáctanos por WhatsApp.\n\n"
-            f"📍 *Ubicación:* {UBICACION}"
+            f"📍 *Ubicación:* {estudio.ubicacion}"
         )
     
-    if 'cancelando' in context.user_data:
-        del context.user_data['cancelando']
+    despacho.terminar(context)
+
+# ================= OPERACIONES RECUPERADAS DEL DIARIO =================
+@diario.al_resolver
+async def operacion_recuperada(tipo, datos, resultado):
+    """Avisar al cliente (y a los admins) cómo terminó una operación que quedó pendiente"""
+    estudio = estudios.por_id(diario.estudio_de(datos))
+    user_id = datos['user_id']
+    if tipo == 'cita':
+        fecha = fecha_txt(datetime.fromisoformat(datos['fecha']))
+        hora = datos['hora'][:5]
+        if resultado is None:
+            notificaciones.encolar(
+                user_id,
+                f"😔 *No pudimos confirmar tu cita pendiente*\n\n"
+                f"💅 {datos['servicio']} - 📅 {fecha} ⏰ {hora}\n\n"
+                f"Ese horario se ocupó mientras tanto. Usa /start para elegir otro "
+                f"o escríbenos al {estudio.whatsapp}."
+            )
+            return
+        notificaciones.encolar(
+            user_id,
+            f"🎉 *¡CITA CONFIRMADA!* 🎉\n\n"
+            f"🆔 *ID:* {resultado}\n"
+            f"💅 *Servicio:* {datos['servicio']}\n"
+            f"📅 *Fecha:* {fecha}\n"
+            f"⏰ *Hora:* {hora}\n"
+            f"📍 *Ubicación:* {estudio.ubicacion}\n\n"
+            f"¡Te esperamos! 💕"
+        )
+        notificaciones.notificar_admins(aviso_nueva_cita(
+            estudio, user_id, datos['nombre'], datos['telefono'], datos['servicio'], fecha, hora
+        ), estudio.admins)
+    elif tipo == 'cancelacion':
+        if resultado is None:
+            notificaciones.encolar(
+                user_id,
+                f"❌ *No se encontró una cita activa con el ID {datos['cita_id']}.*\n"
+                f"Tu cancelación pendiente no se aplicó."
+            )
+            return
+        notificaciones.encolar(user_id, f"✅ *Tu cita {resultado['id']} quedó cancelada.*")
+        notificaciones.notificar_admins(aviso_cita_cancelada(estudio, resultado, user_id), estudio.admins)
 
 # ================= WHATSAPP =================
-async def contactar_whatsapp(update: Update, context: CallbackContext):
-    query = update.callback_query
-    await query.answer()
-    
-    whatsapp_text = (
+@pantallas.estatica
+def pantalla_whatsapp(estudio):
+    horario = "\n".join(f"• {linea}" for linea in estudio.horario.splitlines())
+    return (
         f"📱 *CONTACTO DIRECTO POR WHATSAPP*\n\n"
-        f"👉 *Número:* `+593 87757446`\n\n"
+        f"👉 *Número:* `{estudio.whatsapp}`\n\n"
         f"📲 *Enlace directo:*\n"
-        f"https://wa.me/59387757446\n\n"
+        f"{estudio.enlace_whatsapp}\n\n"
         f"*Horario de atención:*\n"
-        f"• Lunes a Viernes: 9:00 - 19:00\n"
-        f"• Sábados: 9:00 - 17:00\n"
-        f"• Domingos: Con cita previa\n\n"
+        f"{horario}\n\n"
         f"📍 *Ubicación:*\n"
-        f"{UBICACION}\n\n"
+        f"{estudio.ubicacion}\n\n"
         f"¡Estaremos encantadas de atenderte! 💕"
     )
+
+async def contactar_whatsapp(update: Update, context: CallbackContext):
+    query = update.callback_query
+    await query.answer()
     
     await query.edit_message_text(
-        whatsapp_text,
+        pantalla_whatsapp(estudios.de(context)),
         parse_mode='Markdown',
         disable_web_page_preview=False
     )
 
-# ================= MANEJAR BOTONES =================
-async def button_handler(update: Update, context: CallbackContext):
-    query = update.callback_query
-    data = query.data
-    
-    if data == 'agendar':
-        await agendar_cita_start(update, context)
-    elif data == 'cancelar':
-        await cancelar_cita_start(update, context)
-    elif data == 'whatsapp':
-        await contactar_whatsapp(update, context)
-    elif data == 'ubicacion':
-        await ubicacion(update, context)
-    elif data == 'servicios':
-        await servicios(update, context)
-    elif data == 'ver_citas':
-        await ver_citas(update, context)
-
-# ================= MANEJAR MENSAJES =================
-async def manejar_mensajes(update: Update, context: CallbackContext):
-    texto = update.message.text.lower()
-    
-    # Procesar agendamiento
-    if context.user_data.get('agendando'):
-        paso = context.user_data.get('paso', '')
-        
-        if paso == 'nombre':
-            await procesar_nombre(update, context)
-        elif paso == 'telefono':
-            await procesar_telefono(update, context)
-        elif paso == 'servicio':
-            await procesar_servicio(update, context)
-        elif paso == 'fecha':
-            await procesar_fecha(update, context)
-        elif paso == 'hora':
-            await procesar_hora(update, context)
-            del context.user_data['agendando']
-            del context.user_data['paso']
-        return
-    
-    # Procesar cancelación
-    if context.user_data.get('cancelando'):
-        await procesar_cancelacion(update, context)
-        return
-    
-    # Respuestas automáticas
-    if any(palabra in texto for palabra in ['hola', 'buenas', 'hi', 'hello']):
-        await update.message.reply_text(
-            f"¡Hola! 👋\n\n"
-            f"Bienvenida al *Veronica Guerra Studio* 💅\n\n"
-            f"📍 {UBICACION}\n"
-            f"📞 WhatsApp: {WHATSAPP_NUMERO}\n\n"
-            f"Escribe /start para ver todas las opciones.",
-            parse_mode='Markdown'
-        )
-    elif any(palabra in texto for palabra in ['gracias', 'thank you', 'thanks']):
-        await update.message.reply_text(
-            "¡De nada! 💕\n"
-            "Es un placer atenderte.\n\n"
-            "¡Te esperamos en el estudio! ✨"
-        )
-    elif any(palabra in texto for palabra in ['adiós', 'chao', 'bye', 'hasta luego']):
+# ================= RESPUESTAS AUTOMÁTICAS =================
+async def usar_botones(update: Update, context: CallbackContext):
+    """Texto escrito en un paso que se responde con botones"""
+    await update.message.reply_text("👆 Usa los botones del mensaje anterior para continuar.")
+
+@pantallas.estatica
+def respuesta_intencion(intencion, estudio):
+    return intencion.respuesta.format(
+        estudio=estudio.nombre, ubicacion=estudio.ubicacion, whatsapp=estudio.whatsapp,
+        horario="\n".join(f"• {linea}" for linea in estudio.horario.splitlines()),
+    )
+
+async def respuestas_automaticas(update: Update, context: CallbackContext):
+    """Mensajes de usuarios que no están agendando ni cancelando"""
+    estudio = estudios.de(context)
+    intencion = intenciones.clasificar(update.message.text)
+    if intencion is not None:
         await update.message.reply_text(
-            "¡Hasta luego! 💕\n"
-            "Que tengas un lindo día.\n\n"
-            f"📍 {UBICACION}"
+            respuesta_intencion(intencion, estudio),
+            parse_mode='Markdown' if intencion.markdown else None
         )
     else:
         await update.message.reply_text(
             "🤔 *No estoy segura de qué necesitas.*\n\n"
             "Usa /start para ver el menú principal o selecciona una opción:\n\n"
-            f"📍 *Ubicación:* {UBICACION}\n"
-            f"📞 *WhatsApp:* {WHATSAPP_NUMERO}",
+            f"📍 *Ubicación:* {estudio.ubicacion}\n"
+            f"📞 *WhatsApp:* {estudio.whatsapp}",
             parse_mode='Markdown'
         )
 
 # ================= COMANDOS DE ADMINISTRADOR =================
 async def admin_citas(update: Update, context: CallbackContext):
-    """Ver todas las citas (solo admin)"""
-    user_id = str(update.effective_user.id)
-    if user_id not in ADMIN_IDS:
+    """Ver citas por páginas (solo admin): /admin_citas [activa|cancelada] [desde] [hasta] [servicio]"""
+    estudio = estudios.de(context)
+    if not estudio.es_admin(update.effective_user.id):
         await update.message.reply_text("❌ No autorizado.")
         return
     
     try:
-        conn = await get_db_connection()
-        citas = await conn.fetch('''
-            SELECT id, user_id, cliente_nombre, telefono, servicio, fecha, hora, estado
-            FROM citas 
-            ORDER BY fecha, hora
-        ''')
-        await conn.close()
-        
-        if citas:
-            texto = "📊 *TODAS LAS CITAS REGISTRADAS:*\n\n"
-            for cita in citas:
-                estado_emoji = "✅" if cita['estado'] == 'activa' else "❌"
-                texto += f"{estado_emoji} *ID:* {cita['id']}\n"
-                texto += f"👤 *Cliente:* {cita['cliente_nombre']}\n"
-                texto += f"📞 *Teléfono:* {cita['telefono']}\n"
-                texto += f"💅 *Servicio:* {cita['servicio']}\n"
-                texto += f"📅 *Fecha:* {cita['fecha']}\n"
-                texto += f"⏰ *Hora:* {cita['hora']}\n"
-                texto += f"🆔 *User ID:* `{cita['user_id']}`\n"
-                texto += f"📊 *Estado:* {cita['estado']}\n"
-                texto += "────────────\n"
-            
-            texto += f"\n📈 *Total:* {len(citas)} citas\n"
-            activas = sum(1 for c in citas if c['estado'] == 'activa')
-            texto += f"✅ *Activas:* {activas}\n"
-            texto += f"❌ *Canceladas:* {len(citas) - activas}"
-        else:
-            texto = "📭 *No hay citas registradas.*"
-        
-        await update.message.reply_text(texto, parse_mode='Markdown')
+        filtros = listado.filtros_desde_args(context.args, estudio)
+    except ValueError:
+        await update.message.reply_text(
+            "✍️ *Uso:* /admin_citas [activa|cancelada] [desde] [hasta] [servicio]\n"
+            "(Ej: /admin_citas activa 01/10/2026 31/10/2026 2)",
+            parse_mode='Markdown'
+        )
+        return
+    
+    try:
+        citas, hay_anterior, hay_siguiente = await listado.cargar_pagina(estudio, filtros)
+        texto, reply_markup = listado.render_pagina(estudio, citas, filtros, hay_anterior, hay_siguiente)
+        await update.message.reply_text(texto, reply_markup=reply_markup, parse_mode='Markdown')
         
     except Exception as e:
         logger.error(f"Error admin_citas: {e}")
         await update.message.reply_text("❌ Error al obtener citas.")
 
+async def admin_citas_pagina(update: Update, context: CallbackContext):
+    """Botones ⬅️/➡️ del listado de /admin_citas"""
+    query = update.callback_query
+    estudio = estudios.de(context)
+    if not estudio.es_admin(query.from_user.id):
+        await query.answer("❌ No autorizado.")
+        return
+    await query.answer()
+    
+    try:
+        atras, cursor, filtros = listado.decodificar(query.data)
+        citas, hay_anterior, hay_siguiente = await listado.cargar_pagina(estudio, filtros, cursor, atras)
+        texto, reply_markup = listado.render_pagina(estudio, citas, filtros, hay_anterior, hay_siguiente)
+        await query.edit_message_text(texto, reply_markup=reply_markup, parse_mode='Markdown')
+        
+    except Exception as e:
+        logger.error(f"Error admin_citas_pagina: {e}")
+        await query.edit_message_text("❌ Error al obtener citas.")
+
 async def admin_estadisticas(update: Update, context: CallbackContext):
     """Estadísticas (solo admin)"""
-    user_id = str(update.effective_user.id)
-    if user_id not in ADMIN_IDS:
+    estudio = estudios.de(context)
+    if not estudio.es_admin(update.effective_user.id):
         await update.message.reply_text("❌ No autorizado.")
         return
     
+    # Rango opcional: /admin_estadisticas [desde] [hasta] (DD/MM/AAAA), por defecto últimos 7 días
     try:
-        conn = await get_db_connection()
-        
-        total = await conn.fetchval('SELECT COUNT(*) FROM citas')
-        activas = await conn.fetchval('SELECT COUNT(*) FROM citas WHERE estado = $1', 'activa')
-        canceladas = await conn.fetchval('SELECT COUNT(*) FROM citas WHERE estado = $1', 'cancelada')
-        hoy = await conn.fetchval('''
-            SELECT COUNT(*) FROM citas 
-            WHERE creado_en::date = CURRENT_DATE
-        ''')
-        
-        await conn.close()
+        fechas = [datetime.strptime(arg, FORMATO_FECHA).date() for arg in context.args[:2]]
+    except ValueError:
+        await update.message.reply_text(
+            "✍️ *Uso:* /admin_estadisticas [desde] [hasta]\n"
+            "(Ej: /admin_estadisticas 01/10/2026 15/10/2026)",
+            parse_mode='Markdown'
+        )
+        return
+    hasta = fechas[1] if len(fechas) > 1 else datetime.now().date()
+    desde = fechas[0] if fechas else hasta - timedelta(days=6)
+    if desde > hasta:
+        desde, hasta = hasta, desde
+    desde = max(desde, hasta - timedelta(days=MAX_DIAS_ESTADISTICAS - 1))
+    
+    try:
+        stats, (por_dia, por_servicio) = await asyncio.gather(
+            consultas.estadisticas(estudio.id),
+            consultas.desglose_estadisticas(estudio.id, desde, hasta),
+        )
         
         texto = (
             "📊 *ESTADÍSTICAS DEL ESTUDIO*\n\n"
-            f"📈 *Total citas:* {total}\n"
-            f"✅ *Citas activas:* {activas}\n"
-            f"❌ *Citas canceladas:* {canceladas}\n"
-            f"📅 *Citas hoy:* {hoy}\n\n"
-            f"📍 *Ubicación:* {UBICACION}\n"
-            f"📞 *WhatsApp:* {WHATSAPP_NUMERO}"
+            f"📈 *Total citas:* {stats['total']}\n"
+            f"✅ *Citas activas:* {stats['activas']}\n"
+            f"❌ *Citas canceladas:* {stats['canceladas']}\n"
+            f"📅 *Citas hoy:* {stats['hoy']}\n\n"
+            f"🗓️ *Del {fecha_txt(desde)} al {fecha_txt(hasta)}:*\n"
+        )
+        
+        if por_dia:
+            texto += "\n*Por día:*\n"
+            for fila in por_dia:
+                texto += f"📅 {fila['dia'].strftime('%d/%m')}: {fila['creadas']} (❌ {fila['canceladas']})\n"
+            texto += "\n*Por servicio:*\n"
+            for fila in por_servicio:
+                texto += f"💅 {fila['servicio']}: {fila['creadas']} (❌ {fila['canceladas']})\n"
+        else:
+            texto += "📭 Sin citas registradas en ese rango.\n"
+        
+        texto += (
+            f"\n📍 *Ubicación:* {estudio.ubicacion}\n"
+            f"📞 *WhatsApp:* {estudio.whatsapp}"
         )
         
         await update.message.reply_text(texto, parse_mode='Markdown')
@@ -626,23 +727,320 @@ async def admin_estadisticas(update: Update, context: CallbackContext):
         logger.error(f"Error admin_estadisticas: {e}")
         await update.message.reply_text("❌ Error al obtener estadísticas.")
 
+async def admin_agenda(update: Update, context: CallbackContext):
+    """Agenda de un día con huecos libres (solo admin): /admin_agenda [fecha]"""
+    estudio = estudios.de(context)
+    if not estudio.es_admin(update.effective_user.id):
+        await update.message.reply_text("❌ No autorizado.")
+        return
+    
+    try:
+        fecha = datetime.strptime(context.args[0], FORMATO_FECHA).date() if context.args else disponibilidad.ahora().date()
+    except ValueError:
+        await update.message.reply_text(
+            "✍️ *Uso:* /admin_agenda [fecha]\n"
+            "(Ej: /admin_agenda 20/10/2026; sin fecha, la de hoy)",
+            parse_mode='Markdown'
+        )
+        return
+    
+    try:
+        await update.message.reply_text(await agenda.agenda(estudio, fecha), parse_mode='Markdown')
+    except Exception as e:
+        logger.error(f"Error admin_agenda: {e}")
+        await update.message.reply_text("❌ Error al obtener la agenda.")
+
+async def admin_cancelar(update: Update, context: CallbackContext):
+    """Cancelar varias citas por ID (solo admin): /admin_cancelar 12 15 18"""
+    estudio = estudios.de(context)
+    if not estudio.es_admin(update.effective_user.id):
+        await update.message.reply_text("❌ No autorizado.")
+        return
+    
+    try:
+        ids = [int(arg.strip(',')) for arg in context.args]
+    except ValueError:
+        ids = []
+    if not ids:
+        await update.message.reply_text(
+            "✍️ *Uso:* /admin_cancelar ID [ID ...]\n"
+            "(Ej: /admin_cancelar 12 15 18)",
+            parse_mode='Markdown'
+        )
+        return
+    
+    try:
+        citas = await cancelaciones.cancelar_citas_admin(estudio.id, ids, update.effective_user.id)
+    except Exception as e:
+        logger.error(f"Error admin_cancelar: {e}")
+        await update.message.reply_text("❌ Error al cancelar las citas.")
+        return
+    
+    if citas:
+        texto = f"✅ *{len(citas)} cita(s) cancelada(s):*\n\n"
+        for cita in citas:
+            texto += f"🆔 {cita['id']} - 👤 {cita['cliente_nombre']} - 📅 {fecha_txt(cita['fecha'])} ⏰ {hora_txt(cita['hora'])}\n"
+    else:
+        texto = "📭 *Ninguna de esas citas estaba activa.*"
+    
+    sin_cambios = len(set(ids)) - len(citas)
+    if citas and sin_cambios:
+        texto += f"\n⚠️ *{sin_cambios} ID(s) no estaban activos.*"
+    
+    await update.message.reply_text(texto, parse_mode='Markdown')
+    
+    # Avisar a cada cliente afectado (en segundo plano); las citas importadas
+    # de planillas (user_id 0) no tienen a quién avisar
+    for cita in citas:
+        if not cita['user_id']:
+            continue
+        notificaciones.encolar(
+            cita['user_id'],
+            f"❌ *Tu cita fue cancelada por el estudio*\n\n"
+            f"💅 *Servicio:* {cita['servicio']}\n"
+            f"📅 *Fecha:* {fecha_txt(cita['fecha'])}\n"
+            f"⏰ *Hora:* {hora_txt(cita['hora'])}\n\n"
+            f"📱 *Escríbenos para reagendar:* {estudio.whatsapp}"
+        )
+
+async def admin_export(update: Update, context: CallbackContext):
+    """Descargar citas en CSV (solo admin): /admin_export [activa|cancelada] [desde] [hasta] [servicio]"""
+    estudio = estudios.de(context)
+    if not estudio.es_admin(update.effective_user.id):
+        await update.message.reply_text("❌ No autorizado.")
+        return
+    
+    try:
+        filtros = listado.filtros_desde_args(context.args, estudio)
+    except ValueError:
+        await update.message.reply_text(
+            "✍️ *Uso:* /admin_export [activa|cancelada] [desde] [hasta] [servicio]\n"
+            "(Ej: /admin_export activa 01/10/2026 31/10/2026)",
+            parse_mode='Markdown'
+        )
+        return
+    
+    try:
+        archivo, filas, nombre = await exportacion.exportar(estudio, filtros)
+    except Exception as e:
+        logger.error(f"Error admin_export: {e}")
+        await update.message.reply_text("❌ Error al exportar las citas.")
+        return
+    
+    with archivo:
+        if not filas:
+            await update.message.reply_text("📭 *No hay citas con esos filtros.*", parse_mode='Markdown')
+            return
+        await update.message.reply_document(
+            document=archivo,
+            filename=nombre,
+            caption=f"📤 {filas} cita(s) exportada(s)"
+        )
+
+async def admin_import(update: Update, context: CallbackContext):
+    """Cargar citas históricas desde un CSV (solo admin)"""
+    estudio = estudios.de(context)
+    if not estudio.es_admin(update.effective_user.id):
+        await update.message.reply_text("❌ No autorizado.")
+        return
+    
+    despacho.iniciar(context, 'importar')
+    await update.message.reply_text(
+        "📥 *IMPORTAR CITAS*\n\n"
+        "Envía el archivo CSV (o .csv.gz) con las columnas:\n"
+        "`cliente_nombre, telefono, servicio, fecha, hora`\n"
+        "y opcionalmente `user_id, duracion_min, estado, creado_en`.\n"
+        "Fechas DD/MM/AAAA, horas HH:MM. Sirve el mismo formato de /admin_export.\n\n"
+        "Escribe cualquier mensaje para cancelar.",
+        parse_mode='Markdown'
+    )
+
+async def procesar_importacion(update: Update, context: CallbackContext):
+    estudio = estudios.de(context)
+    documento = update.message.document
+    if not estudio.es_admin(update.effective_user.id):
+        despacho.terminar(context)
+        return
+    if documento.file_size and documento.file_size > exportacion.IMPORT_MAX_BYTES:
+        await update.message.reply_text("❌ El archivo es demasiado grande (máx. 20 MB).")
+        return
+    
+    try:
+        archivo = await documento.get_file()
+        columnas, registros, errores = exportacion.leer_csv(bytes(await archivo.download_as_bytearray()), estudio)
+    except Exception as e:
+        logger.error(f"Error leyendo importación: {e}")
+        await update.message.reply_text("❌ No se pudo leer el archivo. ¿Es un CSV en UTF-8?")
+        return
+    
+    if errores:
+        # Sin Markdown: los errores pueden traer _ o * del archivo
+        await update.message.reply_text(
+            "❌ No se importó nada, corrige el archivo y vuelve a enviarlo:\n\n" + "\n".join(errores)
+        )
+        return
+    if not registros:
+        await update.message.reply_text("📭 El archivo no tiene filas.")
+        return
+    
+    try:
+        filas = await exportacion.importar(estudio, columnas, registros)
+    except asyncpg.ExclusionViolationError:
+        await update.message.reply_text(
+            "❌ No se importó nada: hay citas activas que se solapan entre sí o con la agenda actual.\n"
+            "Márcalas como cancelada en el archivo o corrige sus horarios."
+        )
+        return
+    except Exception as e:
+        logger.error(f"Error admin_import: {e}")
+        await update.message.reply_text(f"❌ No se importó nada: {e}")
+        return
+    
+    despacho.terminar(context)
+    await update.message.reply_text(f"✅ *{filas} cita(s) importada(s).*", parse_mode='Markdown')
+
+async def cancelar_importacion(update: Update, context: CallbackContext):
+    despacho.terminar(context)
+    await update.message.reply_text("❌ Importación cancelada.")
+
+async def admin_recargar(update: Update, context: CallbackContext):
+    """Releer intenciones.json y la configuración de estudios, y reconstruir los menús (solo admin)"""
+    estudio = estudios.de(context)
+    if not estudio.es_admin(update.effective_user.id):
+        await update.message.reply_text("❌ No autorizado.")
+        return
+    
+    try:
+        intenciones.cargar()
+        await estudios.cargar()
+    except Exception as e:
+        # Si el archivo tiene errores se siguen usando las respuestas anteriores
+        logger.error(f"Error admin_recargar: {e}")
+        await update.message.reply_text(f"❌ No se pudo recargar la configuración: {e}")
+        return
+    pantallas.invalidar()
+    
+    await update.message.reply_text("✅ Configuración recargada.")
+
+# ================= MANEJAR BOTONES Y MENSAJES =================
+# Menú principal
+despacho.boton('agendar', agendar_cita_start)
+despacho.boton('cancelar', cancelar_cita_start)
+despacho.boton('whatsapp', contactar_whatsapp)
+despacho.boton('ubicacion', ubicacion)
+despacho.boton('servicios', servicios)
+despacho.boton('ver_citas', ver_citas)
+despacho.prefijo(calendario.PREFIJO, agenda_callback)
+despacho.prefijo(listado.PREFIJO, admin_citas_pagina)
+
+# Agendamiento: nombre → teléfono por texto, el resto con botones
+despacho.mensaje('agendar', 'nombre', procesar_nombre)
+despacho.mensaje('agendar', 'telefono', procesar_telefono)
+for paso in ('servicio', 'fecha', 'hora'):
+    despacho.mensaje('agendar', paso, usar_botones)
+
+# Cancelación: el cliente escribe el ID
+despacho.mensaje('cancelar', 'id', procesar_cancelacion)
+
+# Importación (admin): se espera un documento; cualquier texto la cancela
+despacho.mensaje('importar', 'archivo', procesar_importacion, tipo='archivo')
+despacho.mensaje('importar', 'archivo', cancelar_importacion)
+
+despacho.sin_estado(respuestas_automaticas)
+
 # ================= INICIALIZAR BOT =================
+async def post_init(app: Application):
+    """Preparar recursos compartidos antes de recibir updates"""
+    # Hasta aquí: getMe y, con persistencia, el pool y las conversaciones guardadas
+    arranque.marcar('inicializar')
+    await db.iniciar_pool()
+    # El primer cliente después de un deploy no espera conexiones ni sentencias preparadas
+    await db.calentar()
+    arranque.marcar('base de datos')
+    await estudios.iniciar(app.bot.id)
+    await notificaciones.iniciar(app.bot, estudios.ADMIN_IDS)
+    estudios.programar(app.job_queue)
+    recordatorios.programar(app.job_queue)
+    agenda.programar(app.job_queue)
+    citas_cliente.iniciar()
+    await diario.iniciar()
+    
+    pool = db.obtener_pool()
+    metricas.indicador('bot_db_conexiones', 'Conexiones abiertas en el pool', pool.get_size)
+    metricas.indicador('bot_db_conexiones_libres', 'Conexiones sin usar en el pool', pool.get_idle_size)
+    metricas.indicador('bot_db_conexiones_max', 'Tamaño máximo del pool', pool.get_max_size)
+    metricas.indicador('bot_notificaciones_pendientes', 'Mensajes en la cola de notificaciones', notificaciones.pendientes)
+    metricas.indicador('bot_updates_pendientes', 'Updates esperando a ser procesados', app.update_queue.qsize)
+    metricas.indicador('bot_diario_pendientes', 'Operaciones esperando a Supabase', diario.pendientes)
+    metricas.indicador('bot_arranque_segundos', 'Segundos desde el arranque hasta atender updates', arranque.total)
+    await servidor.iniciar_http_polling(app)
+    arranque.marcar('servicios')
+    arranque.reportar()
+
+async def post_stop(app: Application):
+    """Vaciar el diario y la cola de notificaciones mientras el bot todavía puede enviar
+
+    Corre después de que PTB terminó los updates en curso (también al recibir
+    SIGTERM); la persistencia se guarda después, en Application.shutdown().
+    """
+    inicio = perf_counter()
+    # El diario avisa a clientes y admins: va antes de vaciar las notificaciones
+    await diario.detener()
+    await citas_cliente.detener()
+    await notificaciones.detener()
+    logger.info(f"🛑 Pendientes vaciados en {perf_counter() - inicio:.2f}s")
+
+async def post_shutdown(app: Application):
+    """Liberar recursos compartidos al apagar el bot"""
+    await servidor.detener_http_polling()
+    await db.cerrar_pool()
+
+def registrar_handlers(app: Application):
+    """Comandos, botones y mensajes (también los usa el benchmark de bench/)"""
+    app.add_handler(CommandHandler("start", metricas.medir(start)))
+    app.add_handler(CommandHandler("admin_citas", metricas.medir(admin_citas)))
+    app.add_handler(CommandHandler("admin_estadisticas", metricas.medir(admin_estadisticas)))
+    app.add_handler(CommandHandler("admin_agenda", metricas.medir(admin_agenda)))
+    app.add_handler(CommandHandler("admin_cancelar", metricas.medir(admin_cancelar)))
+    app.add_handler(CommandHandler("admin_recargar", metricas.medir(admin_recargar)))
+    app.add_handler(CommandHandler("admin_export", metricas.medir(admin_export)))
+    app.add_handler(CommandHandler("admin_import", metricas.medir(admin_import)))
+    app.add_handler(CallbackQueryHandler(despacho.despachar_callback))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, despacho.despachar_mensaje))
+    app.add_handler(MessageHandler(filters.Document.ALL, despacho.despachar_archivo))
+
 def main():
     if not TOKEN:
         logger.error("❌ Faltan credenciales")
         return
     
-    app = Application.builder().token(TOKEN).build()
+    intenciones.cargar()
     
-    # Handlers
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("admin_citas", admin_citas))
-    app.add_handler(CommandHandler("admin_estadisticas", admin_estadisticas))
-    app.add_handler(CallbackQueryHandler(button_handler))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, manejar_mensajes))
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        # Mide cada llamada a la API de Telegram (getUpdates va por su propio cliente)
+        .request(metricas.PeticionMedida(connection_pool_size=256))
+    )
+    builder = concurrencia.configurar(builder)
+    if servidor.modo_webhook():
+        # Los updates llegan por HTTP, no hace falta el Updater de polling
+        builder = builder.updater(None)
+    estado = persistencia.crear_persistencia(conservar=(estudios.CLAVE_ESTUDIO,))
+    if estado is not None:
+        builder = builder.persistence(estado)
+    app = builder.build()
+    registrar_handlers(app)
+    arranque.marcar('construir')
     
     logger.info("🤖 Veronica Guerra Studio Bot iniciado...")
-    app.run_polling()
+    if servidor.modo_webhook():
+        asyncio.run(servidor.ejecutar_webhook(app))
+    else:
+        app.run_polling()
 
 if __name__ == '__main__':
     main()
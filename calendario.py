@@ -0,0 +1,87 @@
+import calendar
+from datetime import date, datetime, time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from formato import hora_txt
+
+# ================= TECLADOS DEL AGENDAMIENTO =================
+# callback_data compacto (máx. 64 bytes):
+#   ag:s:<opción>          servicio elegido
+#   ag:m:AAAAMM            mostrar un mes del calendario
+#   ag:d:AAAAMMDD          día elegido -> horarios libres
+#   ag:h:AAAAMMDDHHMM      horario elegido -> confirmar cita
+#   ag:x                   botón decorativo (no hace nada)
+PREFIJO = 'ag'
+NADA = f'{PREFIJO}:x'
+MESES = [
+    'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+    'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'
+]
+DIAS_SEMANA = ['L', 'M', 'M', 'J', 'V', 'S', 'D']
+HORARIOS_POR_FILA = 4
+
+def decodificar(data: str):
+    """Convertir el callback_data en (acción, valor); el valor ya viene tipado"""
+    partes = data.split(':')
+    accion = partes[1]
+    valor = partes[2] if len(partes) > 2 else ''
+    if accion == 'm':
+        return accion, date(int(valor[:4]), int(valor[4:6]), 1)
+    if accion == 'd':
+        return accion, datetime.strptime(valor, '%Y%m%d').date()
+    if accion == 'h':
+        return accion, datetime.strptime(valor, '%Y%m%d%H%M')
+    return accion, valor
+
+def teclado_servicios(servicios) -> InlineKeyboardMarkup:
+    """Un botón por servicio del catálogo del estudio"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"{servicio.emoji} {servicio.nombre}", callback_data=f'{PREFIJO}:s:{servicio.opcion}')]
+        for servicio in servicios
+    ])
+
+def _mes_siguiente(mes: date) -> date:
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+def _mes_anterior(mes: date) -> date:
+    return date(mes.year - (mes.month == 1), (mes.month - 2) % 12 + 1, 1)
+
+def teclado_mes(mes: date, desde: date, hasta: date, abierto) -> InlineKeyboardMarkup:
+    """Calendario de un mes; solo se pueden tocar los días entre `desde` y `hasta` en que `abierto(día)`"""
+    mes = mes.replace(day=1)
+    anterior = _mes_anterior(mes)
+    siguiente = _mes_siguiente(mes)
+
+    filas = [[
+        InlineKeyboardButton("«", callback_data=f"{PREFIJO}:m:{anterior:%Y%m}")
+        if anterior >= desde.replace(day=1) else InlineKeyboardButton(" ", callback_data=NADA),
+        InlineKeyboardButton(f"{MESES[mes.month - 1]} {mes.year}", callback_data=NADA),
+        InlineKeyboardButton("»", callback_data=f"{PREFIJO}:m:{siguiente:%Y%m}")
+        if siguiente <= hasta else InlineKeyboardButton(" ", callback_data=NADA),
+    ]]
+    filas.append([InlineKeyboardButton(dia, callback_data=NADA) for dia in DIAS_SEMANA])
+
+    for semana in calendar.monthcalendar(mes.year, mes.month):
+        fila = []
+        for numero in semana:
+            if not numero:
+                fila.append(InlineKeyboardButton(" ", callback_data=NADA))
+                continue
+            dia = mes.replace(day=numero)
+            if desde <= dia <= hasta and abierto(dia):
+                fila.append(InlineKeyboardButton(str(numero), callback_data=f"{PREFIJO}:d:{dia:%Y%m%d}"))
+            else:
+                fila.append(InlineKeyboardButton("·", callback_data=NADA))
+        filas.append(fila)
+    return InlineKeyboardMarkup(filas)
+
+def teclado_horarios(fecha: date, libres: list[time]) -> InlineKeyboardMarkup:
+    """Horarios libres de un día, más un botón para volver al calendario"""
+    botones = [
+        InlineKeyboardButton(hora_txt(hora), callback_data=f"{PREFIJO}:h:{fecha:%Y%m%d}{hora:%H%M}")
+        for hora in libres
+    ]
+    filas = [botones[i:i + HORARIOS_POR_FILA] for i in range(0, len(botones), HORARIOS_POR_FILA)]
+    filas.append([InlineKeyboardButton("⬅️ Cambiar fecha", callback_data=f"{PREFIJO}:m:{fecha:%Y%m}")])
+    return InlineKeyboardMarkup(filas)
@@ -0,0 +1,34 @@
+import logging
+from typing import Optional
+
+import asyncpg
+
+import consultas
+import disponibilidad
+import citas_cliente
+
+logger = logging.getLogger(__name__)
+
+# ================= CANCELACIONES =================
+# Cada cancelación es un único UPDATE ... RETURNING: no hay ventana entre
+# comprobar y actualizar, y repetir la misma cancelación no tiene efecto.
+
+async def cancelar_cita_cliente(estudio_id: str, cita_id: int, user_id: int) -> Optional[asyncpg.Record]:
+    """Cancelar una cita del propio cliente; None si no hay cita activa con ese ID en el estudio"""
+    cita = await consultas.cancelar_cita(estudio_id, cita_id, user_id)
+    if cita:
+        disponibilidad.liberar(estudio_id, cita['id'], cita['fecha'])
+        citas_cliente.invalidar(user_id)
+        logger.info(f"❌ Cita {cita_id} cancelada por el cliente {user_id}")
+    return cita
+
+async def cancelar_citas_admin(estudio_id: str, ids: list[int], admin_id: int) -> list[asyncpg.Record]:
+    """Cancelar en bloque (solo admin del estudio); devuelve solo las citas que seguían activas"""
+    if not ids:
+        return []
+    citas = await consultas.cancelar_citas(estudio_id, sorted(set(ids)))
+    for cita in citas:
+        disponibilidad.liberar(estudio_id, cita['id'], cita['fecha'])
+        citas_cliente.invalidar(cita['user_id'])
+    logger.info(f"❌ Admin {admin_id} canceló {len(citas)} de {len(ids)} citas")
+    return citas
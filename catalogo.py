@@ -0,0 +1,54 @@
+import os
+from datetime import time
+from zoneinfo import ZoneInfo
+
+# ================= CATÁLOGO DE SERVICIOS =================
+# Opción que escribe el cliente -> nombre guardado en `citas.servicio`
+SERVICIOS = {
+    '1': 'Manicure Tradicional',
+    '2': 'Uñas Esculpidas',
+    '3': 'Kapping Gel',
+    '4': 'Semipermante',
+    '5': 'Pedicure Spa',
+    '6': 'Diseño Especial',
+    '7': 'Retiro de Acrílico'
+}
+EMOJIS = {
+    '1': '💅',
+    '2': '✨',
+    '3': '🌟',
+    '4': '💎',
+    '5': '🦶',
+    '6': '🎨',
+    '7': '🔄'
+}
+
+# Duración de cada servicio en minutos (se guarda en `citas.duracion_min`)
+DURACIONES = {
+    'Manicure Tradicional': 45,
+    'Uñas Esculpidas': 120,
+    'Kapping Gel': 90,
+    'Semipermante': 60,
+    'Pedicure Spa': 60,
+    'Diseño Especial': 90,
+    'Retiro de Acrílico': 45
+}
+DURACION_POR_DEFECTO = 60
+
+# ================= HORARIO DE ATENCIÓN =================
+# weekday() -> (apertura, cierre). Los domingos solo con cita previa por WhatsApp.
+HORARIOS = {
+    0: (time(9, 0), time(19, 0)),
+    1: (time(9, 0), time(19, 0)),
+    2: (time(9, 0), time(19, 0)),
+    3: (time(9, 0), time(19, 0)),
+    4: (time(9, 0), time(19, 0)),
+    5: (time(9, 0), time(17, 0)),
+}
+INTERVALO_MINUTOS = 30
+HORIZONTE_DIAS = int(os.getenv('HORIZONTE_DIAS', '60'))
+ZONA_HORARIA = ZoneInfo(os.getenv('ZONA_HORARIA', 'America/Guayaquil'))
+
+def duracion(servicio: str) -> int:
+    """Minutos que ocupa un servicio en la agenda"""
+    return DURACIONES.get(servicio, DURACION_POR_DEFECTO)
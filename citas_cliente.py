@@ -0,0 +1,115 @@
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from time import monotonic
+from typing import Optional
+
+import asyncpg
+
+import db
+import consultas
+
+# ================= CONFIGURACIÓN =================
+CITAS_CACHE_TTL = float(os.getenv('CITAS_CACHE_TTL', '60'))
+CITAS_CACHE_MAX = int(os.getenv('CITAS_CACHE_MAX', '5000'))
+# Con varias instancias, escuchar los cambios de las demás (LISTEN/NOTIFY)
+CITAS_CACHE_ESCUCHAR = os.getenv('CITAS_CACHE_ESCUCHAR', '0') == '1'
+CANAL = 'citas_cambios'
+
+logger = logging.getLogger(__name__)
+
+# ================= CACHÉ DE CITAS ACTIVAS POR CLIENTE =================
+# "Mis citas" y "Cancelar cita" muestran lo mismo y se tocan seguido: se
+# guarda el resultado por user_id y estudio (LRU, máximo CITAS_CACHE_MAX
+# clientes) y se descarta cuando cambia alguna de sus citas o tras
+# CITAS_CACHE_TTL segundos.
+# El trigger de la migración 0007 avisa por NOTIFY de cada cambio en `citas`,
+# así las demás instancias también invalidan.
+# user_id -> estudio_id -> (cuándo, citas)
+_cache: OrderedDict[int, dict[str, tuple[float, list[asyncpg.Record]]]] = OrderedDict()
+# Invalidaciones de todos los clientes, y por cliente mientras alguien consulta
+# sus citas: user_id -> [consultas en curso, invalidaciones]
+_generacion = 0
+_cargando: dict[int, list[int]] = {}
+_escucha: Optional[asyncio.Task] = None
+
+async def activas(estudio_id: str, user_id: int) -> list[asyncpg.Record]:
+    """Citas activas del cliente en el estudio, sin consultar Postgres si están en caché"""
+    entrada = _cache.get(user_id, {}).get(estudio_id)
+    if entrada and monotonic() - entrada[0] < CITAS_CACHE_TTL:
+        _cache.move_to_end(user_id)
+        return entrada[1]
+
+    generacion = _generacion
+    estado = _cargando.setdefault(user_id, [0, 0])
+    estado[0] += 1
+    generacion_usuario = estado[1]
+    try:
+        citas = await consultas.citas_activas(estudio_id, user_id)
+    finally:
+        estado[0] -= 1
+        if not estado[0]:
+            del _cargando[user_id]
+    # Si sus citas (o las de todos) se invalidaron mientras se consultaba, el resultado puede estar viejo
+    if generacion == _generacion and generacion_usuario == estado[1]:
+        _cache.setdefault(user_id, {})[estudio_id] = (monotonic(), citas)
+        _cache.move_to_end(user_id)
+        while len(_cache) > CITAS_CACHE_MAX:
+            _cache.popitem(last=False)
+    return citas
+
+def invalidar(user_id: Optional[int] = None):
+    """Olvidar las citas de un cliente (o de todos)"""
+    global _generacion
+    if user_id is None:
+        _generacion += 1
+        _cache.clear()
+    else:
+        if user_id in _cargando:
+            _cargando[user_id][1] += 1
+        _cache.pop(user_id, None)
+
+# ================= INVALIDACIÓN ENTRE INSTANCIAS =================
+def _al_notificar(conn, pid, canal, payload):
+    try:
+        invalidar(int(payload))
+    except ValueError:
+        invalidar()
+
+async def _escuchar():
+    # Conexión propia: las del pool hacen UNLISTEN al devolverse
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(db.DATABASE_URL)
+            perdida = asyncio.Event()
+            conn.add_termination_listener(lambda _: perdida.set())
+            await conn.add_listener(CANAL, _al_notificar)
+            # Mientras no se escuchaba pudieron perderse avisos
+            invalidar()
+            logger.info(f"👂 Escuchando cambios de citas ({CANAL})")
+            await perdida.wait()
+            logger.warning("⚠️ Se perdió la conexión de LISTEN, reconectando")
+        except asyncio.CancelledError:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error escuchando cambios de citas: {e}")
+        await asyncio.sleep(5)
+
+def iniciar():
+    """Empezar a escuchar las invalidaciones de otras instancias (si está activado)"""
+    global _escucha
+    if CITAS_CACHE_ESCUCHAR and _escucha is None:
+        _escucha = asyncio.create_task(_escuchar(), name='citas_cliente')
+
+async def detener():
+    """Dejar de escuchar"""
+    global _escucha
+    if _escucha is None:
+        return
+    _escucha.cancel()
+    await asyncio.gather(_escucha, return_exceptions=True)
+    _escucha = None
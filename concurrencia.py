@@ -0,0 +1,121 @@
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Application
+from telegram.ext._application import _STOP_SIGNAL
+
+import metricas
+import limitador
+
+# ================= CONFIGURACIÓN =================
+# Updates procesándose a la vez; 1 vuelve al modo secuencial de PTB
+BOT_CONCURRENCIA = int(os.getenv('BOT_CONCURRENCIA', '16'))
+# Updates de un mismo usuario esperando turno; los que pasen de aquí se descartan
+BOT_COLA_USUARIO = int(os.getenv('BOT_COLA_USUARIO', '20'))
+
+logger = logging.getLogger(__name__)
+
+# ================= UPDATES EN PARALELO, EN ORDEN POR USUARIO =================
+class AplicacionOrdenada(Application):
+    """Application que atiende a varios clientes a la vez sin desordenar a ninguno
+
+    Reemplaza el lector de `update_queue` de PTB (que lanza una tarea por
+    update y le da un lugar antes de saber de quién es): cada usuario con
+    updates pendientes tiene su propia cola y una sola tarea que la procesa en
+    orden, así los pasos del agendamiento en `user_data` se aplican en el orden
+    en que llegaron. Esa tarea pide uno de los BOT_CONCURRENCIA lugares por
+    update, de modo que un cliente que manda muchos mensajes seguidos ocupa a
+    lo sumo un lugar y nunca deja esperando a los demás. Lo que el limitador
+    corta se descarta aquí mismo, sin llegar a ninguna cola.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # clave -> updates en espera de ese usuario (hay tarea mientras exista)
+        self._colas: dict[Optional[int], deque] = {}
+        self._lugares = asyncio.Semaphore(BOT_CONCURRENCIA)
+        # Tareas propias, no las de `create_task`: stop() apaga `running` antes
+        # de vaciar la cola y PTB avisaría por cada update que queda
+        self._tareas: set[asyncio.Task] = set()
+
+    @staticmethod
+    def _clave(update: object) -> Optional[int]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    async def stop(self) -> None:
+        await super().stop()
+        # update_queue.join() ya esperó a los workers; quedan las respuestas del limitador
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+
+    async def _update_fetcher(self) -> None:
+        # Mismo contrato que el de PTB 20.x: cada update recibe un task_done()
+        # y el _STOP_SIGNAL descarta lo que quede en update_queue
+        while True:
+            try:
+                update = await self.update_queue.get()
+                if update is _STOP_SIGNAL:
+                    while not self.update_queue.empty():
+                        self.update_queue.get_nowait()
+                        self.update_queue.task_done()
+                    self.update_queue.task_done()
+                    return
+                self._encolar(update)
+            except asyncio.CancelledError:
+                logger.warning("⚠️ Lector de updates cancelado; solo se detiene con Application.stop")
+
+    def _lanzar(self, corrutina):
+        tarea = asyncio.create_task(corrutina)
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+    def _encolar(self, update: object):
+        # El limitador decide antes de que el update espere turno o lugar
+        motivo = limitador.admitir(update)
+        if motivo is not None:
+            self._lanzar(limitador.rechazar(update, motivo))
+            self.update_queue.task_done()
+            return
+        clave = self._clave(update)
+        cola = self._colas.get(clave)
+        if cola is None:
+            cola = self._colas[clave] = deque()
+            self._lanzar(self._atender(clave, cola))
+        elif clave is not None and len(cola) >= BOT_COLA_USUARIO:
+            metricas.DESCARTADOS.sumar('cola')
+            self.update_queue.task_done()
+            return
+        cola.append(update)
+
+    async def _atender(self, clave: Optional[int], cola: deque):
+        try:
+            while cola:
+                update = cola.popleft()
+                try:
+                    async with self._lugares:
+                        await self.process_update(update)
+                except Exception as e:
+                    logger.error(f"❌ Error procesando un update: {e}")
+                finally:
+                    self.update_queue.task_done()
+        finally:
+            # Sin nada pendiente la cola se olvida; el próximo update crea otra
+            del self._colas[clave]
+
+def configurar(builder):
+    """Atender los updates con AplicacionOrdenada en un ApplicationBuilder"""
+    builder = builder.application_class(AplicacionOrdenada)
+    if BOT_CONCURRENCIA <= 1:
+        return builder
+    logger.info(f"🔀 Hasta {BOT_CONCURRENCIA} updates en paralelo (en orden por usuario)")
+    # `concurrent_updates` solo informa a PTB; las colas y el límite los pone AplicacionOrdenada
+    return builder.concurrent_updates(BOT_CONCURRENCIA)
@@ -0,0 +1,336 @@
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+import asyncpg
+
+import db
+import metricas
+
+logger = logging.getLogger(__name__)
+
+# ================= SENTENCIAS =================
+# Cada sentencia se prepara una sola vez por conexión del pool (ver `preparar_sentencias`)
+SENTENCIAS = {
+    # La clave de idempotencia hace que repetir un INSERT (p. ej. al reproducir
+    # el diario, ver diario.py) no duplique la cita: devuelve NULL si ya existe
+    'insertar_cita': '''
+        INSERT INTO citas (estudio_id, user_id, cliente_nombre, telefono, servicio, fecha, hora, duracion_min,
+                           estado, clave_idempotencia)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, 'activa', $9)
+        ON CONFLICT (clave_idempotencia) DO NOTHING
+        RETURNING id
+    ''',
+    # Varias citas en una sentencia; devuelve el ID de cada clave, incluidas las
+    # que ya estaban registradas de un intento anterior
+    'insertar_citas': '''
+        WITH nuevas AS (
+            INSERT INTO citas (estudio_id, user_id, cliente_nombre, telefono, servicio, fecha, hora, duracion_min,
+                               estado, clave_idempotencia)
+            SELECT e, u, n, t, s, f, h, d, 'activa', c
+            FROM unnest($1::text[], $2::bigint[], $3::text[], $4::text[], $5::text[], $6::date[], $7::time[],
+                        $8::int[], $9::text[]) AS x(e, u, n, t, s, f, h, d, c)
+            ON CONFLICT (clave_idempotencia) DO NOTHING
+            RETURNING id, clave_idempotencia
+        )
+        SELECT id, clave_idempotencia FROM nuevas
+        UNION ALL
+        SELECT id, clave_idempotencia FROM citas WHERE clave_idempotencia = ANY($9::text[])
+    ''',
+    'ocupacion_dia': '''
+        SELECT id, inicia_en, termina_en, servicio, cliente_nombre, telefono
+        FROM citas
+        WHERE estudio_id = $1 AND estado = 'activa' AND inicia_en >= $2::date AND inicia_en < $2::date + 1
+        ORDER BY inicia_en
+    ''',
+    'citas_activas': '''
+        SELECT id, cliente_nombre, servicio, fecha, hora, estado
+        FROM citas
+        WHERE user_id = $2 AND estudio_id = $1 AND estado = 'activa'
+        ORDER BY inicia_en, id
+    ''',
+    'cancelar_cita': '''
+        UPDATE citas SET estado = 'cancelada'
+        WHERE id = $2 AND user_id = $3 AND estudio_id = $1 AND estado = 'activa'
+        RETURNING id, user_id, cliente_nombre, servicio, fecha, hora
+    ''',
+    'cancelar_citas': '''
+        UPDATE citas SET estado = 'cancelada'
+        WHERE id = ANY($2::bigint[]) AND estudio_id = $1 AND estado = 'activa'
+        RETURNING id, user_id, cliente_nombre, servicio, fecha, hora
+    ''',
+    # Recordatorios (ver recordatorios.py): usan citas_recordatorio_pendiente_idx
+    'recordatorios_pendientes': '''
+        SELECT id
+        FROM citas
+        WHERE estado = 'activa' AND recordatorio_enviado_en IS NULL
+          AND inicia_en > $2 AND inicia_en <= $3 AND estudio_id = ANY($1::text[])
+          AND user_id <> 0  -- citas importadas sin cliente de Telegram
+        ORDER BY inicia_en
+        LIMIT $4
+    ''',
+    'marcar_recordados': '''
+        UPDATE citas SET recordatorio_enviado_en = now()
+        WHERE id = ANY($1::bigint[]) AND estado = 'activa' AND recordatorio_enviado_en IS NULL
+        RETURNING id, user_id, cliente_nombre, servicio, fecha, hora
+    ''',
+    # Estado de las conversaciones (ver persistencia.py)
+    'cargar_estados': '''
+        SELECT user_id, datos, actualizado_en
+        FROM estado_conversaciones
+        WHERE actualizado_en > now() - $1::interval OR datos ?| $2::text[]
+    ''',
+    'estado_usuario': '''
+        SELECT datos, actualizado_en
+        FROM estado_conversaciones
+        WHERE user_id = $1
+    ''',
+    'guardar_estados': '''
+        WITH borrados AS (
+            DELETE FROM estado_conversaciones WHERE user_id = ANY($3::bigint[])
+        )
+        INSERT INTO estado_conversaciones (user_id, datos, actualizado_en)
+        SELECT user_id, datos::jsonb, now()
+        FROM unnest($1::bigint[], $2::text[]) AS nuevos(user_id, datos)
+        ON CONFLICT (user_id) DO UPDATE
+            SET datos = EXCLUDED.datos, actualizado_en = EXCLUDED.actualizado_en
+    ''',
+    'purgar_estados': '''
+        DELETE FROM estado_conversaciones
+        WHERE actualizado_en < now() - $1::interval AND NOT datos ?| $2::text[]
+    ''',
+    'estadisticas': '''
+        SELECT
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE estado = 'activa') AS activas,
+            COUNT(*) FILTER (WHERE estado = 'cancelada') AS canceladas,
+            COUNT(*) FILTER (
+                WHERE creado_en >= CURRENT_DATE AND creado_en < CURRENT_DATE + 1
+            ) AS hoy
+        FROM citas
+        WHERE estudio_id = $1
+    ''',
+    'desglose_estadisticas': '''
+        SELECT dia, servicio, SUM(creadas) AS creadas, SUM(canceladas) AS canceladas
+        FROM citas_resumen
+        WHERE estudio_id = $1 AND dia >= $2 AND dia <= $3
+        GROUP BY GROUPING SETS ((dia), (servicio))
+        ORDER BY dia, creadas DESC
+    ''',
+    # Configuración de los estudios (ver estudios.py)
+    'version_configuracion': '''
+        SELECT version FROM configuracion_version
+    ''',
+    'configuracion_estudios': '''
+        SELECT id, nombre, bot_id, ubicacion, direccion, indicaciones, horario, whatsapp, extras
+        FROM estudios
+        ORDER BY id
+    ''',
+    'configuracion_servicios': '''
+        SELECT estudio_id, opcion, nombre, emoji, duracion_min, precio
+        FROM estudio_servicios
+        ORDER BY estudio_id, length(opcion), opcion
+    ''',
+    'configuracion_admins': '''
+        SELECT estudio_id, user_id FROM estudio_admins
+    ''',
+    'configuracion_horarios': '''
+        SELECT estudio_id, dia, apertura, cierre FROM estudio_horarios
+    ''',
+}
+
+# Paginación por cursor (keyset) sobre (inicia_en, id) con el índice
+# citas_estudio_inicio_id_idx. Cada combinación de filtros es una sentencia
+# aparte, preparada la primera vez que se usa en cada conexión: con filtros
+# opcionales del tipo `$n IS NULL OR ...` Postgres termina usando un plan
+# genérico que recorre y ordena todo el historial del estudio.
+COLUMNAS_PAGINA = 'id, user_id, cliente_nombre, telefono, servicio, fecha, hora, estado'
+FILTROS_PAGINA = (
+    ('estado', 'estado = ${}'),
+    ('desde', 'inicia_en >= ${}::date'),
+    ('hasta', 'inicia_en < ${}::date + 1'),
+    ('servicio', 'servicio = ${}'),
+)
+
+# COPY no usa sentencias preparadas: se ejecuta con copy_from_query / copy_records_to_table
+COPIA_CITAS = '''
+    SELECT id, user_id, cliente_nombre, telefono, servicio, fecha, hora, duracion_min, estado, creado_en
+    FROM citas
+    WHERE estudio_id = $1
+      AND ($2::text IS NULL OR estado = $2)
+      AND ($3::date IS NULL OR inicia_en >= $3::date)
+      AND ($4::date IS NULL OR inicia_en < $4::date + 1)
+      AND ($5::text IS NULL OR servicio = $5)
+    ORDER BY inicia_en, id
+'''
+
+@db.al_conectar
+async def preparar_sentencias(conn):
+    """Preparar todas las sentencias en una conexión nueva del pool"""
+    for nombre, sql in SENTENCIAS.items():
+        conn.sentencias[nombre] = metricas.SentenciaMedida(nombre, await conn.prepare(sql))
+
+async def _preparada(conn, nombre: str, clave: str, sql: str):
+    """Sentencia armada en tiempo de ejecución, preparada una sola vez por conexión"""
+    sentencia = conn.sentencias.get(clave)
+    if sentencia is None:
+        sentencia = conn.sentencias[clave] = metricas.SentenciaMedida(nombre, await conn.prepare(sql))
+    return sentencia
+
+# ================= CITAS =================
+async def insertar_cita(estudio_id: str, user_id: int, nombre: str, telefono: str, servicio: str,
+                        fecha: date, hora: time, duracion_min: int, clave: str) -> Optional[int]:
+    """Registrar una cita activa y devolver su ID (None si esa clave ya se registró)
+
+    Lanza `asyncpg.ExclusionViolationError` si se solapa con otra cita activa del estudio.
+    """
+    async with db.conexion() as conn:
+        return await conn.sentencias['insertar_cita'].fetchval(
+            estudio_id, user_id, nombre, telefono, servicio, fecha, hora, duracion_min, clave
+        )
+
+async def insertar_citas(citas: list[tuple]) -> dict[str, int]:
+    """Registrar varias citas `(estudio_id, user_id, nombre, telefono, servicio, fecha, hora, duracion_min, clave)`
+
+    Devuelve clave -> ID. Todas o ninguna: un solape lanza `asyncpg.ExclusionViolationError`.
+    """
+    columnas = [list(columna) for columna in zip(*citas)]
+    async with db.conexion() as conn:
+        filas = await conn.sentencias['insertar_citas'].fetch(*columnas)
+    return {fila['clave_idempotencia']: fila['id'] for fila in filas}
+
+async def ocupacion_dia(estudio_id: str, fecha: date) -> list[asyncpg.Record]:
+    """Intervalos (inicia_en, termina_en) de las citas activas de un día en el estudio"""
+    async with db.conexion() as conn:
+        return await conn.sentencias['ocupacion_dia'].fetch(estudio_id, fecha)
+
+async def citas_activas(estudio_id: str, user_id: int) -> list[asyncpg.Record]:
+    """Citas activas de un cliente en el estudio, ordenadas por fecha y hora"""
+    async with db.conexion() as conn:
+        return await conn.sentencias['citas_activas'].fetch(estudio_id, user_id)
+
+async def cancelar_cita(estudio_id: str, cita_id: int, user_id: int) -> Optional[asyncpg.Record]:
+    """Cancelar la cita activa del cliente; None si no existe, es de otro estudio o ya estaba cancelada"""
+    async with db.conexion() as conn:
+        return await conn.sentencias['cancelar_cita'].fetchrow(estudio_id, cita_id, user_id)
+
+async def cancelar_citas(estudio_id: str, ids: list[int]) -> list[asyncpg.Record]:
+    """Cancelar varias citas activas del estudio de una vez y devolver las afectadas"""
+    async with db.conexion() as conn:
+        return await conn.sentencias['cancelar_citas'].fetch(estudio_id, ids)
+
+# ================= RECORDATORIOS =================
+async def recordatorios_pendientes(estudio_ids: list[str], desde: datetime, hasta: datetime, limite: int) -> list[int]:
+    """IDs de las citas activas de esos estudios entre dos instantes que aún no tienen recordatorio"""
+    async with db.conexion() as conn:
+        filas = await conn.sentencias['recordatorios_pendientes'].fetch(estudio_ids, desde, hasta, limite)
+    return [fila['id'] for fila in filas]
+
+async def marcar_recordados(ids: list[int]) -> list[asyncpg.Record]:
+    """Marcar varias citas como recordadas; devuelve solo las que nadie había marcado antes"""
+    async with db.conexion() as conn:
+        return await conn.sentencias['marcar_recordados'].fetch(ids)
+
+# ================= ESTADO DE CONVERSACIONES =================
+async def cargar_estados(ttl: timedelta, conservar: list[str]) -> list[asyncpg.Record]:
+    """Estados guardados que no han caducado o que tienen alguna clave de `conservar`"""
+    async with db.conexion() as conn:
+        return await conn.sentencias['cargar_estados'].fetch(ttl, conservar)
+
+async def estado_usuario(user_id: int) -> Optional[asyncpg.Record]:
+    """Estado guardado de un usuario (para instancias que comparten estado)"""
+    async with db.conexion() as conn:
+        return await conn.sentencias['estado_usuario'].fetchrow(user_id)
+
+async def guardar_estados(user_ids: list[int], datos: list[str], borrar: list[int]) -> None:
+    """Guardar (JSON) y borrar estados de varios usuarios en una sola sentencia"""
+    async with db.conexion() as conn:
+        await conn.sentencias['guardar_estados'].fetch(user_ids, datos, borrar)
+
+async def purgar_estados(ttl: timedelta, conservar: list[str]) -> None:
+    """Borrar estados de conversaciones abandonadas (salvo los que tienen algo que conservar)"""
+    async with db.conexion() as conn:
+        await conn.sentencias['purgar_estados'].fetch(ttl, conservar)
+
+# ================= ADMINISTRACIÓN =================
+async def pagina_citas(estudio_id: str, estado: Optional[str], desde: Optional[date], hasta: Optional[date],
+                       servicio: Optional[str], cursor: Optional[int], limite: int,
+                       atras: bool = False) -> list[asyncpg.Record]:
+    """Una página de citas después (o antes, si `atras`) de la cita `cursor`
+
+    Hacia atrás las filas vienen en orden inverso, empezando por la más cercana al cursor.
+    """
+    valores = {'estado': estado, 'desde': desde, 'hasta': hasta, 'servicio': servicio}
+    condiciones, args, usados = ['estudio_id = $1'], [estudio_id], []
+    for campo, condicion in FILTROS_PAGINA:
+        if valores[campo] is not None:
+            args.append(valores[campo])
+            condiciones.append(condicion.format(len(args)))
+            usados.append(campo)
+    if cursor is not None:
+        args.append(cursor)
+        condiciones.append(
+            f"(inicia_en, id) {'<' if atras else '>'} (SELECT inicia_en, id FROM citas WHERE id = ${len(args)})"
+        )
+        usados.append('antes' if atras else 'despues')
+    args.append(limite)
+    sql = f"""
+        SELECT {COLUMNAS_PAGINA}
+        FROM citas
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY {'inicia_en DESC, id DESC' if atras else 'inicia_en, id'}
+        LIMIT ${len(args)}
+    """
+    async with db.conexion() as conn:
+        sentencia = await _preparada(conn, 'pagina_citas', f"pagina_citas:{','.join(usados)}", sql)
+        return await sentencia.fetch(*args)
+
+async def exportar_citas(salida, estudio_id: str, estado: Optional[str], desde: Optional[date],
+                         hasta: Optional[date], servicio: Optional[str]) -> int:
+    """Escribir las citas filtradas del estudio como CSV (con encabezado) en `salida`, por partes
+
+    `salida` es una corrutina que recibe cada bloque de bytes; devuelve el número de filas.
+    """
+    async with db.conexion() as conn:
+        estado_copia = await conn.copy_from_query(
+            COPIA_CITAS, estudio_id, estado, desde, hasta, servicio,
+            output=salida, format='csv', header=True,
+        )
+    return int(estado_copia.split()[-1])
+
+async def importar_citas(columnas: list[str], registros: list[tuple]) -> int:
+    """Insertar muchas citas con un solo COPY (todas o ninguna)"""
+    async with db.conexion() as conn:
+        estado_copia = await conn.copy_records_to_table('citas', records=registros, columns=columnas)
+    return int(estado_copia.split()[-1])
+
+async def estadisticas(estudio_id: str) -> asyncpg.Record:
+    """Totales de citas del estudio (total, activas, canceladas, hoy) en una sola consulta"""
+    async with db.conexion() as conn:
+        return await conn.sentencias['estadisticas'].fetchrow(estudio_id)
+
+async def desglose_estadisticas(estudio_id: str, desde: date, hasta: date) -> tuple[list, list]:
+    """Citas del estudio registradas por día y por servicio entre dos fechas (inclusive)"""
+    async with db.conexion() as conn:
+        filas = await conn.sentencias['desglose_estadisticas'].fetch(estudio_id, desde, hasta)
+    por_dia = [f for f in filas if f['dia'] is not None]
+    por_servicio = [f for f in filas if f['servicio'] is not None]
+    return por_dia, por_servicio
+
+# ================= CONFIGURACIÓN DE ESTUDIOS =================
+async def version_configuracion() -> int:
+    """Versión actual de la configuración (sube con cada cambio en las tablas de estudios)"""
+    async with db.conexion() as conn:
+        return await conn.sentencias['version_configuracion'].fetchval()
+
+async def cargar_configuracion() -> tuple[int, list, list, list, list]:
+    """(versión, estudios, servicios, admins, horarios) leídos de una misma foto de la base"""
+    async with db.conexion() as conn:
+        async with conn.transaction(isolation='repeatable_read', readonly=True):
+            return (
+                await conn.sentencias['version_configuracion'].fetchval(),
+                await conn.sentencias['configuracion_estudios'].fetch(),
+                await conn.sentencias['configuracion_servicios'].fetch(),
+                await conn.sentencias['configuracion_admins'].fetch(),
+                await conn.sentencias['configuracion_horarios'].fetch(),
+            )
@@ -0,0 +1,128 @@
+import os
+import asyncio
+import logging
+import asyncpg
+
+# ================= CONFIGURACIÓN =================
+DATABASE_URL = os.getenv('DATABASE_URL')
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+DB_ACQUIRE_TIMEOUT = float(os.getenv('DB_ACQUIRE_TIMEOUT', '10'))
+DB_COMMAND_TIMEOUT = float(os.getenv('DB_COMMAND_TIMEOUT', '30'))
+DB_MAX_INACTIVA = float(os.getenv('DB_MAX_INACTIVA', '300'))
+# Conexiones que se abren (con sus sentencias preparadas) antes del primer update
+DB_CALENTAR = int(os.getenv('DB_CALENTAR', '3'))
+
+# Errores que indican que Supabase no está disponible (no que la consulta esté mal)
+ERRORES_CONEXION = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError,
+)
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_creando_pool = asyncio.Lock()
+_inicializadores = []
+_preparativos = []
+
+# ================= CONEXIONES =================
+class Conexion(asyncpg.Connection):
+    """Conexión del pool que guarda sus sentencias preparadas"""
+    __slots__ = ('sentencias',)
+
+def al_iniciar(func):
+    """Registrar una corrutina que se ejecuta una sola vez antes de crear el pool"""
+    _preparativos.append(func)
+    return func
+
+def al_conectar(func):
+    """Registrar una corrutina que se ejecuta en cada conexión nueva del pool"""
+    _inicializadores.append(func)
+    return func
+
+async def _inicializar_conexion(conn):
+    conn.sentencias = {}
+    for func in _inicializadores:
+        await func(conn)
+
+# ================= POOL DE CONEXIONES =================
+async def iniciar_pool():
+    """Crear el pool compartido de conexiones a Supabase"""
+    global _pool
+    # Puede llamarse desde varios sitios (persistencia, post_init); solo el primero lo crea
+    async with _creando_pool:
+        if _pool is not None:
+            return _pool
+
+        # Preparativos únicos (esquema, etc.) antes de preparar sentencias en el pool
+        if _preparativos:
+            conn = await asyncpg.connect(DATABASE_URL, command_timeout=DB_COMMAND_TIMEOUT)
+            try:
+                for func in _preparativos:
+                    await func(conn)
+            finally:
+                await conn.close()
+
+        _pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN,
+            max_size=DB_POOL_MAX,
+            command_timeout=DB_COMMAND_TIMEOUT,
+            max_inactive_connection_lifetime=DB_MAX_INACTIVA,
+            connection_class=Conexion,
+            init=_inicializar_conexion,
+        )
+        logger.info(f"🗄️ Pool de base de datos listo ({DB_POOL_MIN}-{DB_POOL_MAX} conexiones)")
+        return _pool
+
+async def calentar(conexiones: int = DB_CALENTAR):
+    """Abrir de una vez varias conexiones del pool para que el primer cliente no pague la conexión
+
+    Cada conexión nueva pasa por los `al_conectar` (sentencias preparadas);
+    se toman todas a la vez para que el pool no reutilice la misma.
+    """
+    pool = obtener_pool()
+    conexiones = min(conexiones, DB_POOL_MAX)
+    if conexiones <= 0:
+        return
+    tomadas = await asyncio.gather(
+        *(pool.acquire(timeout=DB_ACQUIRE_TIMEOUT) for _ in range(conexiones)),
+        return_exceptions=True,
+    )
+    errores = [conn for conn in tomadas if isinstance(conn, BaseException)]
+    for conn in tomadas:
+        if not isinstance(conn, BaseException):
+            await pool.release(conn)
+    if errores:
+        logger.warning(f"⚠️ Solo {conexiones - len(errores)} de {conexiones} conexiones calentadas: {errores[0]}")
+
+async def cerrar_pool():
+    """Cerrar el pool esperando a que se devuelvan las conexiones"""
+    global _pool
+    if _pool is None:
+        return
+
+    pool, _pool = _pool, None
+    try:
+        await pool.close()
+    except Exception as e:
+        logger.error(f"❌ Error cerrando el pool, se termina a la fuerza: {e}")
+        pool.terminate()
+    logger.info("🗄️ Pool de base de datos cerrado")
+
+def obtener_pool():
+    """Devolver el pool activo"""
+    if _pool is None:
+        raise RuntimeError("El pool de base de datos no está inicializado")
+    return _pool
+
+def conexion():
+    """Tomar una conexión del pool: `async with conexion() as conn:`
+
+    La conexión vuelve al pool al salir del bloque, incluso si hay una excepción.
+    """
+    return obtener_pool().acquire(timeout=DB_ACQUIRE_TIMEOUT)
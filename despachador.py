@@ -0,0 +1,131 @@
+import logging
+from time import perf_counter
+from typing import Callable, Optional
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+logger = logging.getLogger(__name__)
+
+LENTO_SEGUNDOS = 1.0
+
+# ================= DESPACHADOR DE UPDATES =================
+class Despachador:
+    """Tabla de handlers: (flujo, paso, tipo de entrada) y callback_data -> handler
+
+    Los flujos son listas ordenadas de pasos (`{'agendar': ('nombre', ...)}`);
+    el estado de cada usuario vive en `user_data['flujo']` y `user_data['paso']`.
+    Buscar el handler es una consulta a un diccionario, así que agregar flujos
+    o botones no hace más lento el camino de cada mensaje. Las claves de
+    `conservar` sobreviven al empezar y terminar flujos.
+    """
+
+    def __init__(self, flujos: dict[str, tuple[str, ...]], conservar: tuple[str, ...] = ()):
+        self.flujos = flujos
+        self.conservar = conservar
+        self._mensajes: dict[tuple, Callable] = {}
+        self._botones: dict[str, Callable] = {}
+        self._prefijos: dict[str, Callable] = {}
+        self._sin_estado: Optional[Callable] = None
+        self._medidores: list[Callable] = []
+
+    # ---------- registro ----------
+    def mensaje(self, flujo: str, paso: str, handler: Callable, tipo: str = 'texto'):
+        """Handler para los mensajes de un paso de un flujo"""
+        if paso not in self.flujos[flujo]:
+            raise ValueError(f"El flujo {flujo} no tiene el paso {paso}")
+        self._mensajes[(flujo, paso, tipo)] = handler
+
+    def sin_estado(self, handler: Callable):
+        """Handler para los mensajes de usuarios que no están en ningún flujo"""
+        self._sin_estado = handler
+
+    def boton(self, data: str, handler: Callable):
+        """Handler para un callback_data exacto"""
+        self._botones[data] = handler
+
+    def prefijo(self, prefijo: str, handler: Callable):
+        """Handler para todos los callback_data `prefijo:...`"""
+        self._prefijos[prefijo] = handler
+
+    def al_medir(self, func: Callable):
+        """Registrar `func(handler, antes, despues, segundos, error)` tras cada update despachado
+
+        `error` es la excepción que lanzó el handler, o None si terminó bien.
+        """
+        self._medidores.append(func)
+        return func
+
+    # ---------- estado de los flujos ----------
+    def estado(self, context: CallbackContext) -> tuple[Optional[str], Optional[str]]:
+        """(flujo, paso) actuales del usuario, o (None, None)"""
+        return context.user_data.get('flujo'), context.user_data.get('paso')
+
+    def iniciar(self, context: CallbackContext, flujo: str):
+        """Empezar un flujo desde su primer paso (descarta cualquier flujo anterior)"""
+        self._olvidar(context)
+        context.user_data['flujo'] = flujo
+        context.user_data['paso'] = self.flujos[flujo][0]
+
+    def avanzar(self, context: CallbackContext):
+        """Pasar al siguiente paso del flujo actual"""
+        flujo, paso = self.estado(context)
+        pasos = self.flujos[flujo]
+        context.user_data['paso'] = pasos[pasos.index(paso) + 1]
+
+    def ir_a(self, context: CallbackContext, paso: str):
+        """Saltar a un paso concreto del flujo actual (p. ej. volver al calendario)"""
+        flujo, _ = self.estado(context)
+        if paso not in self.flujos[flujo]:
+            raise ValueError(f"El flujo {flujo} no tiene el paso {paso}")
+        context.user_data['paso'] = paso
+
+    def terminar(self, context: CallbackContext):
+        """Salir del flujo y olvidar los datos temporales"""
+        self._olvidar(context)
+
+    def _olvidar(self, context: CallbackContext):
+        guardado = {clave: context.user_data[clave] for clave in self.conservar if clave in context.user_data}
+        context.user_data.clear()
+        context.user_data.update(guardado)
+
+    # ---------- despacho ----------
+    async def _ejecutar(self, handler: Callable, update: Update, context: CallbackContext):
+        antes = self.estado(context)
+        inicio = perf_counter()
+        error = None
+        try:
+            await handler(update, context)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            segundos = perf_counter() - inicio
+            despues = self.estado(context)
+            if segundos > LENTO_SEGUNDOS:
+                logger.warning(f"🐢 {handler.__name__} tardó {segundos:.2f}s ({antes} -> {despues})")
+            for medidor in self._medidores:
+                medidor(handler.__name__, antes, despues, segundos, error)
+
+    async def despachar_mensaje(self, update: Update, context: CallbackContext):
+        """MessageHandler de texto: handler del paso actual o respuesta sin estado"""
+        flujo, paso = self.estado(context)
+        handler = self._mensajes.get((flujo, paso, 'texto'), self._sin_estado)
+        if handler is not None:
+            await self._ejecutar(handler, update, context)
+
+    async def despachar_archivo(self, update: Update, context: CallbackContext):
+        """MessageHandler de documentos: solo los pasos que esperan un archivo"""
+        flujo, paso = self.estado(context)
+        handler = self._mensajes.get((flujo, paso, 'archivo'))
+        if handler is not None:
+            await self._ejecutar(handler, update, context)
+
+    async def despachar_callback(self, update: Update, context: CallbackContext):
+        """CallbackQueryHandler: botón exacto o, si no, por prefijo"""
+        data = update.callback_query.data or ''
+        handler = self._botones.get(data) or self._prefijos.get(data.split(':', 1)[0])
+        if handler is None:
+            await update.callback_query.answer()
+            return
+        await self._ejecutar(handler, update, context)
@@ -0,0 +1,229 @@
+import os
+import json
+import asyncio
+import logging
+import sqlite3
+from datetime import date, time
+from time import time as ahora_unix
+from typing import Callable, Optional
+
+import asyncpg
+
+import db
+import consultas
+import estudios
+import cancelaciones
+import disponibilidad
+import citas_cliente
+
+# ================= CONFIGURACIÓN =================
+# En Render el disco se borra en cada deploy: monta un disco persistente y
+# apunta DIARIO_ARCHIVO a él para no perder reservas pendientes
+DIARIO_ARCHIVO = os.getenv('DIARIO_ARCHIVO', os.path.join(os.path.dirname(__file__), 'diario.sqlite3'))
+DIARIO_CADA = float(os.getenv('DIARIO_CADA', '15'))
+DIARIO_LOTE = int(os.getenv('DIARIO_LOTE', '50'))
+DIARIO_ESPERA_MAX = 300
+
+logger = logging.getLogger(__name__)
+
+_pendientes = 0
+_tarea: Optional[asyncio.Task] = None
+_resolutores: list[Callable] = []
+
+# ================= DIARIO LOCAL (SQLITE) =================
+# Si Supabase no responde al reservar o cancelar, la operación se anota aquí
+# (con su clave de idempotencia) y el cliente recibe una confirmación
+# "pendiente". Un trabajo en segundo plano reproduce el diario por lotes en
+# cuanto la base vuelve; repetir una operación ya aplicada no tiene efecto.
+def _conectar() -> sqlite3.Connection:
+    conn = sqlite3.connect(DIARIO_ARCHIVO)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS operaciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            clave TEXT NOT NULL UNIQUE,
+            tipo TEXT NOT NULL,
+            datos TEXT NOT NULL,
+            creado_en REAL NOT NULL
+        )
+    ''')
+    return conn
+
+def _anotar(clave: str, tipo: str, datos: dict):
+    with _conectar() as conn:
+        conn.execute(
+            'INSERT OR IGNORE INTO operaciones (clave, tipo, datos, creado_en) VALUES (?, ?, ?, ?)',
+            (clave, tipo, json.dumps(datos), ahora_unix()),
+        )
+    conn.close()
+
+def _leer(limite: int) -> list[tuple[int, str, dict]]:
+    with _conectar() as conn:
+        filas = conn.execute('SELECT id, tipo, datos FROM operaciones ORDER BY id LIMIT ?', (limite,)).fetchall()
+    conn.close()
+    return [(id_, tipo, json.loads(datos)) for id_, tipo, datos in filas]
+
+def _borrar(ids: list[int]):
+    with _conectar() as conn:
+        conn.executemany('DELETE FROM operaciones WHERE id = ?', [(id_,) for id_ in ids])
+    conn.close()
+
+def _contar() -> int:
+    with _conectar() as conn:
+        total = conn.execute('SELECT COUNT(*) FROM operaciones').fetchone()[0]
+    conn.close()
+    return total
+
+# ================= ANOTAR =================
+async def anotar_cita(estudio_id: str, user_id: int, nombre: str, telefono: str, servicio: str,
+                      fecha: date, hora: time, duracion_min: int, clave: str):
+    """Guardar una reserva que no se pudo escribir en Supabase"""
+    global _pendientes
+    datos = {
+        'estudio_id': estudio_id, 'user_id': user_id, 'nombre': nombre, 'telefono': telefono, 'servicio': servicio,
+        'fecha': fecha.isoformat(), 'hora': hora.isoformat(), 'duracion_min': duracion_min, 'clave': clave,
+    }
+    await asyncio.to_thread(_anotar, clave, 'cita', datos)
+    _pendientes += 1
+    logger.warning(f"📓 Reserva de {user_id} anotada en el diario ({_pendientes} pendientes)")
+
+async def anotar_cancelacion(estudio_id: str, cita_id: int, user_id: int):
+    """Guardar una cancelación que no se pudo escribir en Supabase"""
+    global _pendientes
+    datos = {'estudio_id': estudio_id, 'cita_id': cita_id, 'user_id': user_id}
+    await asyncio.to_thread(_anotar, f"cancelar:{cita_id}", 'cancelacion', datos)
+    _pendientes += 1
+    logger.warning(f"📓 Cancelación de la cita {cita_id} anotada en el diario ({_pendientes} pendientes)")
+
+def pendientes() -> int:
+    """Operaciones esperando a Supabase"""
+    return _pendientes
+
+def al_resolver(func: Callable):
+    """Registrar `func(tipo, datos, resultado)` para avisar al cliente cuando se reproduce una operación
+
+    Para 'cita' el resultado es el ID registrado, o None si el horario ya se
+    ocupó; para 'cancelacion' es la cita cancelada, o None si ya no estaba activa.
+    """
+    _resolutores.append(func)
+    return func
+
+# ================= REPRODUCIR =================
+def estudio_de(datos: dict) -> str:
+    """Estudio de una operación anotada (las anteriores a varios estudios son de este bot)"""
+    return datos.get('estudio_id') or estudios.principal().id
+
+def _tupla(datos: dict) -> tuple:
+    return (
+        estudio_de(datos), datos['user_id'], datos['nombre'], datos['telefono'], datos['servicio'],
+        date.fromisoformat(datos['fecha']), time.fromisoformat(datos['hora']),
+        datos['duracion_min'], datos['clave'],
+    )
+
+async def _resolver(tipo: str, datos: dict, resultado):
+    if tipo == 'cita' and resultado is not None:
+        disponibilidad.registrar(
+            estudio_de(datos), resultado, date.fromisoformat(datos['fecha']), time.fromisoformat(datos['hora']),
+            datos['duracion_min'], datos['servicio'], datos['nombre'], datos['telefono'],
+        )
+        citas_cliente.invalidar(datos['user_id'])
+    for func in _resolutores:
+        try:
+            await func(tipo, datos, resultado)
+        except Exception as e:
+            logger.error(f"❌ Error avisando la operación recuperada: {e}")
+
+async def _reproducir_citas(citas: list[tuple[int, str, dict]], hechas: list[int]):
+    if not citas:
+        # insertar_citas([]) no es un lote vacío sino una llamada inválida
+        return
+    try:
+        # Lo normal: todo el lote en una sola sentencia
+        ids = await consultas.insertar_citas([_tupla(datos) for _, _, datos in citas])
+    except asyncpg.ExclusionViolationError:
+        ids = None
+
+    for id_, tipo, datos in citas:
+        if ids is not None:
+            cita_id = ids.get(datos['clave'])
+        else:
+            # Algún horario ya se ocupó: una por una para saber cuál
+            try:
+                cita_id = (await consultas.insertar_citas([_tupla(datos)])).get(datos['clave'])
+            except asyncpg.ExclusionViolationError:
+                cita_id = None
+        hechas.append(id_)
+        await _resolver(tipo, datos, cita_id)
+
+async def _reproducir() -> bool:
+    """Aplicar un lote del diario; True si pueden quedar más"""
+    global _pendientes
+    lote = await asyncio.to_thread(_leer, DIARIO_LOTE)
+    if not lote:
+        _pendientes = 0
+        return False
+
+    hechas = []
+    try:
+        await _reproducir_citas([op for op in lote if op[1] == 'cita'], hechas)
+        for id_, tipo, datos in lote:
+            if tipo == 'cancelacion':
+                cita = await cancelaciones.cancelar_cita_cliente(estudio_de(datos), datos['cita_id'], datos['user_id'])
+                hechas.append(id_)
+                await _resolver(tipo, datos, cita)
+    finally:
+        # Lo aplicado sale del diario aunque el resto del lote falle
+        if hechas:
+            await asyncio.to_thread(_borrar, hechas)
+            _pendientes = max(0, _pendientes - len(hechas))
+            logger.info(f"📓 {len(hechas)} operaciones del diario aplicadas ({_pendientes} pendientes)")
+    return len(lote) == DIARIO_LOTE
+
+async def _vaciar():
+    while await _reproducir():
+        pass
+
+async def _trabajar():
+    espera = DIARIO_CADA
+    while True:
+        await asyncio.sleep(espera)
+        if not _pendientes:
+            continue
+        try:
+            await _vaciar()
+            espera = DIARIO_CADA
+        except db.ERRORES_CONEXION as e:
+            # Supabase sigue sin responder: esperar cada vez más
+            espera = min(espera * 2, DIARIO_ESPERA_MAX)
+            logger.warning(f"⚠️ Supabase sigue sin responder ({e}), diario en {espera:.0f}s")
+        except Exception as e:
+            logger.error(f"❌ Error reproduciendo el diario: {e}")
+
+# ================= CICLO DE VIDA =================
+async def iniciar():
+    """Abrir el diario y reproducir en segundo plano lo que haya quedado"""
+    global _pendientes, _tarea
+    _pendientes = await asyncio.to_thread(_contar)
+    if _pendientes:
+        logger.warning(f"📓 {_pendientes} operaciones pendientes en el diario")
+    _tarea = asyncio.create_task(_trabajar(), name='diario')
+
+async def detener(timeout: float = 10):
+    """Parar la reproducción y hacer un último intento con lo pendiente
+
+    En Render el disco puede no sobrevivir al deploy, así que al apagar se
+    intenta aplicar el diario una vez más; lo que no entre sigue en el archivo.
+    """
+    global _tarea
+    if _tarea is None:
+        return
+    _tarea.cancel()
+    await asyncio.gather(_tarea, return_exceptions=True)
+    _tarea = None
+
+    if not _pendientes:
+        return
+    try:
+        await asyncio.wait_for(_vaciar(), timeout)
+    except Exception as e:
+        logger.warning(f"⚠️ Quedan {_pendientes} operaciones en el diario al apagar: {e!r}")
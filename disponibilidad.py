@@ -0,0 +1,145 @@
+import os
+import asyncio
+import logging
+from bisect import bisect_right, insort
+from datetime import date, datetime, time, timedelta
+from time import monotonic
+from typing import Optional
+
+import consultas
+import estudios
+from catalogo import INTERVALO_MINUTOS, ZONA_HORARIA
+
+# ================= CONFIGURACIÓN =================
+DISPONIBILIDAD_TTL = float(os.getenv('DISPONIBILIDAD_TTL', '60'))
+ANTICIPACION_MINUTOS = int(os.getenv('ANTICIPACION_MINUTOS', '60'))
+
+logger = logging.getLogger(__name__)
+
+# ================= ÍNDICE DE OCUPACIÓN POR DÍA =================
+# Por cada estudio y día consultado se guardan los intervalos [inicio, fin) de
+# sus citas activas, ordenados por inicio. Como las citas activas de un estudio
+# no se solapan, los fines también quedan ordenados y basta una búsqueda binaria para saber si un
+# horario está libre. El índice se recarga de Postgres cada DISPONIBILIDAD_TTL
+# segundos (otras instancias también agendan) y se actualiza al momento con
+# las reservas y cancelaciones de esta instancia. La restricción de exclusión
+# `citas_sin_solapes` es la garantía final. Cada intervalo lleva además el
+# servicio y el cliente, así la agenda del día sale del mismo índice.
+class _Dia:
+    __slots__ = ('cargado_en', 'intervalos')
+
+    def __init__(self, intervalos):
+        self.cargado_en = monotonic()
+        self.intervalos = intervalos
+
+    def libre(self, inicio: datetime, fin: datetime) -> bool:
+        i = bisect_right(self.intervalos, inicio, key=lambda intervalo: intervalo[1])
+        return i == len(self.intervalos) or self.intervalos[i][0] >= fin
+
+_dias: dict[tuple[str, date], _Dia] = {}
+_cargas: dict[tuple[str, date], asyncio.Task] = {}
+
+async def _cargar(estudio_id: str, fecha: date) -> _Dia:
+    filas = await consultas.ocupacion_dia(estudio_id, fecha)
+    dia = _Dia([
+        (f['inicia_en'], f['termina_en'], f['id'], f['servicio'], f['cliente_nombre'], f['telefono'])
+        for f in filas
+    ])
+    _dias[estudio_id, fecha] = dia
+
+    # Los días pasados ya no se consultan
+    hoy = ahora().date()
+    for vieja in [clave for clave in _dias if clave[1] < hoy]:
+        del _dias[vieja]
+    return dia
+
+async def _dia(estudio_id: str, fecha: date) -> _Dia:
+    clave = (estudio_id, fecha)
+    dia = _dias.get(clave)
+    if dia and monotonic() - dia.cargado_en < DISPONIBILIDAD_TTL:
+        return dia
+
+    # Varias consultas del mismo día comparten una sola carga
+    tarea = _cargas.get(clave)
+    if tarea is None:
+        tarea = asyncio.ensure_future(_cargar(estudio_id, fecha))
+        _cargas[clave] = tarea
+        tarea.add_done_callback(lambda _: _cargas.pop(clave, None))
+    return await asyncio.shield(tarea)
+
+def ahora() -> datetime:
+    """Fecha y hora actuales del estudio (sin zona, como `citas.inicia_en`)"""
+    return datetime.now(ZONA_HORARIA).replace(tzinfo=None)
+
+def abierto(estudio: estudios.Estudio, fecha: date) -> bool:
+    """Si ese día se pueden agendar citas en el estudio por el bot"""
+    return estudio.horario_de(fecha) is not None
+
+def _dentro_de_horario(estudio: estudios.Estudio, fecha: date, inicio: datetime, fin: datetime) -> bool:
+    apertura, cierre = estudio.horario_de(fecha)
+    return (
+        datetime.combine(fecha, apertura) <= inicio
+        and fin <= datetime.combine(fecha, cierre)
+        and inicio >= ahora() + timedelta(minutes=ANTICIPACION_MINUTOS)
+    )
+
+# ================= CONSULTAS DE DISPONIBILIDAD =================
+async def horarios_libres(estudio: estudios.Estudio, duracion_min: int, fecha: date) -> list[time]:
+    """Horas de inicio libres en el estudio para un servicio de `duracion_min` minutos en una fecha"""
+    if not abierto(estudio, fecha):
+        return []
+
+    dia = await _dia(estudio.id, fecha)
+    apertura, cierre = estudio.horario_de(fecha)
+    minutos = timedelta(minutes=duracion_min)
+    paso = timedelta(minutes=INTERVALO_MINUTOS)
+
+    libres = []
+    inicio = datetime.combine(fecha, apertura)
+    while inicio + minutos <= datetime.combine(fecha, cierre):
+        if _dentro_de_horario(estudio, fecha, inicio, inicio + minutos) and dia.libre(inicio, inicio + minutos):
+            libres.append(inicio.time())
+        inicio += paso
+    return libres
+
+async def esta_libre(estudio: estudios.Estudio, duracion_min: int, fecha: date, hora: time) -> bool:
+    """Si un servicio de `duracion_min` minutos cabe a esa hora: dentro del horario y sin solaparse"""
+    if not abierto(estudio, fecha):
+        return False
+
+    inicio = datetime.combine(fecha, hora)
+    fin = inicio + timedelta(minutes=duracion_min)
+    if not _dentro_de_horario(estudio, fecha, inicio, fin):
+        return False
+    return (await _dia(estudio.id, fecha)).libre(inicio, fin)
+
+async def citas_dia(estudio: estudios.Estudio, fecha: date) -> list[tuple]:
+    """Citas activas del día en el estudio ordenadas por hora: (inicio, fin, id, servicio, cliente, teléfono)"""
+    return list((await _dia(estudio.id, fecha)).intervalos)
+
+# ================= ACTUALIZACIÓN INCREMENTAL =================
+def registrar(estudio_id: str, cita_id: int, fecha: date, hora: time, duracion_min: int,
+              servicio: str = '', nombre: str = '', telefono: str = ''):
+    """Marcar como ocupado el horario de una cita recién agendada"""
+    dia = _dias.get((estudio_id, fecha))
+    if dia is None:
+        return
+    inicio = datetime.combine(fecha, hora)
+    insort(dia.intervalos, (inicio, inicio + timedelta(minutes=duracion_min), cita_id, servicio, nombre, telefono))
+
+def liberar(estudio_id: str, cita_id: int, fecha: date):
+    """Quitar del índice una cita cancelada"""
+    dia = _dias.get((estudio_id, fecha))
+    if dia is None:
+        return
+    dia.intervalos = [i for i in dia.intervalos if i[2] != cita_id]
+
+def invalidar(estudio_id: Optional[str] = None, fecha: Optional[date] = None):
+    """Forzar la recarga de un día del estudio (o de todos sus días, o de todo) en la próxima consulta"""
+    if estudio_id is None:
+        _dias.clear()
+    elif fecha is None:
+        for clave in [clave for clave in _dias if clave[0] == estudio_id]:
+            del _dias[clave]
+    else:
+        _dias.pop((estudio_id, fecha), None)
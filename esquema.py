@@ -0,0 +1,65 @@
+import logging
+from pathlib import Path
+
+import asyncpg
+
+import estudios
+
+logger = logging.getLogger(__name__)
+
+# ================= MIGRACIONES =================
+# Archivos `migraciones/NNNN_descripcion.sql`, aplicados en orden una sola vez.
+# Cada archivo corre en su propia transacción y queda anotado en
+# `migraciones_aplicadas`; para cambiar el esquema se agrega un archivo nuevo,
+# nunca se edita uno ya aplicado.
+DIRECTORIO_MIGRACIONES = Path(__file__).resolve().parent / 'migraciones'
+
+def migraciones_disponibles() -> list[tuple[str, Path]]:
+    """(versión, archivo) de todas las migraciones incluidas con el bot"""
+    return sorted(
+        (archivo.stem, archivo)
+        for archivo in DIRECTORIO_MIGRACIONES.glob('*.sql')
+    )
+
+async def _versiones_aplicadas(conn) -> set[str]:
+    try:
+        return {fila['version'] for fila in await conn.fetch('SELECT version FROM migraciones_aplicadas')}
+    except asyncpg.UndefinedTableError:
+        return set()
+
+async def aplicar_migraciones(conn):
+    """Aplicar las migraciones pendientes antes de crear el pool (una vez por arranque)"""
+    # Lo normal en un deploy es que no haya nada nuevo: una sola consulta, sin lock
+    disponibles = migraciones_disponibles()
+    aplicadas = await _versiones_aplicadas(conn)
+    if all(version in aplicadas for version, _ in disponibles):
+        logger.info(f"🗄️ Esquema al día ({len(aplicadas)} migraciones)")
+        return
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS migraciones_aplicadas (
+            version text PRIMARY KEY,
+            aplicada_en timestamptz NOT NULL DEFAULT now()
+        )
+    ''')
+
+    # El lock evita que dos instancias migren a la vez durante un deploy
+    await conn.execute("SELECT pg_advisory_lock(hashtext('migraciones_aplicadas'))")
+    try:
+        # Otra instancia pudo migrar mientras se esperaba el lock
+        aplicadas = await _versiones_aplicadas(conn)
+        # Las migraciones que reparten datos por estudio asignan los existentes a este
+        await conn.execute(
+            "SELECT set_config('bot.estudio_por_defecto', $1, false)", estudios.ESTUDIO_POR_DEFECTO
+        )
+        for version, archivo in disponibles:
+            if version in aplicadas:
+                continue
+            async with conn.transaction():
+                await conn.execute(archivo.read_text(encoding='utf-8'))
+                await conn.execute(
+                    'INSERT INTO migraciones_aplicadas (version) VALUES ($1)', version
+                )
+            logger.info(f"🗄️ Migración aplicada: {version}")
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock(hashtext('migraciones_aplicadas'))")
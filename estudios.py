@@ -0,0 +1,228 @@
+import os
+import logging
+from datetime import date, time
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from telegram.ext import CallbackContext, JobQueue
+
+import consultas
+import pantallas
+from catalogo import DURACIONES, EMOJIS, HORARIOS, SERVICIOS, duracion
+
+# ================= CONFIGURACIÓN =================
+# Estudio que atiende cuando el bot no está asignado a ninguno en la tabla `estudios`
+ESTUDIO_POR_DEFECTO = os.getenv('ESTUDIO_POR_DEFECTO', 'veronica')
+CONFIG_REVISAR_CADA = float(os.getenv('CONFIG_REVISAR_CADA', '60'))
+# Clave de `user_data` con el estudio que el cliente eligió por enlace (/start <estudio>)
+CLAVE_ESTUDIO = 'estudio'
+
+# Datos del estudio por defecto mientras no tenga fila en la base
+WHATSAPP_NUMERO = os.getenv('WHATSAPP_NUMERO', '+59387757446')
+ADMIN_IDS = os.getenv('ADMIN_IDS', '').split(',')
+UBICACION = "📍 Martínez-Sucre, Ecuador"
+
+logger = logging.getLogger(__name__)
+
+# ================= ESTUDIOS =================
+class Servicio(NamedTuple):
+    opcion: str
+    nombre: str
+    emoji: str
+    duracion_min: int
+    precio: Optional[Decimal]
+
+class Estudio(NamedTuple):
+    """Configuración de un estudio; inmutable, así sirve de clave para las pantallas"""
+    id: str
+    nombre: str
+    ubicacion: str
+    direccion: str
+    indicaciones: str
+    horario: str
+    # weekday() -> (apertura, cierre), None los días que no se agenda por el bot
+    horarios: tuple[Optional[tuple[time, time]], ...]
+    whatsapp: str
+    extras: str
+    servicios: tuple[Servicio, ...]
+    admins: frozenset[int]
+
+    def servicio(self, opcion: str) -> Optional[Servicio]:
+        """Servicio por la opción de su botón"""
+        for servicio in self.servicios:
+            if servicio.opcion == opcion:
+                return servicio
+        return None
+
+    def duracion(self, nombre: str) -> int:
+        """Minutos que ocupa un servicio de este estudio en la agenda"""
+        for servicio in self.servicios:
+            if servicio.nombre == nombre:
+                return servicio.duracion_min
+        return duracion(nombre)
+
+    def horario_de(self, fecha: date) -> Optional[tuple[time, time]]:
+        """(apertura, cierre) de ese día, o None si ese día no se agenda"""
+        return self.horarios[fecha.weekday()]
+
+    def es_admin(self, user_id) -> bool:
+        return int(user_id) in self.admins
+
+    @property
+    def enlace_whatsapp(self) -> str:
+        return f"https://wa.me/{''.join(c for c in self.whatsapp if c.isdigit())}"
+
+def _admins(ids) -> frozenset[int]:
+    return frozenset(int(str(i).strip()) for i in ids if str(i).strip())
+
+def _horarios(por_dia: dict) -> tuple[Optional[tuple[time, time]], ...]:
+    return tuple(por_dia.get(dia) for dia in range(7))
+
+def _estudio_por_defecto() -> Estudio:
+    """El estudio de siempre, armado con las variables de entorno y el catálogo"""
+    return Estudio(
+        id=ESTUDIO_POR_DEFECTO,
+        nombre='Veronica Guerra Studio',
+        ubicacion=UBICACION,
+        direccion='Martínez-Sucre, Ecuador',
+        indicaciones='• Zona residencial\n• Estacionamiento disponible\n• Fácil acceso',
+        horario='Lunes a Viernes: 9:00 - 19:00\nSábados: 9:00 - 17:00\nDomingos: Con cita previa',
+        horarios=_horarios(HORARIOS),
+        whatsapp=WHATSAPP_NUMERO,
+        extras='• Decoraciones personalizadas\n• Cristales y strass\n• French y reverso\n• Diseños a pedido',
+        servicios=tuple(
+            Servicio(opcion, nombre, EMOJIS.get(opcion, '💅'), DURACIONES.get(nombre, duracion(nombre)), None)
+            for opcion, nombre in SERVICIOS.items()
+        ),
+        admins=_admins(ADMIN_IDS),
+    )
+
+# ================= INSTANTÁNEA EN MEMORIA =================
+# Toda la configuración vive en una instantánea inmutable que se reemplaza
+# entera al recargar: los handlers resuelven su estudio con un diccionario, sin
+# consultas. Un trabajo periódico compara `configuracion_version` (una fila) y
+# solo vuelve a leer las tablas cuando cambió.
+class Instantanea(NamedTuple):
+    version: int
+    por_defecto: Estudio
+    estudios: dict[str, Estudio]
+    por_bot: dict[int, Estudio]
+    # Estudios sin bot asignado: los atiende cualquier bot por enlace
+    libres: frozenset[str]
+
+_actual = Instantanea(-1, _estudio_por_defecto(), {}, {}, frozenset())
+_bot_id: Optional[int] = None
+
+def _armar(version: int, filas_estudios, filas_servicios, filas_admins, filas_horarios) -> Instantanea:
+    servicios: dict[str, list[Servicio]] = {}
+    for fila in filas_servicios:
+        servicios.setdefault(fila['estudio_id'], []).append(Servicio(
+            fila['opcion'], fila['nombre'], fila['emoji'], fila['duracion_min'], fila['precio']
+        ))
+    admins: dict[str, list[int]] = {}
+    for fila in filas_admins:
+        admins.setdefault(fila['estudio_id'], []).append(fila['user_id'])
+    horarios: dict[str, dict[int, tuple[time, time]]] = {}
+    for fila in filas_horarios:
+        horarios.setdefault(fila['estudio_id'], {})[fila['dia']] = (fila['apertura'], fila['cierre'])
+
+    base = _estudio_por_defecto()
+    estudios, por_bot, libres = {}, {}, set()
+    for fila in filas_estudios:
+        ids_admin = admins.get(fila['id'], [])
+        if fila['id'] == ESTUDIO_POR_DEFECTO:
+            # Los ADMIN_IDS del entorno siguen administrando el estudio por defecto
+            ids_admin = ids_admin + list(base.admins)
+        estudio = Estudio(
+            id=fila['id'],
+            nombre=fila['nombre'],
+            ubicacion=fila['ubicacion'],
+            direccion=fila['direccion'],
+            indicaciones=fila['indicaciones'],
+            horario=fila['horario'],
+            horarios=_horarios(horarios[fila['id']]) if fila['id'] in horarios else base.horarios,
+            whatsapp=fila['whatsapp'],
+            extras=fila['extras'],
+            servicios=tuple(servicios.get(fila['id'], ())) or base.servicios,
+            admins=_admins(ids_admin),
+        )
+        estudios[estudio.id] = estudio
+        if fila['bot_id'] is not None:
+            por_bot[fila['bot_id']] = estudio
+        else:
+            libres.add(estudio.id)
+    return Instantanea(version, estudios.get(ESTUDIO_POR_DEFECTO, base), estudios, por_bot, frozenset(libres))
+
+async def cargar() -> bool:
+    """Leer la configuración de Postgres y reemplazar la instantánea; True si cambió"""
+    global _actual
+    version, *filas = await consultas.cargar_configuracion()
+    if version == _actual.version:
+        return False
+    _actual = _armar(version, *filas)
+    # Las pantallas memorizadas del estudio anterior ya no sirven
+    pantallas.invalidar()
+    logger.info(f"🏪 Configuración v{version}: {len(_actual.estudios)} estudios en la base")
+    return True
+
+async def iniciar(bot_id: int):
+    """Primera carga al arrancar; si falla se atiende con el estudio por defecto"""
+    global _bot_id
+    _bot_id = bot_id
+    try:
+        await cargar()
+    except Exception as e:
+        logger.error(f"❌ No se pudo cargar la configuración de estudios, se usa la por defecto: {e}")
+    logger.info(f"🏪 Este bot atiende a {', '.join(e.id for e in atendidos(bot_id))} (por defecto {principal().id})")
+
+async def revisar(context: CallbackContext):
+    """Recargar si otra instancia o un admin cambió la configuración (una consulta si no)"""
+    try:
+        if await consultas.version_configuracion() != _actual.version:
+            await cargar()
+    except Exception as e:
+        logger.error(f"❌ Error revisando la configuración de estudios: {e}")
+
+def programar(job_queue: JobQueue):
+    """Registrar la revisión periódica de la configuración"""
+    if job_queue is None:
+        logger.warning("⚠️ Sin JobQueue: la configuración de estudios solo se recarga con /admin_recargar")
+        return
+    job_queue.run_repeating(revisar, interval=CONFIG_REVISAR_CADA, first=CONFIG_REVISAR_CADA, name='estudios')
+
+# ================= RESOLVER EL ESTUDIO =================
+# Un mismo bot atiende a varios estudios: el cliente llega por un enlace
+# `t.me/<bot>?start=<estudio>` y el estudio queda en su `user_data` (el
+# despachador y la persistencia lo conservan entre flujos). Sin elección, o si
+# el estudio ya no lo atiende este bot, vale el estudio asignado al bot.
+def de_bot(bot_id: Optional[int]) -> Estudio:
+    """Estudio asignado al bot con ese ID"""
+    return _actual.por_bot.get(bot_id, _actual.por_defecto)
+
+def atendidos(bot_id: Optional[int]) -> list[Estudio]:
+    """Estudios que atiende el bot: el suyo y los que no tienen bot asignado"""
+    propio = de_bot(bot_id)
+    return [propio] + [_actual.estudios[e] for e in sorted(_actual.libres) if e != propio.id]
+
+def elegir(context: CallbackContext, estudio_id: str) -> Optional[Estudio]:
+    """Recordar el estudio que eligió el cliente; None si este bot no lo atiende"""
+    for estudio in atendidos(context.bot.id):
+        if estudio.id == estudio_id:
+            context.user_data[CLAVE_ESTUDIO] = estudio.id
+            return estudio
+    return None
+
+def de(context: CallbackContext) -> Estudio:
+    """Estudio del update o trabajo en curso, sin consultar la base"""
+    elegido = context.user_data.get(CLAVE_ESTUDIO) if context.user_data is not None else None
+    if elegido in _actual.libres:
+        return _actual.estudios[elegido]
+    return de_bot(context.bot.id)
+
+def por_id(estudio_id: str) -> Estudio:
+    """Estudio con ese ID (el por defecto si no está en la base)"""
+    return _actual.estudios.get(estudio_id, _actual.por_defecto)
+
+def principal() -> Estudio:
+    """Estudio del bot de este proceso (avisos que no vienen de un update)"""
+    return de_bot(_bot_id)
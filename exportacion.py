@@ -0,0 +1,150 @@
+import io
+import csv
+import gzip
+import logging
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+
+import listado
+import consultas
+import disponibilidad
+import citas_cliente
+from formato import FORMATO_FECHA
+
+# ================= CONFIGURACIÓN =================
+# Hasta este tamaño el CSV comprimido se arma en memoria; si crece, pasa a disco
+EXPORT_MEMORIA = 1024 * 1024
+IMPORT_MAX_FILAS = 50000
+# Límite de descarga de archivos de la Bot API
+IMPORT_MAX_BYTES = 20 * 1024 * 1024
+IMPORT_MAX_ERRORES = 10
+
+OBLIGATORIAS = ('cliente_nombre', 'telefono', 'servicio', 'fecha', 'hora')
+OPCIONALES = ('user_id', 'duracion_min', 'estado', 'creado_en')
+# 'solapada': citas dobles del pasado apartadas por la migración 0004
+ESTADOS_VALIDOS = ('activa', 'cancelada', 'solapada')
+
+logger = logging.getLogger(__name__)
+
+# ================= EXPORTAR =================
+async def exportar(estudio, filtros: dict):
+    """CSV comprimido (gzip) con las citas filtradas del estudio: (archivo, filas, nombre)
+
+    Postgres manda el CSV por partes con COPY y cada parte se comprime al
+    llegar, así nunca está el resultado completo en memoria.
+    """
+    archivo = SpooledTemporaryFile(max_size=EXPORT_MEMORIA)
+    comprimido = gzip.GzipFile(fileobj=archivo, mode='wb')
+
+    async def escribir(bloque: bytes):
+        comprimido.write(bloque)
+
+    try:
+        filas = await consultas.exportar_citas(
+            escribir,
+            estudio.id,
+            listado.ESTADOS.get(filtros['estado']),
+            filtros['desde'],
+            filtros['hasta'],
+            listado.nombre_servicio(estudio, filtros),
+        )
+    except Exception:
+        archivo.close()
+        raise
+    comprimido.close()
+    archivo.seek(0)
+
+    partes = ['citas']
+    if filtros['estado']:
+        partes.append(listado.ESTADOS[filtros['estado']])
+    if filtros['desde']:
+        partes.append(filtros['desde'].strftime('%Y%m%d'))
+    if filtros['hasta']:
+        partes.append(filtros['hasta'].strftime('%Y%m%d'))
+    return archivo, filas, f"{'_'.join(partes)}.csv.gz"
+
+# ================= IMPORTAR =================
+def _fecha(valor: str):
+    try:
+        return datetime.strptime(valor, FORMATO_FECHA).date()
+    except ValueError:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+
+def _hora(valor: str):
+    return datetime.strptime(valor[:5], '%H:%M').time()
+
+def _fila(datos: dict, con_creado_en: bool, estudio) -> tuple:
+    for columna in OBLIGATORIAS:
+        if not (datos.get(columna) or '').strip():
+            raise ValueError(f"falta {columna}")
+    servicio = datos['servicio'].strip()
+    estado = (datos.get('estado') or 'activa').strip().lower()
+    if estado not in ESTADOS_VALIDOS:
+        raise ValueError(f"estado '{estado}' (usa activa, cancelada o solapada)")
+
+    fila = (
+        int(datos.get('user_id') or 0),
+        datos['cliente_nombre'].strip(),
+        datos['telefono'].strip(),
+        servicio,
+        _fecha(datos['fecha'].strip()),
+        _hora(datos['hora'].strip()),
+        int(datos.get('duracion_min') or estudio.duracion(servicio)),
+        estado,
+    )
+    if con_creado_en:
+        creado_en = (datos.get('creado_en') or '').strip()
+        fila += (datetime.fromisoformat(creado_en) if creado_en else datetime.now().astimezone(),)
+    return fila
+
+def leer_csv(datos: bytes, estudio) -> tuple[list[str], list[tuple], list[str]]:
+    """Validar un CSV (o .csv.gz) de citas del estudio: (columnas, registros, errores)
+
+    Acepta el mismo formato que genera /admin_export. Las citas de las
+    planillas antiguas, sin cliente de Telegram, quedan con user_id 0; sin
+    duracion_min, toman la del servicio en el catálogo del estudio.
+    """
+    if datos[:2] == b'\x1f\x8b':
+        datos = gzip.decompress(datos)
+    texto = datos.decode('utf-8-sig')
+    lector = csv.DictReader(io.StringIO(texto, newline=''))
+
+    encabezado = [c.strip().lower() for c in lector.fieldnames or []]
+    lector.fieldnames = encabezado
+    faltan = [c for c in OBLIGATORIAS if c not in encabezado]
+    desconocidas = [c for c in encabezado if c not in OBLIGATORIAS + OPCIONALES + ('id',)]
+    if faltan or desconocidas:
+        errores = []
+        if faltan:
+            errores.append(f"Faltan columnas: {', '.join(faltan)}")
+        if desconocidas:
+            errores.append(f"Columnas desconocidas: {', '.join(desconocidas)}")
+        return [], [], errores
+
+    con_creado_en = 'creado_en' in encabezado
+    columnas = ['user_id', 'cliente_nombre', 'telefono', 'servicio', 'fecha', 'hora', 'duracion_min', 'estado']
+    if con_creado_en:
+        columnas.append('creado_en')
+
+    registros, errores = [], []
+    for linea, datos_fila in enumerate(lector, start=2):
+        if len(registros) >= IMPORT_MAX_FILAS:
+            errores.append(f"Más de {IMPORT_MAX_FILAS} filas, divide el archivo")
+            break
+        try:
+            registros.append(_fila(datos_fila, con_creado_en, estudio))
+        except (ValueError, TypeError, AttributeError) as e:
+            errores.append(f"Línea {linea}: {e}")
+            if len(errores) >= IMPORT_MAX_ERRORES:
+                break
+    return columnas, registros, errores
+
+async def importar(estudio, columnas: list[str], registros: list[tuple]) -> int:
+    """Cargar las citas validadas en el estudio con un solo COPY y refrescar las cachés"""
+    filas = await consultas.importar_citas(
+        columnas + ['estudio_id'], [registro + (estudio.id,) for registro in registros]
+    )
+    disponibilidad.invalidar(estudio.id)
+    citas_cliente.invalidar()
+    logger.info(f"📥 {filas} citas importadas")
+    return filas
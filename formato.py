@@ -0,0 +1,13 @@
+from datetime import date, time
+
+# ================= FORMATO PARA MENSAJES =================
+FORMATO_FECHA = '%d/%m/%Y'
+FORMATO_HORA = '%H:%M'
+
+def fecha_txt(fecha: date) -> str:
+    """Fecha como la escriben los clientes: DD/MM/AAAA"""
+    return fecha.strftime(FORMATO_FECHA)
+
+def hora_txt(hora: time) -> str:
+    """Hora en formato de 24 horas: HH:MM"""
+    return hora.strftime(FORMATO_HORA)
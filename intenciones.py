@@ -0,0 +1,76 @@
+import os
+import re
+import json
+import logging
+import unicodedata
+from string import Formatter
+from typing import NamedTuple, Optional
+
+# ================= CONFIGURACIÓN =================
+# Palabras clave y respuestas automáticas; el estudio puede editar el archivo
+# (agregar preguntas frecuentes) sin tocar el código
+INTENCIONES_ARCHIVO = os.getenv(
+    'INTENCIONES_ARCHIVO', os.path.join(os.path.dirname(__file__), 'intenciones.json')
+)
+
+logger = logging.getLogger(__name__)
+
+class Intencion(NamedTuple):
+    nombre: str
+    respuesta: str
+    markdown: bool
+
+# ================= NORMALIZACIÓN =================
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes: "Adiós" y "adios" se reconocen igual"""
+    descompuesto = unicodedata.normalize('NFKD', texto.casefold())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+def _patron(palabra: str) -> str:
+    # "hasta  luego" también reconoce varios espacios entre palabras
+    return r'\s+'.join(re.escape(parte) for parte in normalizar(palabra).split())
+
+# ================= CLASIFICADOR =================
+# Todas las palabras clave se compilan en una sola expresión regular con un
+# grupo por intención, así cada mensaje se recorre una única vez sin importar
+# cuántas intenciones haya. Los límites de palabra evitan que "hi" coincida
+# dentro de "hice"; si el mensaje menciona varias, gana la que aparece primero.
+_expresion: Optional[re.Pattern] = None
+_intenciones: list[Intencion] = []
+
+def cargar(ruta: str = INTENCIONES_ARCHIVO):
+    """Leer las intenciones y compilar el clasificador
+
+    Las respuestas quedan como plantillas ({ubicacion}, {whatsapp}...); bot.py
+    las completa con los datos de cada estudio una sola vez y las memoriza.
+    """
+    global _expresion, _intenciones
+
+    with open(ruta, encoding='utf-8') as archivo:
+        config = json.load(archivo)
+
+    intenciones, grupos = [], []
+    for i, item in enumerate(config.get('intenciones', [])):
+        # Las alternativas más largas primero: "buenas tardes" antes que "buenas"
+        palabras = sorted({_patron(p) for p in item['palabras'] if p.strip()}, key=len, reverse=True)
+        if not palabras:
+            continue
+        # Un error de llaves en la plantilla se detecta aquí y no al responder
+        list(Formatter().parse(item['respuesta']))
+        intenciones.append(Intencion(
+            item['nombre'], item['respuesta'], item.get('markdown', False)
+        ))
+        grupos.append(f"(?P<i{len(grupos)}>{'|'.join(palabras)})")
+
+    _expresion = re.compile(rf"\b(?:{'|'.join(grupos)})\b") if grupos else None
+    _intenciones = intenciones
+    logger.info(f"💬 {len(intenciones)} intenciones cargadas de {ruta}")
+
+def clasificar(texto: str) -> Optional[Intencion]:
+    """Intención del mensaje, o None si no coincide con ninguna"""
+    if _expresion is None:
+        return None
+    coincidencia = _expresion.search(normalizar(texto))
+    if coincidencia is None:
+        return None
+    return _intenciones[int(coincidencia.lastgroup[1:])]
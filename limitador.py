@@ -0,0 +1,128 @@
+import os
+import asyncio
+from time import monotonic
+from typing import Optional
+
+from telegram import Update
+from telegram.error import TelegramError
+
+import metricas
+
+# ================= TOKEN BUCKET =================
+class CuboTokens:
+    """Token bucket: se recargan `tasa` fichas por segundo hasta `capacidad`"""
+    __slots__ = ('tasa', 'capacidad', 'fichas', 'actualizado')
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.fichas = capacidad
+        self.actualizado = monotonic()
+
+    def _recargar(self):
+        ahora = monotonic()
+        self.fichas = min(self.capacidad, self.fichas + (ahora - self.actualizado) * self.tasa)
+        self.actualizado = ahora
+
+    def intentar(self) -> bool:
+        """Gastar una ficha si hay; no espera"""
+        self._recargar()
+        if self.fichas >= 1:
+            self.fichas -= 1
+            return True
+        return False
+
+    async def esperar(self):
+        """Reservar una ficha y dormir hasta que esté disponible
+
+        La reserva deja el saldo en negativo, así que quien llega después
+        espera detrás de quien llegó antes.
+        """
+        self._recargar()
+        self.fichas -= 1
+        if self.fichas < 0:
+            await asyncio.sleep(-self.fichas / self.tasa)
+
+# ================= LÍMITE DE UPDATES POR USUARIO =================
+# Filtro que corre al sacar cada update de la cola de PTB, antes de que espere
+# turno o lugar en concurrencia.AplicacionOrdenada: lo que se descarta aquí no
+# ocupa a ningún worker ni llega a Postgres. Cada usuario tiene su token
+# bucket, los toques repetidos del mismo botón se ignoran durante
+# LIMITE_REBOTE segundos y un bucket global acota lo que admite el bot entero.
+# Cualquiera de los tres se desactiva con 0.
+LIMITE_TASA_USUARIO = float(os.getenv('LIMITE_TASA_USUARIO', '1'))
+LIMITE_RAFAGA_USUARIO = float(os.getenv('LIMITE_RAFAGA_USUARIO', '5'))
+LIMITE_REBOTE = float(os.getenv('LIMITE_REBOTE', '1'))
+LIMITE_GLOBAL = float(os.getenv('LIMITE_GLOBAL', '50'))
+LIMITE_AVISO_CADA = 30
+PURGA_CADA = 60
+
+AVISO_BOTON = "⏳ Vas muy rápido, espera un momento."
+AVISO_MENSAJE = "⏳ Estás enviando mensajes muy rápido, espera un momento."
+
+_cubos: dict[int, CuboTokens] = {}
+# user_id -> (último callback_data, cuándo)
+_ultimo_boton: dict[int, tuple[str, float]] = {}
+_avisados: dict[int, float] = {}
+_cubo_global = CuboTokens(LIMITE_GLOBAL, LIMITE_GLOBAL)
+_ultima_purga = monotonic()
+
+def _purgar(ahora: float):
+    """Olvidar a los usuarios inactivos: un cubo lleno es igual a uno nuevo"""
+    global _ultima_purga
+    _ultima_purga = ahora
+    for user_id, cubo in list(_cubos.items()):
+        cubo._recargar()
+        if cubo.fichas >= cubo.capacidad:
+            del _cubos[user_id]
+    for user_id, (_, cuando) in list(_ultimo_boton.items()):
+        if ahora - cuando >= LIMITE_REBOTE:
+            del _ultimo_boton[user_id]
+    for user_id, cuando in list(_avisados.items()):
+        if ahora - cuando >= LIMITE_AVISO_CADA:
+            del _avisados[user_id]
+
+def _motivo(update: Update, user_id: int, ahora: float) -> Optional[str]:
+    """Por qué se descarta el update, o None si pasa"""
+    query = update.callback_query
+    if query is not None and LIMITE_REBOTE > 0:
+        anterior = _ultimo_boton.get(user_id)
+        _ultimo_boton[user_id] = (query.data, ahora)
+        if anterior and anterior[0] == query.data and ahora - anterior[1] < LIMITE_REBOTE:
+            return 'repetido'
+
+    if LIMITE_TASA_USUARIO > 0:
+        cubo = _cubos.get(user_id)
+        if cubo is None:
+            cubo = _cubos[user_id] = CuboTokens(LIMITE_TASA_USUARIO, LIMITE_RAFAGA_USUARIO)
+        if not cubo.intentar():
+            return 'usuario'
+    if LIMITE_GLOBAL > 0 and not _cubo_global.intentar():
+        return 'global'
+    return None
+
+def admitir(update: object) -> Optional[str]:
+    """Motivo por el que se descarta el update, o None si el usuario y el bot van a buen ritmo"""
+    if not isinstance(update, Update) or update.effective_user is None:
+        return None
+    ahora = monotonic()
+    if ahora - _ultima_purga >= PURGA_CADA:
+        _purgar(ahora)
+
+    motivo = _motivo(update, update.effective_user.id, ahora)
+    if motivo is not None:
+        metricas.DESCARTADOS.sumar(motivo)
+    return motivo
+
+async def rechazar(update: Update, motivo: str):
+    """Respuestas fijas a un update descartado, sin tocar la base; el botón siempre deja de cargar"""
+    user_id = update.effective_user.id
+    ahora = monotonic()
+    try:
+        if update.callback_query is not None:
+            await update.callback_query.answer(None if motivo == 'repetido' else AVISO_BOTON)
+        elif update.effective_message is not None and ahora - _avisados.get(user_id, -LIMITE_AVISO_CADA) >= LIMITE_AVISO_CADA:
+            _avisados[user_id] = ahora
+            await update.effective_message.reply_text(AVISO_MENSAJE)
+    except TelegramError:
+        pass
@@ -0,0 +1,118 @@
+from datetime import datetime
+from typing import Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import consultas
+from formato import FORMATO_FECHA, fecha_txt, hora_txt
+
+# ================= LISTADO PAGINADO DE CITAS (ADMIN) =================
+# callback_data: "ac:<n|p>:<id cursor>:<estado>:<desde>:<hasta>:<servicio>"
+# Los filtros viajan en el propio botón (máx. 64 bytes), así que no hace
+# falta guardar nada en memoria entre páginas.
+PREFIJO = 'ac'
+TAMANO_PAGINA = 10
+ESTADOS = {'a': 'activa', 'c': 'cancelada'}
+
+def filtros_desde_args(args: list[str], estudio) -> dict:
+    """Filtros de /admin_citas [activa|cancelada] [desde] [hasta] [opción de un servicio del estudio]"""
+    filtros = {'estado': None, 'desde': None, 'hasta': None, 'servicio': None}
+    fechas = []
+    for arg in args:
+        arg = arg.strip().lower()
+        if arg in ('activa', 'activas'):
+            filtros['estado'] = 'a'
+        elif arg in ('cancelada', 'canceladas'):
+            filtros['estado'] = 'c'
+        elif estudio.servicio(arg) is not None:
+            filtros['servicio'] = arg
+        else:
+            fechas.append(datetime.strptime(arg, FORMATO_FECHA).date())
+
+    if len(fechas) > 2:
+        raise ValueError("Demasiadas fechas")
+    if fechas:
+        filtros['desde'] = fechas[0]
+        filtros['hasta'] = fechas[1] if len(fechas) > 1 else None
+    return filtros
+
+def _codificar(accion: str, cursor: int, filtros: dict) -> str:
+    desde = filtros['desde'].strftime('%Y%m%d') if filtros['desde'] else ''
+    hasta = filtros['hasta'].strftime('%Y%m%d') if filtros['hasta'] else ''
+    return ':'.join((
+        PREFIJO, accion, str(cursor), filtros['estado'] or '',
+        desde, hasta, filtros['servicio'] or '',
+    ))
+
+def nombre_servicio(estudio, filtros: dict) -> Optional[str]:
+    """Nombre guardado en `citas.servicio` del filtro de servicio, según el catálogo del estudio"""
+    servicio = estudio.servicio(filtros['servicio']) if filtros['servicio'] else None
+    return servicio.nombre if servicio else None
+
+def decodificar(data: str) -> tuple[bool, int, dict]:
+    """Convertir el callback_data de un botón en (atras, cursor, filtros)"""
+    _, accion, cursor, estado, desde, hasta, servicio = data.split(':')
+    filtros = {
+        'estado': estado or None,
+        'desde': datetime.strptime(desde, '%Y%m%d').date() if desde else None,
+        'hasta': datetime.strptime(hasta, '%Y%m%d').date() if hasta else None,
+        'servicio': servicio or None,
+    }
+    return accion == 'p', int(cursor), filtros
+
+async def cargar_pagina(estudio, filtros: dict, cursor: Optional[int] = None, atras: bool = False):
+    """Traer una página de citas del estudio (una sola consulta) y saber si hay páginas antes y después"""
+    citas = await consultas.pagina_citas(
+        estudio.id,
+        ESTADOS.get(filtros['estado']),
+        filtros['desde'],
+        filtros['hasta'],
+        nombre_servicio(estudio, filtros),
+        cursor,
+        TAMANO_PAGINA + 1,
+        atras=atras,
+    )
+    hay_mas = len(citas) > TAMANO_PAGINA
+    citas = citas[:TAMANO_PAGINA]
+    if atras:
+        return citas[::-1], hay_mas, True
+    return citas, cursor is not None, hay_mas
+
+def render_pagina(estudio, citas, filtros: dict, hay_anterior: bool, hay_siguiente: bool):
+    """Texto y teclado de navegación de una página del listado"""
+    if not citas:
+        return "📭 *No hay citas con esos filtros.*", None
+
+    texto = "📊 *CITAS REGISTRADAS:*\n"
+    aplicados = []
+    if filtros['estado']:
+        aplicados.append(ESTADOS[filtros['estado']])
+    if filtros['desde']:
+        aplicados.append(f"desde {fecha_txt(filtros['desde'])}")
+    if filtros['hasta']:
+        aplicados.append(f"hasta {fecha_txt(filtros['hasta'])}")
+    servicio = nombre_servicio(estudio, filtros)
+    if servicio:
+        aplicados.append(servicio)
+    if aplicados:
+        texto += f"🔎 _{', '.join(aplicados)}_\n"
+    texto += "\n"
+
+    for cita in citas:
+        estado_emoji = "✅" if cita['estado'] == 'activa' else "❌"
+        texto += f"{estado_emoji} *ID:* {cita['id']}\n"
+        texto += f"👤 *Cliente:* {cita['cliente_nombre']}\n"
+        texto += f"📞 *Teléfono:* {cita['telefono']}\n"
+        texto += f"💅 *Servicio:* {cita['servicio']}\n"
+        texto += f"📅 *Fecha:* {fecha_txt(cita['fecha'])}\n"
+        texto += f"⏰ *Hora:* {hora_txt(cita['hora'])}\n"
+        texto += f"🆔 *User ID:* `{cita['user_id']}`\n"
+        texto += f"📊 *Estado:* {cita['estado']}\n"
+        texto += "────────────\n"
+
+    botones = []
+    if hay_anterior:
+        botones.append(InlineKeyboardButton("⬅️ Anteriores", callback_data=_codificar('p', citas[0]['id'], filtros)))
+    if hay_siguiente:
+        botones.append(InlineKeyboardButton("Siguientes ➡️", callback_data=_codificar('n', citas[-1]['id'], filtros)))
+    return texto, InlineKeyboardMarkup([botones]) if botones else None
@@ -0,0 +1,163 @@
+from bisect import bisect_left
+from collections import defaultdict
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Optional
+
+from telegram.request import HTTPXRequest
+
+# ================= MÉTRICAS (FORMATO PROMETHEUS) =================
+# Contadores e histogramas en memoria, expuestos en texto plano en /metrics
+# (ver servidor.py). Sin dependencias: solo lo que este bot necesita medir.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _etiquetas(nombres: tuple, valores: tuple, extra: str = '') -> str:
+    partes = [f'{n}="{str(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return '{' + ','.join(partes) + '}' if partes else ''
+
+class Histograma:
+    """Histograma con buckets fijos, una serie por combinación de etiquetas"""
+    __slots__ = ('nombre', 'ayuda', 'etiquetas', 'series')
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        # valores -> [conteo por bucket..., +Inf, suma]
+        self.series = defaultdict(lambda: [0] * (len(BUCKETS) + 1) + [0.0])
+
+    def observar(self, segundos: float, *valores):
+        serie = self.series[valores]
+        serie[bisect_left(BUCKETS, segundos)] += 1
+        serie[-1] += segundos
+
+    def exponer(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for valores, serie in list(self.series.items()):
+            acumulado = 0
+            for limite, conteo in zip(BUCKETS + ('+Inf',), serie):
+                acumulado += conteo
+                etiquetas = _etiquetas(self.etiquetas, valores, f'le="{limite}"')
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            etiquetas = _etiquetas(self.etiquetas, valores)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {serie[-1]}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {acumulado}")
+        return lineas
+
+class Contador:
+    """Contador que solo crece, una serie por combinación de etiquetas"""
+    __slots__ = ('nombre', 'ayuda', 'etiquetas', 'series')
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.series = defaultdict(int)
+
+    def sumar(self, *valores, cantidad: int = 1):
+        self.series[valores] += cantidad
+
+    def exponer(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        for valores, total in list(self.series.items()):
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {total}")
+        return lineas
+
+HANDLERS = Histograma('bot_handler_segundos', 'Duración de cada handler', ('handler',))
+ERRORES_HANDLER = Contador('bot_handler_errores_total', 'Excepciones en handlers', ('handler',))
+CONSULTAS = Histograma('bot_db_consulta_segundos', 'Duración de cada sentencia preparada', ('consulta',))
+ERRORES_CONSULTA = Contador('bot_db_consulta_errores_total', 'Sentencias que fallaron', ('consulta',))
+TELEGRAM = Histograma('bot_telegram_segundos', 'Duración de las llamadas a la API de Telegram', ('metodo',))
+ERRORES_TELEGRAM = Contador(
+    'bot_telegram_errores_total', 'Llamadas a Telegram con error (HTTP o de red)', ('metodo', 'codigo')
+)
+DESCARTADOS = Contador(
+    'bot_updates_descartados_total', 'Updates descartados antes de llegar a los handlers', ('motivo',)
+)
+
+_metricas = [HANDLERS, ERRORES_HANDLER, CONSULTAS, ERRORES_CONSULTA, TELEGRAM, ERRORES_TELEGRAM, DESCARTADOS]
+_indicadores: dict[str, tuple[str, Callable[[], float]]] = {}
+
+def indicador(nombre: str, ayuda: str, leer: Callable[[], float]):
+    """Registrar un valor instantáneo (tamaño de una cola, conexiones libres...) que se lee al exponer"""
+    _indicadores[nombre] = (ayuda, leer)
+
+def exponer() -> str:
+    """Todas las métricas en el formato de texto de Prometheus"""
+    lineas = []
+    for metrica in _metricas:
+        lineas.extend(metrica.exponer())
+    for nombre, (ayuda, leer) in _indicadores.items():
+        try:
+            valor = leer()
+        except Exception:
+            continue
+        lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} gauge", f"{nombre} {valor}"]
+    return '\n'.join(lineas) + '\n'
+
+# ================= INSTRUMENTACIÓN =================
+def medir(handler: Callable):
+    """Decorador para handlers que no pasan por el despachador (comandos)"""
+    @wraps(handler)
+    async def medido(update, context):
+        inicio = perf_counter()
+        try:
+            return await handler(update, context)
+        except Exception:
+            ERRORES_HANDLER.sumar(handler.__name__)
+            raise
+        finally:
+            HANDLERS.observar(perf_counter() - inicio, handler.__name__)
+    return medido
+
+def medir_despacho(handler: str, antes, despues, segundos: float, error: Optional[BaseException]):
+    """Hook para `Despachador.al_medir`: latencia y errores de botones y pasos de texto"""
+    if error is not None:
+        ERRORES_HANDLER.sumar(handler)
+    HANDLERS.observar(segundos, handler)
+
+class SentenciaMedida:
+    """Sentencia preparada que registra cuánto tarda cada ejecución"""
+    __slots__ = ('nombre', 'sentencia')
+
+    def __init__(self, nombre: str, sentencia):
+        self.nombre = nombre
+        self.sentencia = sentencia
+
+    async def _medir(self, metodo: str, args):
+        inicio = perf_counter()
+        try:
+            return await getattr(self.sentencia, metodo)(*args)
+        except Exception:
+            ERRORES_CONSULTA.sumar(self.nombre)
+            raise
+        finally:
+            CONSULTAS.observar(perf_counter() - inicio, self.nombre)
+
+    async def fetch(self, *args):
+        return await self._medir('fetch', args)
+
+    async def fetchrow(self, *args):
+        return await self._medir('fetchrow', args)
+
+    async def fetchval(self, *args):
+        return await self._medir('fetchval', args)
+
+class PeticionMedida(HTTPXRequest):
+    """Cliente HTTP del bot que mide cada llamada a la API de Telegram"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        metodo = url.rsplit('/', 1)[-1]
+        inicio = perf_counter()
+        try:
+            codigo, cuerpo = await super().do_request(url, method, *args, **kwargs)
+        except Exception as e:
+            ERRORES_TELEGRAM.sumar(metodo, type(e).__name__)
+            raise
+        finally:
+            TELEGRAM.observar(perf_counter() - inicio, metodo)
+        if codigo >= 400:
+            ERRORES_TELEGRAM.sumar(metodo, codigo)
+        return codigo, cuerpo
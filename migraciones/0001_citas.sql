@@ -0,0 +1,12 @@
+-- Tabla base de citas (ya existe en las instalaciones creadas a mano en Supabase)
+CREATE TABLE IF NOT EXISTS citas (
+    id serial PRIMARY KEY,
+    user_id bigint NOT NULL,
+    cliente_nombre text NOT NULL,
+    telefono text NOT NULL,
+    servicio text NOT NULL,
+    fecha text NOT NULL,
+    hora text NOT NULL,
+    estado text NOT NULL DEFAULT 'activa',
+    creado_en timestamptz NOT NULL DEFAULT now()
+);
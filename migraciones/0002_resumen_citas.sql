@@ -0,0 +1,48 @@
+-- Contadores por día de registro y servicio, mantenidos por un trigger en cada
+-- INSERT/UPDATE/DELETE de `citas`. Las estadísticas leen este resumen en lugar
+-- de recorrer toda la tabla.
+CREATE TABLE IF NOT EXISTS citas_resumen (
+    dia date NOT NULL,
+    servicio text NOT NULL,
+    creadas integer NOT NULL DEFAULT 0,
+    canceladas integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, servicio)
+);
+
+CREATE OR REPLACE FUNCTION citas_resumen_actualizar() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO citas_resumen (dia, servicio, creadas, canceladas)
+        VALUES (NEW.creado_en::date, NEW.servicio, 1, (NEW.estado = 'cancelada')::int)
+        ON CONFLICT (dia, servicio) DO UPDATE
+            SET creadas = citas_resumen.creadas + 1,
+                canceladas = citas_resumen.canceladas + EXCLUDED.canceladas;
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF NEW.estado IS DISTINCT FROM OLD.estado THEN
+            UPDATE citas_resumen
+            SET canceladas = canceladas
+                + (NEW.estado = 'cancelada')::int
+                - (OLD.estado = 'cancelada')::int
+            WHERE dia = OLD.creado_en::date AND servicio = OLD.servicio;
+        END IF;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE citas_resumen
+        SET creadas = creadas - 1,
+            canceladas = canceladas - (OLD.estado = 'cancelada')::int
+        WHERE dia = OLD.creado_en::date AND servicio = OLD.servicio;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS citas_resumen_trigger ON citas;
+CREATE TRIGGER citas_resumen_trigger
+    AFTER INSERT OR UPDATE OF estado OR DELETE ON citas
+    FOR EACH ROW EXECUTE FUNCTION citas_resumen_actualizar();
+
+-- Relleno inicial (solo si el resumen está vacío: puede existir de una versión anterior)
+INSERT INTO citas_resumen (dia, servicio, creadas, canceladas)
+SELECT creado_en::date, servicio, COUNT(*), COUNT(*) FILTER (WHERE estado = 'cancelada')
+FROM citas
+WHERE NOT EXISTS (SELECT 1 FROM citas_resumen)
+GROUP BY 1, 2;
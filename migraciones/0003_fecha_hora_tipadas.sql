@@ -0,0 +1,14 @@
+-- `fecha` y `hora` se guardaban como texto 'DD/MM/AAAA' y 'HH:MM', lo que
+-- ordenaba por día antes que por mes y no permitía búsquedas por rango.
+-- Se convierten a date/time (rellenando las filas existentes) y se añade
+-- `inicia_en` para indexar el inicio de la cita.
+ALTER TABLE citas
+    ALTER COLUMN fecha TYPE date USING to_date(fecha, 'DD/MM/YYYY'),
+    ALTER COLUMN hora TYPE time USING hora::time;
+
+ALTER TABLE citas
+    ADD COLUMN inicia_en timestamp GENERATED ALWAYS AS (fecha + hora) STORED;
+
+CREATE INDEX IF NOT EXISTS citas_usuario_estado_inicio_idx ON citas (user_id, estado, inicia_en);
+CREATE INDEX IF NOT EXISTS citas_estado_inicio_idx ON citas (estado, inicia_en);
+CREATE INDEX IF NOT EXISTS citas_creado_en_idx ON citas (creado_en);
@@ -0,0 +1,63 @@
+-- Cada cita ocupa la agenda durante la duración de su servicio; la restricción
+-- de exclusión impide que dos citas activas se solapen aunque dos clientes
+-- confirmen el mismo horario a la vez.
+ALTER TABLE citas ADD COLUMN duracion_min integer NOT NULL DEFAULT 60;
+
+UPDATE citas SET duracion_min = CASE servicio
+    WHEN 'Manicure Tradicional' THEN 45
+    WHEN 'Uñas Esculpidas' THEN 120
+    WHEN 'Kapping Gel' THEN 90
+    WHEN 'Semipermante' THEN 60
+    WHEN 'Pedicure Spa' THEN 60
+    WHEN 'Diseño Especial' THEN 90
+    WHEN 'Retiro de Acrílico' THEN 45
+    ELSE 60
+END;
+
+ALTER TABLE citas
+    ADD COLUMN termina_en timestamp
+    GENERATED ALWAYS AS (fecha + hora + duracion_min * interval '1 minute') STORED;
+
+-- Las citas dobles de días pasados nunca dejan de estar 'activa': de cada
+-- solape se conserva la reservada primero y las demás pasan a 'solapada' (no
+-- cuentan como canceladas en las estadísticas). Las de hoy en adelante hay que
+-- resolverlas a mano con el cliente antes de aplicar esto.
+DO $$
+DECLARE
+    apartadas integer := 0;
+    solapes text;
+BEGIN
+    LOOP
+        UPDATE citas SET estado = 'solapada'
+        WHERE id = (
+            SELECT b.id
+            FROM citas a
+            JOIN citas b ON a.id < b.id
+                AND tsrange(a.inicia_en, a.termina_en) && tsrange(b.inicia_en, b.termina_en)
+            WHERE a.estado = 'activa' AND b.estado = 'activa' AND b.inicia_en < CURRENT_DATE
+            ORDER BY b.id
+            LIMIT 1
+        );
+        EXIT WHEN NOT FOUND;
+        apartadas := apartadas + 1;
+    END LOOP;
+    IF apartadas > 0 THEN
+        RAISE WARNING '% citas pasadas que se solapaban quedaron como solapada', apartadas;
+    END IF;
+
+    SELECT string_agg(a.id || '/' || b.id, ', ') INTO solapes
+    FROM citas a
+    JOIN citas b ON a.id < b.id
+        AND tsrange(a.inicia_en, a.termina_en) && tsrange(b.inicia_en, b.termina_en)
+    WHERE a.estado = 'activa' AND b.estado = 'activa';
+
+    IF solapes IS NOT NULL THEN
+        RAISE EXCEPTION 'Hay citas activas solapadas de hoy en adelante (IDs %), cancela una de cada par antes de migrar', solapes;
+    END IF;
+END;
+$$;
+
+ALTER TABLE citas
+    ADD CONSTRAINT citas_sin_solapes
+    EXCLUDE USING gist (tsrange(inicia_en, termina_en) WITH &&)
+    WHERE (estado = 'activa');
@@ -0,0 +1,10 @@
+-- Estado de los flujos de agendamiento/cancelación (context.user_data) para
+-- que sobreviva a reinicios y se pueda compartir entre instancias.
+CREATE TABLE IF NOT EXISTS estado_conversaciones (
+    user_id bigint PRIMARY KEY,
+    datos jsonb NOT NULL,
+    actualizado_en timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS estado_conversaciones_actualizado_idx
+    ON estado_conversaciones (actualizado_en);
@@ -0,0 +1,8 @@
+-- Recordatorios de citas: se marca cuándo se envió para no repetirlo tras
+-- un reinicio. El índice parcial solo contiene las citas que aún esperan
+-- recordatorio, así la consulta periódica no recorre el historial.
+ALTER TABLE citas ADD COLUMN IF NOT EXISTS recordatorio_enviado_en timestamptz;
+
+CREATE INDEX IF NOT EXISTS citas_recordatorio_pendiente_idx
+    ON citas (inicia_en)
+    WHERE estado = 'activa' AND recordatorio_enviado_en IS NULL;
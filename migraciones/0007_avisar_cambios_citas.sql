@@ -0,0 +1,22 @@
+-- Aviso (NOTIFY citas_cambios, con el user_id) cada vez que cambia lo que un
+-- cliente ve en "Mis citas", para que todas las instancias del bot invaliden
+-- su caché (ver citas_cliente.py). Postgres entrega los avisos al confirmar
+-- la transacción; si nadie escucha no tienen costo apreciable.
+CREATE OR REPLACE FUNCTION citas_avisar_cambio() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('citas_cambios', OLD.user_id::text);
+    ELSE
+        PERFORM pg_notify('citas_cambios', NEW.user_id::text);
+        IF TG_OP = 'UPDATE' AND NEW.user_id IS DISTINCT FROM OLD.user_id THEN
+            PERFORM pg_notify('citas_cambios', OLD.user_id::text);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS citas_avisar_cambio_trigger ON citas;
+CREATE TRIGGER citas_avisar_cambio_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, cliente_nombre, servicio, fecha, hora, estado ON citas
+    FOR EACH ROW EXECUTE FUNCTION citas_avisar_cambio();
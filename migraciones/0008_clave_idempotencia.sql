@@ -0,0 +1,6 @@
+-- Clave única que el bot genera para cada reserva: si un INSERT se repite
+-- (reintento tras un corte con Supabase, reproducción del diario local) no
+-- se crea una cita duplicada. Las citas anteriores quedan con NULL.
+ALTER TABLE citas ADD COLUMN IF NOT EXISTS clave_idempotencia text;
+
+CREATE UNIQUE INDEX IF NOT EXISTS citas_clave_idempotencia_idx ON citas (clave_idempotencia);
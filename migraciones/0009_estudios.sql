@@ -0,0 +1,61 @@
+-- Configuración de los estudios (varios estudios en un mismo deploy). El bot
+-- la carga completa en memoria (ver estudios.py) y solo vuelve a leerla
+-- cuando cambia `configuracion_version`, que los triggers suben con cualquier
+-- cambio en estas tablas. Sin filas, el bot usa el estudio por defecto que
+-- arma con sus variables de entorno, como antes.
+CREATE TABLE IF NOT EXISTS estudios (
+    id text PRIMARY KEY,
+    nombre text NOT NULL,
+    -- ID del bot de Telegram que atiende a este estudio (NULL: el estudio por defecto)
+    bot_id bigint UNIQUE,
+    ubicacion text NOT NULL,
+    direccion text NOT NULL DEFAULT '',
+    indicaciones text NOT NULL DEFAULT '',
+    horario text NOT NULL DEFAULT '',
+    whatsapp text NOT NULL,
+    extras text NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS estudio_servicios (
+    estudio_id text NOT NULL REFERENCES estudios (id) ON DELETE CASCADE,
+    opcion text NOT NULL,
+    nombre text NOT NULL,
+    emoji text NOT NULL DEFAULT '💅',
+    duracion_min integer NOT NULL CHECK (duracion_min > 0),
+    precio numeric(10, 2),
+    PRIMARY KEY (estudio_id, opcion)
+);
+
+CREATE TABLE IF NOT EXISTS estudio_admins (
+    estudio_id text NOT NULL REFERENCES estudios (id) ON DELETE CASCADE,
+    user_id bigint NOT NULL,
+    PRIMARY KEY (estudio_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS configuracion_version (
+    unica boolean PRIMARY KEY DEFAULT true CHECK (unica),
+    version bigint NOT NULL DEFAULT 0
+);
+INSERT INTO configuracion_version DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION configuracion_cambio() RETURNS trigger AS $$
+BEGIN
+    UPDATE configuracion_version SET version = version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS estudios_cambio_trigger ON estudios;
+CREATE TRIGGER estudios_cambio_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON estudios
+    FOR EACH STATEMENT EXECUTE FUNCTION configuracion_cambio();
+
+DROP TRIGGER IF EXISTS estudio_servicios_cambio_trigger ON estudio_servicios;
+CREATE TRIGGER estudio_servicios_cambio_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON estudio_servicios
+    FOR EACH STATEMENT EXECUTE FUNCTION configuracion_cambio();
+
+DROP TRIGGER IF EXISTS estudio_admins_cambio_trigger ON estudio_admins;
+CREATE TRIGGER estudio_admins_cambio_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON estudio_admins
+    FOR EACH STATEMENT EXECUTE FUNCTION configuracion_cambio();
@@ -0,0 +1,56 @@
+-- Cada cita pertenece a un estudio: la agenda, los listados, las estadísticas
+-- y las cancelaciones de un estudio no ven las citas de los demás, y dos
+-- estudios pueden tener citas a la misma hora. Las citas que ya existían son
+-- del estudio por defecto: esquema.py pasa ESTUDIO_POR_DEFECTO en el ajuste
+-- `bot.estudio_por_defecto` antes de migrar.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+ALTER TABLE citas ADD COLUMN estudio_id text;
+UPDATE citas
+SET estudio_id = COALESCE(NULLIF(current_setting('bot.estudio_por_defecto', true), ''), 'veronica');
+ALTER TABLE citas ALTER COLUMN estudio_id SET NOT NULL;
+
+-- Los solapes solo cuentan dentro del mismo estudio
+ALTER TABLE citas DROP CONSTRAINT citas_sin_solapes;
+ALTER TABLE citas
+    ADD CONSTRAINT citas_sin_solapes
+    EXCLUDE USING gist (estudio_id WITH =, tsrange(inicia_en, termina_en) WITH &&)
+    WHERE (estado = 'activa');
+
+-- La agenda del día y los listados siempre filtran por estudio
+DROP INDEX IF EXISTS citas_estado_inicio_idx;
+CREATE INDEX IF NOT EXISTS citas_estudio_estado_inicio_idx ON citas (estudio_id, estado, inicia_en);
+
+-- El resumen de la migración 0002 pasa a contarse por estudio
+ALTER TABLE citas_resumen ADD COLUMN estudio_id text;
+UPDATE citas_resumen
+SET estudio_id = COALESCE(NULLIF(current_setting('bot.estudio_por_defecto', true), ''), 'veronica');
+ALTER TABLE citas_resumen ALTER COLUMN estudio_id SET NOT NULL;
+ALTER TABLE citas_resumen DROP CONSTRAINT citas_resumen_pkey;
+ALTER TABLE citas_resumen ADD PRIMARY KEY (estudio_id, dia, servicio);
+
+CREATE OR REPLACE FUNCTION citas_resumen_actualizar() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO citas_resumen (estudio_id, dia, servicio, creadas, canceladas)
+        VALUES (NEW.estudio_id, NEW.creado_en::date, NEW.servicio, 1, (NEW.estado = 'cancelada')::int)
+        ON CONFLICT (estudio_id, dia, servicio) DO UPDATE
+            SET creadas = citas_resumen.creadas + 1,
+                canceladas = citas_resumen.canceladas + EXCLUDED.canceladas;
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF NEW.estado IS DISTINCT FROM OLD.estado THEN
+            UPDATE citas_resumen
+            SET canceladas = canceladas
+                + (NEW.estado = 'cancelada')::int
+                - (OLD.estado = 'cancelada')::int
+            WHERE estudio_id = OLD.estudio_id AND dia = OLD.creado_en::date AND servicio = OLD.servicio;
+        END IF;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE citas_resumen
+        SET creadas = creadas - 1,
+            canceladas = canceladas - (OLD.estado = 'cancelada')::int
+        WHERE estudio_id = OLD.estudio_id AND dia = OLD.creado_en::date AND servicio = OLD.servicio;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,16 @@
+-- Horario de atención de cada estudio: lo que el bot ofrece al agendar y los
+-- huecos de la agenda. `dia` es el weekday() de Python (0 = lunes); los días
+-- sin fila no se agenda por el bot. Un estudio sin ninguna fila usa el horario
+-- del catálogo (catalogo.HORARIOS), como antes.
+CREATE TABLE IF NOT EXISTS estudio_horarios (
+    estudio_id text NOT NULL REFERENCES estudios (id) ON DELETE CASCADE,
+    dia smallint NOT NULL CHECK (dia BETWEEN 0 AND 6),
+    apertura time NOT NULL,
+    cierre time NOT NULL CHECK (cierre > apertura),
+    PRIMARY KEY (estudio_id, dia)
+);
+
+DROP TRIGGER IF EXISTS estudio_horarios_cambio_trigger ON estudio_horarios;
+CREATE TRIGGER estudio_horarios_cambio_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON estudio_horarios
+    FOR EACH STATEMENT EXECUTE FUNCTION configuracion_cambio();
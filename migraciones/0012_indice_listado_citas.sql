@@ -0,0 +1,4 @@
+-- /admin_citas sin filtro de estado recorre las citas del estudio en orden
+-- (inicia_en, id): con este índice cada página es un recorrido acotado por el
+-- cursor, sin ordenar el historial completo.
+CREATE INDEX IF NOT EXISTS citas_estudio_inicio_id_idx ON citas (estudio_id, inicia_en, id);
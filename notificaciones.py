@@ -0,0 +1,157 @@
+import os
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Optional
+
+from telegram.error import Forbidden, BadRequest, RetryAfter, TelegramError
+
+from limitador import CuboTokens
+
+# ================= CONFIGURACIÓN =================
+# Límites de Telegram: ~30 mensajes/s en total y ~1 mensaje/s por chat
+NOTIF_TASA_GLOBAL = float(os.getenv('NOTIF_TASA_GLOBAL', '25'))
+NOTIF_TASA_CHAT = float(os.getenv('NOTIF_TASA_CHAT', '1'))
+NOTIF_VENTANA_RESUMEN = float(os.getenv('NOTIF_VENTANA_RESUMEN', '1.5'))
+NOTIF_REINTENTOS = int(os.getenv('NOTIF_REINTENTOS', '4'))
+MAX_LARGO_MENSAJE = 4000
+
+logger = logging.getLogger(__name__)
+
+_bot = None
+_admin_ids: list[int] = []
+_cola: Optional[asyncio.Queue] = None
+_trabajador: Optional[asyncio.Task] = None
+_cubo_global = CuboTokens(NOTIF_TASA_GLOBAL, NOTIF_TASA_GLOBAL)
+_cubos_chat: dict[int, CuboTokens] = {}
+
+# ================= CICLO DE VIDA =================
+async def iniciar(bot, admin_ids):
+    """Arrancar el despachador en segundo plano"""
+    global _bot, _admin_ids, _cola, _trabajador
+    _bot = bot
+    _admin_ids = [int(admin_id.strip()) for admin_id in admin_ids if admin_id.strip()]
+    _cola = asyncio.Queue()
+    _trabajador = asyncio.create_task(_trabajar(), name='notificaciones')
+    logger.info(f"🔔 Despachador de notificaciones listo ({len(_admin_ids)} admins)")
+
+async def detener(timeout: float = 10):
+    """Enviar lo que quede en la cola y parar el despachador"""
+    global _trabajador
+    if _trabajador is None:
+        return
+    try:
+        await asyncio.wait_for(_cola.join(), timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"❌ Se descartan {_cola.qsize()} notificaciones pendientes al apagar")
+    _trabajador.cancel()
+    _trabajador = None
+
+def pendientes() -> int:
+    """Mensajes esperando en la cola"""
+    return _cola.qsize() if _cola is not None else 0
+
+# ================= ENCOLAR =================
+def encolar(chat_id: int, texto: str):
+    """Programar un mensaje sin esperar a que se envíe"""
+    if _cola is None:
+        logger.error(f"❌ Despachador sin iniciar, se pierde el mensaje para {chat_id}")
+        return
+    _cola.put_nowait((chat_id, texto))
+
+def notificar_admins(texto: str, admin_ids=None):
+    """Programar una notificación para TODOS los administradores (o los de un estudio)"""
+    for admin_id in _admin_ids if admin_ids is None else admin_ids:
+        encolar(admin_id, texto)
+
+# ================= ENVÍO =================
+def _cubo_chat(chat_id: int) -> CuboTokens:
+    cubo = _cubos_chat.get(chat_id)
+    if cubo is None:
+        cubo = _cubos_chat[chat_id] = CuboTokens(NOTIF_TASA_CHAT, 1)
+    return cubo
+
+async def enviar(chat_id: int, texto: str) -> bool:
+    """Enviar respetando los límites de Telegram, con reintentos; True si se entregó
+
+    Si el Markdown no es válido (p. ej. un nombre con `_` o `*`) se reenvía
+    como texto plano en lugar de perder el mensaje.
+    """
+    modo = 'Markdown'
+    for intento in range(NOTIF_REINTENTOS):
+        await _cubo_chat(chat_id).esperar()
+        await _cubo_global.esperar()
+        try:
+            await _bot.send_message(chat_id=chat_id, text=texto, parse_mode=modo)
+            return True
+        except RetryAfter as e:
+            logger.warning(f"⏳ Telegram pide esperar {e.retry_after}s (chat {chat_id})")
+            await asyncio.sleep(e.retry_after)
+        except BadRequest as e:
+            if modo is not None:
+                logger.warning(f"⚠️ Markdown inválido para {chat_id} ({e}), se envía como texto plano")
+                modo = None
+                continue
+            logger.error(f"❌ Error notificando a {chat_id}: {e}")
+            return False
+        except Forbidden as e:
+            # Bloquearon al bot: reintentar no sirve
+            logger.error(f"❌ Error notificando a {chat_id}: {e}")
+            return False
+        except TelegramError as e:
+            espera = 2 ** intento
+            logger.warning(f"⚠️ Fallo enviando a {chat_id} ({e}), reintento en {espera}s")
+            await asyncio.sleep(espera)
+    logger.error(f"❌ No se pudo notificar a {chat_id} tras {NOTIF_REINTENTOS} intentos")
+    return False
+
+def _resumen(textos: list[str]) -> list[str]:
+    """Agrupar varios mensajes del mismo chat en el menor número de envíos"""
+    if len(textos) == 1:
+        return textos
+    partes, actual = [], f"📬 *{len(textos)} novedades*"
+    for texto in textos:
+        bloque = f"\n\n────────────\n\n{texto}"
+        if len(actual) + len(bloque) > MAX_LARGO_MENSAJE:
+            partes.append(actual)
+            actual = texto
+        else:
+            actual += bloque
+    partes.append(actual)
+    return partes
+
+async def _enviar_a_chat(chat_id: int, textos: list[str]):
+    for texto in _resumen(textos):
+        if await enviar(chat_id, texto):
+            logger.info(f"✅ Notificación enviada a {chat_id}")
+
+async def _trabajar():
+    while True:
+        lote = [await _cola.get()]
+        # Las ráfagas (p. ej. varias citas seguidas) se juntan en un resumen
+        await asyncio.sleep(NOTIF_VENTANA_RESUMEN)
+        while not _cola.empty():
+            lote.append(_cola.get_nowait())
+
+        por_chat = defaultdict(list)
+        for chat_id, texto in lote:
+            por_chat[chat_id].append(texto)
+        try:
+            await asyncio.gather(*(
+                _enviar_a_chat(chat_id, textos) for chat_id, textos in por_chat.items()
+            ))
+        except Exception as e:
+            logger.error(f"❌ Error en el despachador de notificaciones: {e}")
+        finally:
+            for _ in lote:
+                _cola.task_done()
+        _podar_cubos()
+
+def _podar_cubos():
+    # Un cubo lleno equivale a uno nuevo, así que se puede olvidar
+    if len(_cubos_chat) < 1000:
+        return
+    for chat_id, cubo in list(_cubos_chat.items()):
+        cubo._recargar()
+        if cubo.fichas >= cubo.capacidad:
+            del _cubos_chat[chat_id]
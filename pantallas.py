@@ -0,0 +1,30 @@
+import logging
+from functools import wraps
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# ================= PANTALLAS PRE-RENDERIZADAS =================
+# Los menús que solo dependen de la configuración (texto Markdown y teclado)
+# se construyen la primera vez que se muestran y se reutilizan en cada update.
+# Lo que cambia por usuario (el nombre en /start) se agrega aparte. Una
+# pantalla que depende del estudio lo recibe como argumento y se guarda una
+# por estudio.
+_construidas: dict[tuple, object] = {}
+
+def estatica(construir: Callable):
+    """Memorizar el resultado de `construir(*args)` por argumentos hasta el próximo `invalidar()`"""
+    @wraps(construir)
+    def obtener(*args):
+        clave = (construir, *args)
+        try:
+            return _construidas[clave]
+        except KeyError:
+            pantalla = _construidas[clave] = construir(*args)
+            return pantalla
+    return obtener
+
+def invalidar():
+    """Descartar las pantallas construidas (al recargar la configuración)"""
+    logger.info(f"🧹 {len(_construidas)} pantallas descartadas")
+    _construidas.clear()
@@ -0,0 +1,175 @@
+import os
+import json
+import asyncio
+import logging
+from datetime import timedelta
+from time import monotonic, time
+from typing import Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import db
+import consultas
+
+# ================= CONFIGURACIÓN =================
+# PERSISTENCIA=ninguna deja el estado solo en memoria, como antes
+PERSISTENCIA = os.getenv('PERSISTENCIA', 'postgres')
+PERSISTENCIA_INTERVALO = float(os.getenv('PERSISTENCIA_INTERVALO', '10'))
+PERSISTENCIA_TTL = timedelta(hours=float(os.getenv('PERSISTENCIA_TTL_HORAS', '2')))
+# Con varias instancias, cada update relee el estado del usuario en Postgres
+PERSISTENCIA_COMPARTIDA = os.getenv('PERSISTENCIA_COMPARTIDA', '0') == '1'
+PURGA_CADA = 3600
+
+logger = logging.getLogger(__name__)
+
+# ================= PERSISTENCIA EN POSTGRES =================
+class PersistenciaPostgres(BasePersistence):
+    """Guarda `context.user_data` (los pasos del agendamiento) en Postgres
+
+    PTB llama a `update_user_data` cada `update_interval` segundos solo para
+    los usuarios que cambiaron; aquí se acumulan y se escriben juntos en una
+    sola sentencia. Los flujos sin actividad durante PERSISTENCIA_TTL se
+    descartan al volver a escribir el usuario y se purgan de la tabla; de
+    ellos solo quedan las claves de `conservar` (el estudio elegido).
+    """
+
+    def __init__(self, conservar: tuple[str, ...] = ()):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+            update_interval=PERSISTENCIA_INTERVALO,
+        )
+        self._pendientes: dict[int, dict] = {}
+        self._tocado: dict[int, float] = {}
+        self._escritura: Optional[asyncio.Task] = None
+        self._ultima_purga = monotonic()
+        self._conservar = list(conservar)
+
+    # ---------- usuarios ----------
+    async def get_user_data(self) -> dict[int, dict]:
+        # Se llama en Application.initialize(), antes de post_init
+        await db.iniciar_pool()
+        await consultas.purgar_estados(PERSISTENCIA_TTL, self._conservar)
+
+        datos = {}
+        limite = time() - PERSISTENCIA_TTL.total_seconds()
+        for fila in await consultas.cargar_estados(PERSISTENCIA_TTL, self._conservar):
+            tocado = fila['actualizado_en'].timestamp()
+            if tocado < limite:
+                # Flujo abandonado que se guarda solo por lo que se conserva
+                datos[fila['user_id']] = self._conservados(json.loads(fila['datos']))
+            else:
+                datos[fila['user_id']] = json.loads(fila['datos'])
+                self._tocado[fila['user_id']] = tocado
+        logger.info(f"💾 {len(datos)} conversaciones recuperadas")
+        return datos
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._pendientes[user_id] = data
+        self._tocado[user_id] = time()
+        self._programar_escritura()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pendientes[user_id] = {}
+        self._tocado.pop(user_id, None)
+        self._programar_escritura()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if PERSISTENCIA_COMPARTIDA and user_id not in self._pendientes:
+            fila = await consultas.estado_usuario(user_id)
+            guardado = fila['actualizado_en'].timestamp() if fila else 0
+            if guardado > self._tocado.get(user_id, 0):
+                # Otra instancia atendió al usuario después que nosotros
+                user_data.clear()
+                user_data.update(json.loads(fila['datos']))
+                self._tocado[user_id] = guardado
+
+        tocado = self._tocado.get(user_id)
+        if user_data and tocado is not None and time() - tocado > PERSISTENCIA_TTL.total_seconds():
+            logger.info(f"⌛ Flujo abandonado del usuario {user_id}, se descarta")
+            conservado = self._conservados(user_data)
+            user_data.clear()
+            user_data.update(conservado)
+            self._tocado.pop(user_id, None)
+
+    async def flush(self) -> None:
+        if self._escritura is not None:
+            await asyncio.gather(self._escritura, return_exceptions=True)
+        await self._escribir()
+
+    def _conservados(self, datos: dict) -> dict:
+        return {clave: datos[clave] for clave in self._conservar if clave in datos}
+
+    # ---------- escritura diferida ----------
+    def _programar_escritura(self):
+        # PTB manda todos los usuarios modificados a la vez; la tarea corre
+        # después de recibirlos todos y los guarda en una sola sentencia
+        if self._escritura is None or self._escritura.done():
+            self._escritura = asyncio.create_task(self._escribir())
+
+    async def _escribir(self):
+        pendientes, self._pendientes = self._pendientes, {}
+        if not pendientes:
+            return
+
+        guardar = {user_id: datos for user_id, datos in pendientes.items() if datos}
+        borrar = [user_id for user_id, datos in pendientes.items() if not datos]
+        try:
+            await consultas.guardar_estados(
+                list(guardar), [json.dumps(datos) for datos in guardar.values()], borrar
+            )
+        except Exception as e:
+            logger.error(f"❌ Error guardando {len(pendientes)} conversaciones: {e}")
+            # Se reintenta en la próxima ronda salvo que ya haya datos más nuevos
+            for user_id, datos in pendientes.items():
+                self._pendientes.setdefault(user_id, datos)
+            return
+
+        if monotonic() - self._ultima_purga > PURGA_CADA:
+            self._ultima_purga = monotonic()
+            limite = time() - PERSISTENCIA_TTL.total_seconds()
+            for user_id in [u for u, tocado in self._tocado.items() if tocado < limite]:
+                del self._tocado[user_id]
+            try:
+                await consultas.purgar_estados(PERSISTENCIA_TTL, self._conservar)
+            except Exception as e:
+                logger.error(f"❌ Error purgando conversaciones caducadas: {e}")
+
+    # ---------- datos que este bot no guarda ----------
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+def crear_persistencia(conservar: tuple[str, ...] = ()) -> Optional[PersistenciaPostgres]:
+    """Persistencia configurada, o None para dejar el estado solo en memoria"""
+    if PERSISTENCIA == 'ninguna':
+        return None
+    return PersistenciaPostgres(conservar)
@@ -0,0 +1,66 @@
+import os
+import asyncio
+import logging
+from datetime import timedelta
+
+from telegram.ext import CallbackContext, JobQueue
+
+import consultas
+import estudios
+import disponibilidad
+import notificaciones
+from formato import fecha_txt, hora_txt
+
+# ================= CONFIGURACIÓN =================
+RECORDATORIO_HORAS = float(os.getenv('RECORDATORIO_HORAS', '24'))
+RECORDATORIO_CADA = float(os.getenv('RECORDATORIO_CADA', '300'))
+RECORDATORIO_LOTE = int(os.getenv('RECORDATORIO_LOTE', '500'))
+
+logger = logging.getLogger(__name__)
+
+# ================= RECORDATORIOS DE CITAS =================
+# Un solo trabajo periódico, no un temporizador por cita: en cada vuelta se
+# buscan las citas que empiezan en las próximas RECORDATORIO_HORAS sin
+# recordatorio, se marcan todas en una sentencia y se envían por el limitador
+# de notificaciones. Solo se envían las que esta vuelta logró marcar, así un
+# reinicio u otra instancia no repiten recordatorios. Cada bot recuerda solo
+# las citas de los estudios que atiende: los clientes de otros estudios no le
+# escribieron a él.
+def _texto(cita) -> str:
+    return (
+        f"⏰ *RECORDATORIO DE TU CITA*\n\n"
+        f"👤 *Cliente:* {cita['cliente_nombre']}\n"
+        f"💅 *Servicio:* {cita['servicio']}\n"
+        f"📅 *Fecha:* {fecha_txt(cita['fecha'])}\n"
+        f"⏰ *Hora:* {hora_txt(cita['hora'])}\n\n"
+        f"Si no puedes asistir, cancélala con /start → ❌ Cancelar cita.\n"
+        f"¡Te esperamos! 💕"
+    )
+
+async def revisar(context: CallbackContext):
+    """Enviar los recordatorios que tocan (una consulta si no hay ninguno)"""
+    ahora = disponibilidad.ahora()
+    try:
+        ids = await consultas.recordatorios_pendientes(
+            [estudio.id for estudio in estudios.atendidos(context.bot.id)], ahora, ahora + timedelta(hours=RECORDATORIO_HORAS), RECORDATORIO_LOTE
+        )
+        if not ids:
+            return
+        citas = await consultas.marcar_recordados(ids)
+    except Exception as e:
+        logger.error(f"❌ Error buscando recordatorios: {e}")
+        return
+
+    # Un fallo de envío no se reintenta: `enviar` ya reintenta los errores pasajeros
+    enviados = await asyncio.gather(*(
+        notificaciones.enviar(cita['user_id'], _texto(cita)) for cita in citas
+    ))
+    logger.info(f"⏰ {sum(enviados)} de {len(citas)} recordatorios enviados")
+
+def programar(job_queue: JobQueue):
+    """Registrar el trabajo periódico de recordatorios"""
+    if job_queue is None:
+        logger.warning("⚠️ Sin JobQueue (instala python-telegram-bot[job-queue]): no habrá recordatorios")
+        return
+    job_queue.run_repeating(revisar, interval=RECORDATORIO_CADA, first=30, name='recordatorios')
+    logger.info(f"⏰ Recordatorios cada {RECORDATORIO_CADA:.0f}s, {RECORDATORIO_HORAS:g}h antes de cada cita")
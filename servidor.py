@@ -0,0 +1,140 @@
+import os
+import hmac
+import signal
+import asyncio
+import hashlib
+import logging
+from typing import Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+import metricas
+
+# ================= CONFIGURACIÓN =================
+# BOT_MODO=webhook recibe los updates por HTTP (servicio web de Render);
+# cualquier otro valor usa polling como hasta ahora.
+BOT_MODO = os.getenv('BOT_MODO', 'polling')
+PORT = int(os.getenv('PORT', '8080'))
+WEBHOOK_URL = os.getenv('WEBHOOK_URL') or os.getenv('RENDER_EXTERNAL_URL', '')
+WEBHOOK_RUTA = os.getenv('WEBHOOK_RUTA', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+CABECERA_SECRETO = 'X-Telegram-Bot-Api-Secret-Token'
+
+CLAVE_BOT = web.AppKey('bot', Application)
+CLAVE_SECRETO = web.AppKey('secreto', str)
+
+logger = logging.getLogger(__name__)
+
+def modo_webhook() -> bool:
+    """Si el bot debe recibir los updates por webhook"""
+    return BOT_MODO.lower() == 'webhook'
+
+def secreto_webhook(token: str) -> str:
+    """Secreto que Telegram manda en cada update
+
+    Siempre es un hash hexadecimal: Telegram solo acepta A-Z, a-z, 0-9, _ y -
+    en `secret_token`, y el WEBHOOK_SECRET que genera Render viene en base64.
+    Sin WEBHOOK_SECRET se deriva del token, así todas las instancias detrás
+    del balanceador aceptan los mismos updates.
+    """
+    if WEBHOOK_SECRET:
+        return hashlib.sha256(WEBHOOK_SECRET.encode()).hexdigest()
+    return hashlib.sha256(f"webhook:{token}".encode()).hexdigest()
+
+# ================= RUTAS HTTP =================
+async def recibir_update(request: web.Request) -> web.Response:
+    """POST de Telegram con un update: se verifica y se encola"""
+    application = request.app[CLAVE_BOT]
+    recibido = request.headers.get(CABECERA_SECRETO, '')
+    if not hmac.compare_digest(recibido, request.app[CLAVE_SECRETO]):
+        return web.Response(status=403)
+
+    try:
+        datos = await request.json()
+    except ValueError:
+        return web.Response(status=400)
+
+    await application.update_queue.put(Update.de_json(datos, application.bot))
+    return web.Response()
+
+async def salud(request: web.Request) -> web.Response:
+    """Health check para Render"""
+    application = request.app[CLAVE_BOT]
+    if not application.running:
+        return web.json_response({'estado': 'detenido'}, status=503)
+    return web.json_response({'estado': 'ok'})
+
+async def exponer_metricas(request: web.Request) -> web.Response:
+    """Métricas en formato Prometheus"""
+    return web.Response(text=metricas.exponer(), content_type='text/plain', charset='utf-8')
+
+def crear_app_web(application: Application, webhook: bool = True) -> web.Application:
+    """Servidor HTTP del bot (webhook, health check y métricas)"""
+    web_app = web.Application()
+    web_app[CLAVE_BOT] = application
+    if webhook:
+        web_app[CLAVE_SECRETO] = secreto_webhook(application.bot.token)
+        web_app.router.add_post(WEBHOOK_RUTA, recibir_update)
+    web_app.router.add_get('/healthz', salud)
+    web_app.router.add_get('/metrics', exponer_metricas)
+    return web_app
+
+# ================= SERVIDOR HTTP EN MODO POLLING =================
+_runner_polling: Optional[web.AppRunner] = None
+
+async def iniciar_http_polling(application: Application):
+    """En modo polling, servir igualmente /healthz y /metrics en $PORT"""
+    global _runner_polling
+    if modo_webhook() or _runner_polling is not None:
+        return
+    _runner_polling = web.AppRunner(crear_app_web(application, webhook=False))
+    await _runner_polling.setup()
+    await web.TCPSite(_runner_polling, '0.0.0.0', PORT).start()
+    logger.info(f"📈 Métricas en el puerto {PORT} (/metrics)")
+
+async def detener_http_polling():
+    """Cerrar el servidor HTTP del modo polling"""
+    global _runner_polling
+    if _runner_polling is not None:
+        await _runner_polling.cleanup()
+        _runner_polling = None
+
+# ================= EJECUCIÓN EN MODO WEBHOOK =================
+async def ejecutar_webhook(application: Application):
+    """Equivalente a `run_polling` pero recibiendo los updates por HTTP"""
+    if not WEBHOOK_URL:
+        raise RuntimeError("BOT_MODO=webhook requiere WEBHOOK_URL (o RENDER_EXTERNAL_URL)")
+
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, parar.set)
+
+    runner = web.AppRunner(crear_app_web(application))
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+
+        await application.bot.set_webhook(
+            url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_RUTA}",
+            secret_token=secreto_webhook(application.bot.token),
+            allowed_updates=Update.ALL_TYPES,
+        )
+        await application.start()
+        await runner.setup()
+        await web.TCPSite(runner, '0.0.0.0', PORT).start()
+        logger.info(f"🌐 Webhook escuchando en el puerto {PORT} ({WEBHOOK_RUTA})")
+
+        try:
+            await parar.wait()
+        finally:
+            logger.info("🛑 Deteniendo el bot...")
+            await runner.cleanup()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+
+    if application.post_shutdown:
+        await application.post_shutdown(application)